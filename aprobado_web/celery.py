@@ -27,16 +27,34 @@ app.conf.beat_schedule = {
         'schedule': crontab(hour=6, minute=0),  # Diariamente a las 6:00 AM
     },
 
-    # Tarea para enviar recordatorios de pago - Ejecutar todos los días a las 8:00 AM
-    'enviar-recordatorios-pago': {
-        'task': 'gestion_creditos.tasks.enviar_recordatorios_pago_task',
+    # Tarea para programar recordatorios de pago y alertas de mora - Ejecutar todos los días a las 8:00 AM
+    'programar-notificaciones-credito': {
+        'task': 'gestion_creditos.tasks.programar_notificaciones_credito_task',
         'schedule': crontab(hour=8, minute=0),  # Diariamente a las 8:00 AM
     },
 
-    # Tarea para enviar alertas de mora - Ejecutar todos los días a las 9:00 AM
-    'enviar-alertas-mora': {
-        'task': 'gestion_creditos.tasks.enviar_alertas_mora_task',
-        'schedule': crontab(hour=9, minute=0),  # Diariamente a las 9:00 AM
+    # Tarea para guardar la foto mensual de cartera - Ejecutar todos los días a las 11:50 PM
+    'generar-snapshot-cartera': {
+        'task': 'gestion_creditos.tasks.generar_snapshot_cartera_task',
+        'schedule': crontab(hour=23, minute=50),  # Diariamente a las 11:50 PM
+    },
+
+    # Tarea para despachar la bandeja de salida de correos (reintentos) - Cada minuto
+    'despachar-correos-pendientes': {
+        'task': 'gestion_creditos.tasks.despachar_correos_task',
+        'schedule': crontab(),  # Cada minuto
+    },
+
+    # Tarea para conciliar los pagos Wompi pendientes - Cada 15 segundos
+    'conciliar-pagos-wompi': {
+        'task': 'gestion_creditos.tasks.conciliar_pagos_wompi_task',
+        'schedule': 15.0,  # Segundos
+    },
+
+    # Tarea para procesar los webhooks de Wompi recibidos (reintentos) - Cada 15 segundos
+    'procesar-webhooks-wompi': {
+        'task': 'gestion_creditos.tasks.procesar_webhooks_wompi_task',
+        'schedule': 15.0,  # Segundos
     },
 }
 
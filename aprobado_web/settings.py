@@ -296,6 +296,9 @@ else:
         }
     }
 
+# Segundos máximos que un KPI de dashboard puede servirse desde caché
+DASHBOARD_KPI_CACHE_SECONDS = int(os.environ.get('DASHBOARD_KPI_CACHE_SECONDS', '60'))
+
 # ========================
 # Configuración de ZapSign (Firma Electrónica de Pagarés)
 # ========================
@@ -343,6 +346,10 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'America/Bogota'
 CELERY_ENABLE_UTC = False
 
+# Tareas de envío masivo de correos (recordatorios/mora) por minuto y worker.
+# Cada tarea envía hasta 200 correos por una conexión SMTP; ajustar a la cuota de Gmail.
+CORREOS_MASIVOS_RATE_LIMIT = os.environ.get('CORREOS_MASIVOS_RATE_LIMIT', '10/m')
+
 # Configuración de Celery Beat (tareas programadas)
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
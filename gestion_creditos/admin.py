@@ -8,7 +8,9 @@ from django.core.exceptions import ValidationError
 from .models import (
     Credito, CreditoEmprendimiento, CreditoLibranza, Empresa, HistorialPago, WompiIntent,
     CuentaAhorro, MovimientoAhorro, ConfiguracionTasaInteres, ImagenNegocio, Notificacion,
-    Pagare, ZapSignWebhookLog, MarketplaceItem, MarketplaceItemHistorialEstado
+    Pagare, ZapSignWebhookLog, MarketplaceItem, MarketplaceItemHistorialEstado, CarteraSnapshot,
+    CorreoSaliente, ReglaNotificacionCredito, NotificacionCreditoEnviada, LotePagoMasivo,
+    DetalleLotePagoMasivo, WompiWebhookEvent
 )
 from django.utils import timezone
 from datetime import timedelta
@@ -374,10 +376,59 @@ class HistorialPagoAdmin(admin.ModelAdmin):
 
 @admin.register(WompiIntent)
 class WompiIntentAdmin(admin.ModelAdmin):
-    list_display = ('credito', 'referencia', 'amount_in_cents', 'status', 'wompi_transaction_id', 'created_at')
-    list_filter = ('status', 'created_at')
+    list_display = ('credito', 'referencia', 'amount_in_cents', 'status', 'tipo_pago', 'wompi_transaction_id', 'aplicado_en', 'created_at')
+    list_filter = ('status', 'tipo_pago', 'created_at')
     search_fields = ('credito__numero_credito', 'referencia', 'wompi_transaction_id')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'consultas_estado', 'proxima_consulta', 'aplicado_en', 'datos_transaccion')
+
+class DetalleLotePagoMasivoInline(admin.TabularInline):
+    model = DetalleLotePagoMasivo
+    extra = 0
+    raw_id_fields = ('credito',)
+    readonly_fields = ('credito', 'cedula', 'nombre', 'monto')
+    can_delete = False
+
+@admin.register(LotePagoMasivo)
+class LotePagoMasivoAdmin(admin.ModelAdmin):
+    list_display = ('referencia', 'empresa', 'estado', 'cantidad_pagos', 'monto_total', 'fecha_creacion', 'fecha_aplicacion')
+    list_filter = ('estado', 'empresa')
+    search_fields = ('referencia', 'detalles__cedula')
+    readonly_fields = ('fecha_creacion', 'fecha_cobro', 'fecha_aplicacion')
+    inlines = [DetalleLotePagoMasivoInline]
+
+@admin.register(CarteraSnapshot)
+class CarteraSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('mes', 'linea', 'saldo_cartera', 'creditos_vigentes', 'creditos_en_mora', 'monto_vencido', 'monto_desembolsado', 'fecha_corte')
+    list_filter = ('linea', 'mes')
+    readonly_fields = ('fecha_actualizacion',)
+
+@admin.register(WompiWebhookEvent)
+class WompiWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'transaction_id', 'status', 'referencia', 'credito', 'estado', 'intentos', 'recibido_en', 'procesado_en')
+    list_filter = ('estado', 'status')
+    search_fields = ('transaction_id', 'referencia', 'credito__numero_credito')
+    raw_id_fields = ('credito',)
+    readonly_fields = ('payload', 'recibido_en', 'procesado_en', 'ultimo_error')
+
+@admin.register(CorreoSaliente)
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'destinatario', 'estado', 'intentos', 'proximo_intento', 'fecha_envio')
+    list_filter = ('tipo', 'estado')
+    search_fields = ('destinatario', 'clave', 'credito__numero_credito')
+    raw_id_fields = ('credito',)
+    readonly_fields = ('fecha_creacion', 'fecha_envio', 'ultimo_error')
+
+@admin.register(ReglaNotificacionCredito)
+class ReglaNotificacionCreditoAdmin(admin.ModelAdmin):
+    list_display = ('tipo', 'dias', 'repetir_cada', 'activa')
+    list_filter = ('tipo', 'activa')
+
+@admin.register(NotificacionCreditoEnviada)
+class NotificacionCreditoEnviadaAdmin(admin.ModelAdmin):
+    list_display = ('credito', 'tipo', 'dias', 'fecha_vencimiento', 'fecha_programada', 'fecha_envio')
+    list_filter = ('tipo', 'fecha_programada')
+    search_fields = ('credito__numero_credito',)
+    raw_id_fields = ('credito',)
 
 @admin.register(CuentaAhorro)
 class CuentaAhorroAdmin(admin.ModelAdmin):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GestionCreditosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion_creditos'
+
+    def ready(self):
+        import gestion_creditos.signals
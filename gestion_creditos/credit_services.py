@@ -1,4 +1,4 @@
-from decimal import Decimal, ConversionSyntax
+from decimal import Decimal, InvalidOperation
 import logging
 import uuid
 from django.conf import settings
@@ -6,23 +6,34 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from openai import OpenAI
 from configuraciones.models import ConfiguracionPeso
-from .models import Credito, HistorialEstado, CuentaAhorro, MovimientoAhorro, ConfiguracionTasaInteres, HistorialPago, CuotaAmortizacion
+from .models import Credito, HistorialEstado, CuentaAhorro, MovimientoAhorro, ConfiguracionTasaInteres, HistorialPago, CuotaAmortizacion, CorreoSaliente
+from .email_service import ESTADOS_CON_CORREO
 from .services.tasa_service import obtener_tasa_credito
+from .services.amortizacion_service import calcular_cuota_fija, generar_tabla_amortizacion
+from .services.cartera_service import obtener_serie_cartera
+from .services.busqueda_service import buscar_creditos
+from .services.simulacion_abono_service import SimulacionAbono
+from .services import kpi_cache_service, correo_saliente_service
+from .signals import estado_credito_cambiado, saldo_credito_actualizado
 from .services.libranza_rules import (
     calcular_primera_fecha_pago_libranza,
     obtener_fecha_primera_cuota_credito,
     obtener_plazo_credito_aplicado,
     obtener_tasa_credito_aplicada,
 )
-from django.db.models import Sum, Count, Case, When, F, DecimalField, Q, Avg, Value, ExpressionWrapper, Value, ExpressionWrapper
+from django.db.models import Sum, Count, Case, When, Exists, F, DecimalField, OuterRef, Q, Avg, Min, Max, Value, ExpressionWrapper
 from django.db.models.functions import TruncMonth, Coalesce
 from django.utils import timezone
 from datetime import timedelta, datetime
 from dateutil.relativedelta import relativedelta
 import json
 import csv
-import io
-from django.db import transaction
+import codecs
+import itertools
+import re
+from collections import defaultdict
+from functools import partial
+from django.db import connection, transaction
 from django.contrib import messages
 
 logger = logging.getLogger(__name__)
@@ -33,8 +44,6 @@ def gestionar_cambio_estado_credito(credito, nuevo_estado, motivo, usuario_modif
     Centraliza todos los cambios de estado de un crédito, registrando el historial.
     También envía notificaciones por email al cliente.
     """
-    from .email_service import enviar_notificacion_cambio_estado
-
     estado_anterior = credito.estado
 
     if estado_anterior == nuevo_estado:
@@ -43,10 +52,14 @@ def gestionar_cambio_estado_credito(credito, nuevo_estado, motivo, usuario_modif
     credito.estado = nuevo_estado
     credito.save()
 
-    if nuevo_estado == Credito.EstadoCredito.ACTIVO and estado_anterior != Credito.EstadoCredito.ACTIVO:
+    # Salir de mora no es un desembolso: solo se activa financieramente al llegar desde el flujo de originación
+    if nuevo_estado == Credito.EstadoCredito.ACTIVO and estado_anterior not in (
+        Credito.EstadoCredito.ACTIVO,
+        Credito.EstadoCredito.EN_MORA,
+    ):
         activar_credito(credito)
 
-    HistorialEstado.objects.create(
+    historial = HistorialEstado.objects.create(
         credito=credito,
         estado_anterior=estado_anterior,
         estado_nuevo=nuevo_estado,
@@ -55,13 +68,13 @@ def gestionar_cambio_estado_credito(credito, nuevo_estado, motivo, usuario_modif
         usuario_modificacion=usuario_modificacion
     )
     logger.info(f"Crédito {credito.id} cambió de {estado_anterior} a {nuevo_estado}. Motivo: {motivo}")
+    estado_credito_cambiado.send(sender=Credito, credito_ids=[credito.id])
 
-    # Enviar notificación por email al cliente
-    try:
-        enviar_notificacion_cambio_estado(credito, nuevo_estado, motivo)
-        logger.info(f"Notificación de email enviada para crédito {credito.id} - Estado: {nuevo_estado}")
-    except Exception as e:
-        logger.error(f"Error al enviar notificación de email para crédito {credito.id}: {e}")
+    # Notificación por email al cliente: se registra en la bandeja de salida y
+    # se envía fuera de la transacción
+    correo_saliente_service.encolar_notificacion_cambio_estado(
+        credito, nuevo_estado, motivo, clave=f'historial-estado:{historial.id}'
+    )
 
 @transaction.atomic
 def preparar_documento_para_firma(credito, usuario_modificacion):
@@ -179,7 +192,7 @@ def iniciar_proceso_desembolso(credito):
 
 
 @transaction.atomic
-def actualizar_saldo_tras_pago(credito, monto_pagado):
+def actualizar_saldo_tras_pago(credito, monto_pagado, pago=None):
     """
     Actualiza el saldo del crédito después de recibir un pago.
 
@@ -201,9 +214,10 @@ def actualizar_saldo_tras_pago(credito, monto_pagado):
     Args:
         credito: Instancia del modelo Credito
         monto_pagado: Monto del pago realizado (Decimal o convertible)
+        pago: HistorialPago del pago, donde se guarda su reparto en cuotas (opcional)
 
     Returns:
-        None (actualiza el crédito directamente)
+        AsignacionPago: Reparto del pago en cuotas (None si el crédito no tiene monto aprobado)
     """
     credito_id = credito.id
     credito = Credito.objects.select_for_update().get(id=credito_id)
@@ -235,13 +249,7 @@ def actualizar_saldo_tras_pago(credito, monto_pagado):
         if credito.plazo:
             tasa_mensual_inicial = (credito.tasa_interes or Decimal('0.00')) / Decimal(100)
             if credito.valor_cuota is None:
-                if tasa_mensual_inicial > 0:
-                    factor = (tasa_mensual_inicial * (1 + tasa_mensual_inicial) ** credito.plazo) / (
-                        ((1 + tasa_mensual_inicial) ** credito.plazo) - 1
-                    )
-                    credito.valor_cuota = capital_financiado_inicial * factor
-                else:
-                    credito.valor_cuota = capital_financiado_inicial / credito.plazo
+                credito.valor_cuota = calcular_cuota_fija(capital_financiado_inicial, tasa_mensual_inicial, credito.plazo)
                 updated_fields.append('valor_cuota')
             if credito.total_a_pagar is None and credito.valor_cuota is not None:
                 credito.total_a_pagar = credito.valor_cuota * credito.plazo
@@ -269,40 +277,78 @@ def actualizar_saldo_tras_pago(credito, monto_pagado):
         and credito.valor_cuota
         and credito.fecha_proximo_pago
     ):
-        saldo_capital_restante = capital_financiado_inicial
-        fecha_cuota = credito.fecha_proximo_pago
-        tasa_mensual_tabla = (credito.tasa_interes or Decimal('0.00')) / Decimal(100)
-        cuotas = []
-        for i in range(1, credito.plazo + 1):
-            interes_a_pagar = saldo_capital_restante * tasa_mensual_tabla
-            capital_a_pagar = credito.valor_cuota - interes_a_pagar
-            if i == credito.plazo:
-                capital_a_pagar = saldo_capital_restante
-                interes_a_pagar = credito.valor_cuota - capital_a_pagar
-                if interes_a_pagar < 0:
-                    interes_a_pagar = Decimal('0.00')
-                    capital_a_pagar = credito.valor_cuota
-
-            saldo_capital_restante -= capital_a_pagar
-            if saldo_capital_restante < 0:
-                saldo_capital_restante = Decimal('0.00')
-
-            cuotas.append(
-                CuotaAmortizacion(
-                    credito=credito,
-                    numero_cuota=i,
-                    fecha_vencimiento=fecha_cuota,
-                    capital_a_pagar=capital_a_pagar,
-                    interes_a_pagar=interes_a_pagar,
-                    valor_cuota=credito.valor_cuota,
-                    saldo_capital_pendiente=saldo_capital_restante
-                )
-            )
-            fecha_cuota += relativedelta(months=1)
-
+        tabla = generar_tabla_amortizacion(
+            capital=capital_financiado_inicial,
+            tasa_mensual=(credito.tasa_interes or Decimal('0.00')) / Decimal(100),
+            plazo=credito.plazo,
+            fecha_primera_cuota=credito.fecha_proximo_pago,
+            valor_cuota=credito.valor_cuota,
+        )
+        cuotas = _construir_cuotas_amortizacion(credito, tabla)
         if cuotas:
             CuotaAmortizacion.objects.bulk_create(cuotas, ignore_conflicts=True)
     monto_pagado = Decimal(monto_pagado)
+    hoy = timezone.now().date()
+
+    # 1-4, 6-8. Calcular en memoria intereses, capital, saldos y fecha de próximo pago
+    resultado = _calcular_pago_credito(credito, monto_pagado, hoy)
+
+    # 5. Aplicar el pago a las cuotas pendientes (permite abonos parciales)
+    asignacion = _aplicar_pago_a_cuotas(credito, monto_pagado)
+    if pago is not None:
+        asignacion.registrar_en(pago)
+        if pago.pk:
+            pago.save(update_fields=CAMPOS_ASIGNACION_PAGO)
+
+    if resultado['nuevo_estado']:
+        gestionar_cambio_estado_credito(
+            credito=credito,
+            nuevo_estado=resultado['nuevo_estado'],
+            motivo=MOTIVOS_CAMBIO_ESTADO_POR_PAGO[resultado['nuevo_estado']]
+        )
+
+    # ✅ Guardar cambios en el crédito
+    credito.save()
+    actualizar_mora_creditos([credito.id], hoy=hoy, instancias=[credito])
+    actualizar_totales_pagados([credito.id], instancias=[credito])
+    saldo_credito_actualizado.send(sender=Credito, credito_ids=[credito.id])
+
+    capital_pendiente_log = credito.capital_pendiente if credito.capital_pendiente is not None else Decimal('0.00')
+    logger.info(
+        f"Pago procesado para crédito {credito.numero_credito}: "
+        f"Monto: ${monto_pagado:,.2f}, Interés: ${resultado['abono_a_interes']:,.2f}, "
+        f"Capital: ${resultado['abono_a_capital']:,.2f}, Nuevo saldo: ${credito.saldo_pendiente:,.2f}, "
+        f"Capital pendiente: ${capital_pendiente_log:,.2f}"
+    )
+
+    # Confirmación de pago por email (bandeja de salida, se envía después del commit).
+    # Con el pago registrado la clave es su referencia, igual que en los pagos masivos,
+    # de modo que reprocesar el mismo pago no encola otro correo.
+    clave = f'pago:{pago.referencia_pago}' if pago is not None else f'pago:{credito.id}:{uuid.uuid4().hex}'
+    correo_saliente_service.encolar_confirmacion_pago(
+        credito, monto_pagado, credito.saldo_pendiente, clave=clave
+    )
+    return asignacion
+
+
+MOTIVOS_CAMBIO_ESTADO_POR_PAGO = {
+    Credito.EstadoCredito.PAGADO: "Crédito saldado automáticamente por pago.",
+    Credito.EstadoCredito.ACTIVO: "Crédito actualizado a ACTIVO por pago.",
+}
+
+
+def _calcular_pago_credito(credito, monto_pagado, hoy):
+    """
+    Aplica un pago sobre los campos financieros del crédito, solo en memoria.
+
+    El pago primero cubre los intereses del período sobre el saldo pendiente y el
+    remanente abona a capital. No guarda el crédito ni cambia su estado: retorna el
+    estado al que debe pasar (PAGADO, ACTIVO si sale de mora, o None) para que el
+    llamador registre la transición como corresponda.
+
+    Returns:
+        dict: abono_a_interes, abono_a_capital y nuevo_estado
+    """
     tasa_mensual = credito.tasa_interes / Decimal(100)
 
     # Saldo antes del pago (capital financiado total pendiente)
@@ -322,7 +368,6 @@ def actualizar_saldo_tras_pago(credito, monto_pagado):
     # Calcular qué porcentaje del capital financiado total se ha pagado
     # y aplicarlo al monto_aprobado original
     if credito.capital_pendiente is not None and credito.total_a_pagar:
-        # Calcular capital financiado inicial (si no está guardado, calcularlo)
         capital_financiado_inicial = credito.monto_aprobado + (credito.comision or 0) + (credito.iva_comision or 0)
 
         if capital_financiado_inicial > 0:
@@ -335,8 +380,7 @@ def actualizar_saldo_tras_pago(credito, monto_pagado):
             # Redondear a 2 decimales para evitar problemas de precisión
             credito.capital_pendiente = credito.capital_pendiente.quantize(Decimal('0.01'))
 
-    # 5. Aplicar el pago a las cuotas pendientes (permite abonos parciales)
-    _aplicar_pago_a_cuotas(credito, monto_pagado)
+    nuevo_estado = None
 
     # 6. Validar si el crédito está completamente pagado
     if credito.saldo_pendiente <= Decimal('0.01'):
@@ -344,13 +388,8 @@ def actualizar_saldo_tras_pago(credito, monto_pagado):
         if credito.capital_pendiente is not None:
             credito.capital_pendiente = Decimal('0.00')
 
-        # Marcar como pagado si no lo está ya
         if credito.estado != Credito.EstadoCredito.PAGADO:
-            gestionar_cambio_estado_credito(
-                credito=credito,
-                nuevo_estado=Credito.EstadoCredito.PAGADO,
-                motivo="Crédito saldado automáticamente por pago."
-            )
+            nuevo_estado = Credito.EstadoCredito.PAGADO
     else:
         # 7. Avanzar fecha de próximo pago si pagó cuotas completas
         if credito.valor_cuota and credito.valor_cuota > 0 and credito.fecha_proximo_pago:
@@ -359,13 +398,8 @@ def actualizar_saldo_tras_pago(credito, monto_pagado):
                 credito.fecha_proximo_pago += relativedelta(months=cuotas_pagadas)
 
         # 8. Si estaba en mora y se puso al día, volver a ACTIVO
-        hoy = timezone.now().date()
         if credito.estado == Credito.EstadoCredito.EN_MORA and credito.fecha_proximo_pago and credito.fecha_proximo_pago > hoy:
-            gestionar_cambio_estado_credito(
-                credito=credito,
-                nuevo_estado=Credito.EstadoCredito.ACTIVO,
-                motivo="Crédito actualizado a ACTIVO por pago."
-            )
+            nuevo_estado = Credito.EstadoCredito.ACTIVO
 
     # Asegurar que no queden saldos negativos
     if credito.saldo_pendiente < 0:
@@ -373,24 +407,15 @@ def actualizar_saldo_tras_pago(credito, monto_pagado):
     if credito.capital_pendiente and credito.capital_pendiente < 0:
         credito.capital_pendiente = Decimal('0.00')
 
-    # ✅ Guardar cambios en el crédito
-    credito.save()
+    return {
+        'abono_a_interes': abono_a_interes,
+        'abono_a_capital': abono_a_capital,
+        'nuevo_estado': nuevo_estado,
+    }
 
-    capital_pendiente_log = credito.capital_pendiente if credito.capital_pendiente is not None else Decimal('0.00')
-    logger.info(
-        f"Pago procesado para crédito {credito.numero_credito}: "
-        f"Monto: ${monto_pagado:,.2f}, Interés: ${abono_a_interes:,.2f}, "
-        f"Capital: ${abono_a_capital:,.2f}, Nuevo saldo: ${credito.saldo_pendiente:,.2f}, "
-        f"Capital pendiente: ${capital_pendiente_log:,.2f}"
-    )
 
-    # Enviar confirmación de pago por email
-    try:
-        from .email_service import enviar_confirmacion_pago
-        enviar_confirmacion_pago(credito, monto_pagado, credito.saldo_pendiente)
-        logger.info(f"Confirmación de pago enviada por email para crédito {credito.numero_credito}")
-    except Exception as e:
-        logger.error(f"Error al enviar confirmación de pago por email para crédito {credito.numero_credito}: {e}")
+CAMPOS_PAGO_CUOTA = ['monto_pagado', 'pagada', 'fecha_pago']
+CAMPOS_ASIGNACION_PAGO = ['capital_abonado', 'intereses_pagados', 'detalle_cuotas']
 
 
 def _aplicar_pago_a_cuotas(credito, monto_pagado):
@@ -401,11 +426,80 @@ def _aplicar_pago_a_cuotas(credito, monto_pagado):
     - El abono se aplica desde la cuota más próxima.
     - Si el abono cubre la cuota completa, se marca como pagada.
     - Si el abono es parcial, se actualiza monto_pagado y se deja pendiente.
+
+    Las cuotas tocadas se guardan con un único `bulk_update`.
+
+    Returns:
+        AsignacionPago: Reparto del pago en cuotas
     """
-    monto_restante = Decimal(monto_pagado)
     cuotas_pendientes = credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota')
+    asignacion = _distribuir_pago_en_cuotas(cuotas_pendientes, monto_pagado, timezone.now())
+    CuotaAmortizacion.objects.bulk_update(asignacion.cuotas, CAMPOS_PAGO_CUOTA)
+    return asignacion
+
+
+class AsignacionPago:
+    """
+    Reparto de un pago sobre las cuotas pendientes de un crédito.
+
+    Dentro de cada cuota el pago cubre primero el interés y luego el capital
+    (lo ya abonado a la cuota se toma como aplicado en ese mismo orden).
+    """
+
+    def __init__(self):
+        self.cuotas = []
+        self.detalle = []
+        self.capital_abonado = Decimal('0.00')
+        self.intereses_pagados = Decimal('0.00')
+        self.sobrante = Decimal('0.00')
+
+    @property
+    def cuotas_pagadas(self):
+        return sum(1 for item in self.detalle if item['pagada'])
+
+    def agregar(self, cuota, ya_pagado, aplicado):
+        interes_pendiente = max((cuota.interes_a_pagar or Decimal('0.00')) - ya_pagado, Decimal('0.00'))
+        interes = min(aplicado, interes_pendiente)
+        capital = aplicado - interes
+
+        self.cuotas.append(cuota)
+        self.capital_abonado += capital
+        self.intereses_pagados += interes
+        self.detalle.append({
+            'numero_cuota': cuota.numero_cuota,
+            'monto': str(aplicado),
+            'capital': str(capital),
+            'interes': str(interes),
+            'pagada': cuota.pagada,
+        })
+
+    def registrar_en(self, pago):
+        """Copia el desglose al HistorialPago (sin guardarlo)."""
+        pago.capital_abonado = self.capital_abonado
+        pago.intereses_pagados = self.intereses_pagados
+        pago.detalle_cuotas = self.detalle
+
+
+def _distribuir_pago_en_cuotas(cuotas_pendientes, monto_pagado, fecha_pago, permitir_parcial=True):
+    """
+    Reparte un pago sobre cuotas ordenadas por número, solo en memoria.
+
+    Args:
+        permitir_parcial (bool): Si es False, solo se aplican cuotas completas y
+            lo que no alcanza para la siguiente queda como sobrante.
+
+    Returns:
+        AsignacionPago: Cuotas modificadas (pendientes de guardar) y desglose del pago.
+    """
+    monto_restante = Decimal(monto_pagado)
+    asignacion = AsignacionPago()
 
     for cuota in cuotas_pendientes:
+        if monto_restante <= Decimal('0.00'):
+            break
+        if cuota.pagada:
+            continue
+
         ya_pagado = cuota.monto_pagado or Decimal('0.00')
         restante_cuota = cuota.valor_cuota - ya_pagado
 
@@ -413,19 +507,22 @@ def _aplicar_pago_a_cuotas(credito, monto_pagado):
             continue
 
         if monto_restante >= restante_cuota:
+            aplicado = restante_cuota
             cuota.monto_pagado = cuota.valor_cuota
             cuota.pagada = True
-            cuota.fecha_pago = timezone.now()
-            cuota.save(update_fields=['monto_pagado', 'pagada', 'fecha_pago'])
-            monto_restante -= restante_cuota
-        else:
+            cuota.fecha_pago = fecha_pago
+        elif permitir_parcial:
+            aplicado = monto_restante
             cuota.monto_pagado = ya_pagado + monto_restante
-            cuota.save(update_fields=['monto_pagado'])
-            monto_restante = Decimal('0.00')
-
-        if monto_restante <= Decimal('0.00'):
+        else:
             break
 
+        monto_restante -= aplicado
+        asignacion.agregar(cuota, ya_pagado, aplicado)
+
+    asignacion.sobrante = monto_restante
+    return asignacion
+
 
 def evaluar_motivacion_credito(texto: str) -> int:
     """
@@ -504,16 +601,7 @@ def filtrar_creditos(request, creditos_base):
     # Filtro de búsqueda
     search_text = request.GET.get('search', '').strip()
     if search_text:
-        queryset = queryset.filter(
-            Q(usuario__username__icontains=search_text) |
-            Q(usuario__email__icontains=search_text) |
-            Q(numero_credito__icontains=search_text) |
-            Q(detalle_emprendimiento__nombre__icontains=search_text) |
-            Q(detalle_emprendimiento__numero_cedula__icontains=search_text) |
-            Q(detalle_libranza__nombres__icontains=search_text) |
-            Q(detalle_libranza__apellidos__icontains=search_text) |
-            Q(detalle_libranza__cedula__icontains=search_text)
-        )
+        queryset = buscar_creditos(queryset, search_text)
 
     # Filtro de línea
     linea_filter = request.GET.get('linea', '')
@@ -525,50 +613,160 @@ def filtrar_creditos(request, creditos_base):
     if estado_filter:
         queryset = queryset.filter(estado=estado_filter)
 
-    return queryset.distinct()
+    return queryset
 
 
 
 def calcular_total_en_mora(creditos=None):
     """
-    Calcula el monto total vencido en mora basado en cuotas vencidas no pagadas.
+    Calcula el monto total vencido en mora a partir de `Credito.monto_vencido`,
+    que se mantiene con cada pago y con la tarea nocturna de mora.
     """
-    today = timezone.now().date()
+    if creditos is None:
+        creditos = Credito.objects.filter(
+            estado__in=[Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]
+        )
 
-    cuotas = CuotaAmortizacion.objects.filter(
-        pagada=False,
-        fecha_vencimiento__lt=today
-    )
+    total = creditos.filter(monto_vencido__gt=0).aggregate(
+        total=Coalesce(Sum('monto_vencido'), Value(Decimal('0.00')))
+    )['total']
 
-    if creditos is not None:
-        cuotas = cuotas.filter(credito__in=creditos)
+    return total or Decimal('0.00')
+
+
+MORA_CREDITOS_POR_LOTE = 500
+
+
+def actualizar_mora_creditos(credito_ids=None, hoy=None, instancias=None):
+    """
+    Recalcula `monto_vencido` y `dias_mora` desde las cuotas vencidas no pagadas.
+
+    Sin `credito_ids` recalcula toda la cartera ACTIVO/EN_MORA (tarea nocturna);
+    con ids solo esos créditos (después de un pago). Usa una consulta agregada
+    sobre las cuotas y solo recorre los créditos con cuotas vencidas o con mora
+    guardada; se escriben por lotes únicamente los que cambiaron, y la fecha
+    del cálculo se marca con un solo UPDATE. Si se pasan `instancias` (los
+    créditos ya cargados) se actualizan en memoria también, para que un save()
+    posterior no pise los valores.
+
+    Returns:
+        int: Número de créditos cuyo valor cambió
+    """
+    hoy = hoy or timezone.now().date()
+
+    cuotas = CuotaAmortizacion.objects.filter(pagada=False, fecha_vencimiento__lt=hoy)
+    creditos = Credito.objects.all()
+    if credito_ids is None:
+        estados = [Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]
+        cuotas = cuotas.filter(credito__estado__in=estados)
+        creditos = creditos.filter(Q(estado__in=estados) | Q(monto_vencido__gt=0) | Q(dias_mora__gt=0))
     else:
-        cuotas = cuotas.filter(
-            credito__estado__in=[Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]
-        )
+        if not credito_ids:
+            return 0
+        cuotas = cuotas.filter(credito_id__in=credito_ids)
+        creditos = creditos.filter(id__in=credito_ids)
 
     monto_expr = ExpressionWrapper(
         F('valor_cuota') - Coalesce(F('monto_pagado'), Value(Decimal('0.00'))),
         output_field=DecimalField(max_digits=12, decimal_places=2)
     )
+    vencido_por_credito = {
+        fila['credito_id']: fila
+        for fila in cuotas.values('credito_id').annotate(
+            monto=Sum(monto_expr),
+            primera_vencida=Min('fecha_vencimiento'),
+        ).order_by()
+    }
 
-    total = cuotas.aggregate(
-        total=Coalesce(Sum(monto_expr), Value(Decimal('0.00')))
-    )['total']
+    if instancias is None:
+        # Un crédito sin cuotas vencidas y sin mora guardada no cambia
+        instancias = creditos.filter(
+            Q(Exists(cuotas.filter(credito_id=OuterRef('pk')))) | Q(monto_vencido__gt=0) | Q(dias_mora__gt=0)
+        ).only('id', 'monto_vencido', 'dias_mora').iterator(chunk_size=MORA_CREDITOS_POR_LOTE)
+    else:
+        for credito in instancias:
+            credito.fecha_calculo_mora = hoy
+
+    modificados = 0
+    lote = []
+    for credito in instancias:
+        fila = vencido_por_credito.get(credito.id)
+        monto = max(fila['monto'] or Decimal('0.00'), Decimal('0.00')) if fila else Decimal('0.00')
+        dias = (hoy - fila['primera_vencida']).days if fila and monto > 0 else 0
+        if (credito.monto_vencido, credito.dias_mora) == (monto, dias):
+            continue
+        credito.monto_vencido = monto
+        credito.dias_mora = dias
+        lote.append(credito)
+        if len(lote) >= MORA_CREDITOS_POR_LOTE:
+            Credito.objects.bulk_update(lote, ['monto_vencido', 'dias_mora'])
+            modificados += len(lote)
+            lote = []
+    Credito.objects.bulk_update(lote, ['monto_vencido', 'dias_mora'])
+    modificados += len(lote)
 
-    return total or Decimal('0.00')
+    creditos.exclude(fecha_calculo_mora=hoy).update(fecha_calculo_mora=hoy)
+    return modificados
 
 
+def actualizar_totales_pagados(credito_ids, instancias=None):
+    """
+    Recalcula `total_pagado` y `ultimo_pago` desde los pagos exitosos de los
+    créditos indicados (una consulta agregada y una actualización por lotes).
+    Igual que `actualizar_mora_creditos`, actualiza también las `instancias`
+    ya cargadas.
+    """
+    if not credito_ids:
+        return 0
+
+    totales = {
+        fila['credito_id']: fila
+        for fila in HistorialPago.objects.filter(
+            credito_id__in=credito_ids,
+            estado=HistorialPago.EstadoPago.EXITOSO
+        ).values('credito_id').annotate(
+            total=Sum('monto'),
+            ultimo=Max('fecha_pago'),
+        ).order_by()
+    }
 
-def get_admin_dashboard_context(user):
+    if instancias is None:
+        instancias = Credito.objects.filter(id__in=credito_ids).only('id', 'total_pagado', 'ultimo_pago')
+    modificados = []
+    for credito in instancias:
+        fila = totales.get(credito.id)
+        total = fila['total'] if fila else Decimal('0.00')
+        ultimo = fila['ultimo'] if fila else None
+        if (credito.total_pagado, credito.ultimo_pago) == (total, ultimo):
+            continue
+        credito.total_pagado = total
+        credito.ultimo_pago = ultimo
+        modificados.append(credito)
+
+    Credito.objects.bulk_update(modificados, ['total_pagado', 'ultimo_pago'], batch_size=500)
+    return len(modificados)
+
+
+def registrar_decision_pagador(credito, estado, motivo):
     """
-    Obtiene todo el contexto necesario para el dashboard del administrador,
-    utilizando el modelo de Crédito centralizado y optimizando las consultas.
+    Guarda en el crédito la decisión del pagador de la empresa, para no
+    reconstruirla desde HistorialEstado en cada listado.
     """
-    from datetime import date
-    from django.db.models.functions import TruncMonth
+    credito.pagador_decision_estado = estado
+    credito.pagador_decision_motivo = motivo or ''
+    credito.pagador_decision_fecha = timezone.now()
+    Credito.objects.filter(pk=credito.pk).update(
+        pagador_decision_estado=credito.pagador_decision_estado,
+        pagador_decision_motivo=credito.pagador_decision_motivo,
+        pagador_decision_fecha=credito.pagador_decision_fecha,
+    )
 
-    today = timezone.now().date()
+
+def _calcular_resumen_cartera(today):
+    """
+    KPIs y tablas del dashboard administrativo calculados sobre la cartera viva.
+    El resultado se cachea en `kpi_cache_service` (métrica RESUMEN_CARTERA).
+    """
     proximos_15_dias = today + timedelta(days=15)
 
     # --- Consultas Principales ---
@@ -604,66 +802,103 @@ def get_admin_dashboard_context(user):
             'porcentaje': porcentaje
         })
 
+    return {
+        'saldo_cartera_total': kpis['saldo_cartera_total'],
+        'monto_total_en_mora': monto_total_en_mora,
+        'total_creditos': total_creditos,
+        'proximos_vencer': proximos_vencer,
+        'creditos_por_linea': creditos_por_linea_q,
+        'creditos_por_estado': creditos_por_estado,
+    }
+
+
+def obtener_stats_creditos_activos():
+    """
+    Estadísticas de la vista de créditos activos (cacheadas por día).
+    """
+    today = timezone.now().date()
+
+    def calcular():
+        stats = Credito.objects.filter(estado=Credito.EstadoCredito.ACTIVO).aggregate(
+            total_creditos=Count('id'),
+            valor_total=Sum('saldo_pendiente'),
+            valor_promedio=Avg('monto_aprobado'),
+            desembolsos_hoy=Count('id', filter=Q(fecha_desembolso__date=today)),
+        )
+        return stats
+
+    return kpi_cache_service.obtener_kpi(
+        kpi_cache_service.CREDITOS_ACTIVOS, calcular, sufijo=today.isoformat()
+    )
+
+
+def obtener_stats_cartera_mora():
+    """
+    Estadísticas de la cartera en mora para `admin_cartera_view` (cacheadas por día).
+    """
+    today = timezone.now().date()
+
+    def calcular():
+        creditos_en_mora = Credito.objects.filter(estado=Credito.EstadoCredito.EN_MORA)
+        stats = creditos_en_mora.aggregate(
+            total_creditos=Count('id'),
+            saldo_pendiente_total=Sum('saldo_pendiente'),
+            monto_original_en_mora=Sum('total_a_pagar')
+        )
+        stats['monto_total_en_mora'] = calcular_total_en_mora(creditos_en_mora)
+        return stats
+
+    return kpi_cache_service.obtener_kpi(
+        kpi_cache_service.CARTERA_MORA, calcular, sufijo=today.isoformat()
+    )
+
+
+def get_admin_dashboard_context(user):
+    """
+    Obtiene todo el contexto necesario para el dashboard del administrador,
+    utilizando el modelo de Crédito centralizado y optimizando las consultas.
+    """
+    from datetime import date
+    from django.db.models.functions import TruncMonth
+
+    today = timezone.now().date()
+
+    # --- KPIs y tablas (cacheados, se invalidan con cambios de estado y pagos) ---
+    resumen = kpi_cache_service.obtener_kpi(
+        kpi_cache_service.RESUMEN_CARTERA,
+        partial(_calcular_resumen_cartera, today),
+        sufijo=today.isoformat(),
+    )
+    creditos_por_linea_q = resumen['creditos_por_linea']
+
     # --- Datos para Gráfico de Distribución (Doughnut) ---
     distribution_labels = [item['linea'] for item in creditos_por_linea_q]
     distribution_data = [item['count'] for item in creditos_por_linea_q]
 
     # --- Datos para Gráfico de Evolución de Cartera (Líneas) ---
-    # Generar últimos 12 meses de labels
-    portfolio_labels = []
-    for i in range(11, -1, -1):
-        mes_fecha = today - relativedelta(months=i)
-        portfolio_labels.append(mes_fecha.strftime('%b %Y'))
-
-    # Calcular saldo de cartera por mes usando créditos activos
-    # Para cada mes, sumamos los saldos de créditos que estaban activos en ese momento
-    emprendimiento_data = []
-    libranza_data = []
-
-    for label in portfolio_labels:
-        # Convertir label a fecha (último día del mes)
-        mes_date = datetime.strptime(label, '%b %Y')
-        primer_dia_mes = mes_date.replace(day=1).date()
-        ultimo_dia_mes = (primer_dia_mes + relativedelta(months=1) - timedelta(days=1))
-
-        # Créditos que estaban activos en ese mes (desembolsados antes del fin del mes)
-        creditos_mes_emprendimiento = Credito.objects.filter(
-            linea='EMPRENDIMIENTO',
-            estado__in=['ACTIVO', 'EN_MORA', 'PAGADO'],
-            fecha_desembolso__date__lte=ultimo_dia_mes
-        ).aggregate(saldo=Coalesce(Sum('saldo_pendiente'), Decimal('0.00')))['saldo']
-
-        creditos_mes_libranza = Credito.objects.filter(
-            linea='LIBRANZA',
-            estado__in=['ACTIVO', 'EN_MORA', 'PAGADO'],
-            fecha_desembolso__date__lte=ultimo_dia_mes
-        ).aggregate(saldo=Coalesce(Sum('saldo_pendiente'), Decimal('0.00')))['saldo']
-
-        emprendimiento_data.append(float(creditos_mes_emprendimiento))
-        libranza_data.append(float(creditos_mes_libranza))
-
-    total_data = [e + l for e, l in zip(emprendimiento_data, libranza_data)]
+    # Últimos 12 meses leídos de las fotos mensuales (CarteraSnapshot)
+    serie_cartera = obtener_serie_cartera(meses=12, hoy=today)
 
     return {
         # KPIs
-        'saldo_cartera_total': kpis['saldo_cartera_total'],
-        'monto_total_en_mora': monto_total_en_mora,
-        'total_creditos': total_creditos,
-        'proximos_vencer': proximos_vencer,
+        'saldo_cartera_total': resumen['saldo_cartera_total'],
+        'monto_total_en_mora': resumen['monto_total_en_mora'],
+        'total_creditos': resumen['total_creditos'],
+        'proximos_vencer': resumen['proximos_vencer'],
         
         # Tablas
         'creditos_por_linea': creditos_por_linea_q,
-        'creditos_por_estado': creditos_por_estado,
+        'creditos_por_estado': resumen['creditos_por_estado'],
         
         # Gráfico de Distribución
         'distribution_labels': json.dumps(distribution_labels),
         'distribution_data': json.dumps(distribution_data),
         
         # Gráfico de Evolución de Cartera
-        'portfolio_labels': json.dumps(portfolio_labels),
-        'emprendimiento_data': json.dumps(emprendimiento_data),
-        'libranza_data': json.dumps(libranza_data),
-        'total_data': json.dumps(total_data),
+        'portfolio_labels': json.dumps(serie_cartera['labels']),
+        'emprendimiento_data': json.dumps(serie_cartera['emprendimiento']),
+        'libranza_data': json.dumps(serie_cartera['libranza']),
+        'total_data': json.dumps(serie_cartera['total']),
     }
 
 def activar_credito(credito):
@@ -716,14 +951,9 @@ def activar_credito(credito):
     capital_financiado = credito.monto_aprobado + comision + iva_comision
 
     # ✅ Calcular cuota mensual sobre el capital financiado total
+    # Fórmula de amortización francesa: C = P * [i(1+i)^n] / [(1+i)^n - 1]
     tasa_mensual = tasa_interes / Decimal(100)
-    if tasa_mensual > 0:
-        # Fórmula de amortización francesa: C = P * [i(1+i)^n] / [(1+i)^n - 1]
-        factor = (tasa_mensual * (1 + tasa_mensual) ** plazo_aplicado) / (((1 + tasa_mensual) ** plazo_aplicado) - 1)
-        valor_cuota = capital_financiado * factor
-    else:
-        # Caso sin interés (división simple del capital financiado)
-        valor_cuota = capital_financiado / plazo_aplicado
+    valor_cuota = calcular_cuota_fija(capital_financiado, tasa_mensual, plazo_aplicado)
 
     # Total a pagar es la suma de todas las cuotas
     total_a_pagar = valor_cuota * plazo_aplicado
@@ -751,45 +981,14 @@ def activar_credito(credito):
 
     # ✅ Generar tabla de amortización
     # La tabla amortiza el capital_financiado completo (no solo monto_aprobado)
-    saldo_capital_restante = capital_financiado  # ✅ CORRECCIÓN: Amortizar el capital financiado total
-    fecha_cuota = credito.fecha_proximo_pago
-
-    cuotas = []
-    for i in range(1, plazo_aplicado + 1):
-        # Calcular interés sobre el saldo restante
-        interes_a_pagar = saldo_capital_restante * tasa_mensual
-        capital_a_pagar = credito.valor_cuota - interes_a_pagar
-
-        # Ajuste para la última cuota para evitar diferencias por redondeo
-        if i == plazo_aplicado:
-            capital_a_pagar = saldo_capital_restante
-            interes_a_pagar = credito.valor_cuota - capital_a_pagar
-            if interes_a_pagar < 0:
-                interes_a_pagar = Decimal('0.00')
-                capital_a_pagar = credito.valor_cuota
-
-        # Actualizar saldo restante
-        saldo_capital_restante -= capital_a_pagar
-
-        # Asegurar que no quede negativo por redondeo
-        if saldo_capital_restante < 0:
-            saldo_capital_restante = Decimal('0.00')
-
-        # Crear cuota en la tabla de amortización
-        cuotas.append(
-            CuotaAmortizacion(
-                credito=credito,
-                numero_cuota=i,
-                fecha_vencimiento=fecha_cuota,
-                capital_a_pagar=capital_a_pagar,
-                interes_a_pagar=interes_a_pagar,
-                valor_cuota=credito.valor_cuota,
-                saldo_capital_pendiente=saldo_capital_restante
-            )
-        )
-
-        # Avanzar a la siguiente fecha de cuota
-        fecha_cuota += relativedelta(months=1)
+    tabla = generar_tabla_amortizacion(
+        capital=capital_financiado,
+        tasa_mensual=tasa_mensual,
+        plazo=plazo_aplicado,
+        fecha_primera_cuota=credito.fecha_proximo_pago,
+        valor_cuota=valor_cuota,
+    )
+    cuotas = _construir_cuotas_amortizacion(credito, tabla)
 
     if cuotas:
         CuotaAmortizacion.objects.bulk_create(cuotas, ignore_conflicts=True)
@@ -801,6 +1000,24 @@ def activar_credito(credito):
         f"Total a pagar: ${total_a_pagar:,.2f}"
     )
 
+def _construir_cuotas_amortizacion(credito, tabla):
+    """
+    Convierte una tabla del motor de amortización en instancias de CuotaAmortizacion
+    listas para `bulk_create`.
+    """
+    return [
+        CuotaAmortizacion(
+            credito=credito,
+            numero_cuota=cuota['numero'],
+            fecha_vencimiento=cuota['fecha_vencimiento'],
+            capital_a_pagar=cuota['capital'],
+            interes_a_pagar=cuota['interes'],
+            valor_cuota=cuota['cuota'],
+            saldo_capital_pendiente=cuota['saldo_pendiente'],
+        )
+        for cuota in tabla['cuotas']
+    ]
+
 def get_billetera_context(user):
     """
     Prepara el contexto de datos para la vista de la billetera digital.
@@ -906,28 +1123,56 @@ def get_billetera_context(user):
         'es_libranza': es_libranza,
     }
 
-def _leer_csv_pagos(csv_file):
+CSV_PAGOS_CHUNK_SIZE = 64 * 1024
+CSV_PAGOS_MUESTRA_DIALECTO = 4096
+
+
+def _iterar_texto_csv(csv_file, chunk_size=CSV_PAGOS_CHUNK_SIZE):
     """
-    Lee un CSV de pagos masivos soportando BOM, linea sep= y delimitadores comunes.
+    Decodifica el archivo por bloques (utf-8-sig elimina el BOM del primer bloque).
     """
-    raw = csv_file.read()
-    if isinstance(raw, str):
-        text = raw
-    else:
-        text = raw.decode('utf-8-sig')
+    chunks = csv_file.chunks(chunk_size) if hasattr(csv_file, 'chunks') else iter(lambda: csv_file.read(chunk_size), b'')
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for chunk in chunks:
+        if not chunk:
+            break
+        texto = chunk if isinstance(chunk, str) else decoder.decode(chunk)
+        if texto:
+            yield texto
+    resto = decoder.decode(b'', final=True)
+    if resto:
+        yield resto
+
+
+FIN_DE_LINEA_CSV = re.compile(r'\r\n|\r|\n')
 
-    lines = text.splitlines()
-    if lines and lines[0].strip().lower().startswith('sep='):
-        lines = lines[1:]
 
-    cleaned = "\n".join(lines)
-    sample = cleaned[:4096]
+def _iterar_lineas_csv(bloques):
+    """
+    Corta los bloques de texto en líneas (conservando el fin de línea) sin
+    acumular el archivo completo. Acepta finales \\r\\n, \\n y \\r (exportaciones
+    antiguas de Excel para Mac).
+    """
+    pendiente = ''
+    for bloque in bloques:
+        pendiente += bloque
+        inicio = 0
+        for fin in FIN_DE_LINEA_CSV.finditer(pendiente):
+            # Un \r al final del bloque puede ser la mitad de un \r\n
+            if fin.end() == len(pendiente) and fin.group() == '\r':
+                break
+            yield pendiente[inicio:fin.end()]
+            inicio = fin.end()
+        pendiente = pendiente[inicio:]
+    if pendiente:
+        yield pendiente
+
 
+def _detectar_dialecto_csv(muestra, encabezado):
     try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=[',', ';', '\t'])
+        return csv.Sniffer().sniff(muestra, delimiters=[',', ';', '\t'])
     except csv.Error:
-        header = lines[0] if lines else ''
-        delim = ',' if header.count(',') >= header.count(';') else ';'
+        delim = ',' if encabezado.count(',') >= encabezado.count(';') else ';'
 
         class SimpleDialect(csv.Dialect):
             delimiter = delim
@@ -937,25 +1182,66 @@ def _leer_csv_pagos(csv_file):
             lineterminator = '\n'
             quoting = csv.QUOTE_MINIMAL
 
-        dialect = SimpleDialect
+        return SimpleDialect
+
+
+def _leer_csv_pagos(csv_file):
+    """
+    Lee un CSV de pagos masivos soportando BOM, linea sep= y delimitadores comunes.
+
+    El archivo se recorre por bloques: el dialecto se detecta con las primeras
+    líneas y las filas se entregan una a una, con claves en minúscula y valores
+    sin espacios sobrantes.
+    """
+    if hasattr(csv_file, 'seek'):
+        csv_file.seek(0)
+
+    lineas = _iterar_lineas_csv(_iterar_texto_csv(csv_file))
+
+    primeras = []
+    tamano_muestra = 0
+    for linea in lineas:
+        if not primeras and linea.strip().lower().startswith('sep='):
+            continue
+        primeras.append(linea)
+        tamano_muestra += len(linea)
+        if tamano_muestra >= CSV_PAGOS_MUESTRA_DIALECTO:
+            break
+
+    if not primeras:
+        return
+
+    muestra = ''.join(primeras)[:CSV_PAGOS_MUESTRA_DIALECTO]
+    dialect = _detectar_dialecto_csv(muestra, primeras[0])
+
+    reader = csv.DictReader(itertools.chain(primeras, lineas), dialect=dialect)
+    for row in reader:
+        yield {k.strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
 
-    return csv.DictReader(io.StringIO(cleaned), dialect=dialect)
 
-def validar_csv_pagos_masivos(csv_file, empresa):
+def validar_csv_pagos_masivos(csv_file, empresa, incluir_resumen=False):
     """
     Valida un archivo CSV de pagos masivos SIN aplicar los pagos.
     Retorna los pagos válidos y errores encontrados.
+
+    Los créditos ACTIVO/EN_MORA de la empresa se cargan en un índice por cédula
+    con una sola consulta y las filas se validan contra ese índice.
+
+    Con `incluir_resumen=True` retorna además un dict con las cédulas repetidas
+    (cédula -> filas), el total por crédito (credito_id -> Decimal) y el monto total.
     """
     pagos_validos = []
     errores = []
+    filas_por_cedula = defaultdict(list)
+    totales_por_credito = defaultdict(lambda: Decimal('0.00'))
 
     try:
+        indice_creditos = obtener_creditos_libranza_por_cedula(empresa)
         reader = _leer_csv_pagos(csv_file)
 
         for i, row in enumerate(reader, start=2):
-            normalized = {k.strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
-            cedula_raw = (normalized.get('cedula') or '').strip()
-            monto_str = (normalized.get('monto_a_pagar') or '').strip()
+            cedula_raw = row.get('cedula') or ''
+            monto_str = row.get('monto_a_pagar') or ''
 
             if not cedula_raw or not monto_str:
                 errores.append(f"Fila {i}: Faltan datos de cédula o monto.")
@@ -985,21 +1271,19 @@ def validar_csv_pagos_masivos(csv_file, empresa):
                 errores.append(f"Fila {i} (Cédula {cedula}): Monto '{monto_str}' no es válido. Use solo números sin símbolos (Ejemplo: 50000).")
                 continue
 
-            credito = Credito.objects.filter(
-                linea=Credito.LineaCredito.LIBRANZA,
-                detalle_libranza__empresa=empresa,
-                detalle_libranza__cedula=cedula,
-                estado__in=[Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]
-            ).select_related('detalle_libranza').first()
+            credito = indice_creditos.get(cedula)
 
             if not credito:
                 errores.append(f"Fila {i}: No se encontró un crédito activo para la cédula {cedula}.")
                 continue
 
+            filas_por_cedula[cedula].append(i)
+            totales_por_credito[credito['credito_id']] += monto_a_pagar
+
             pagos_validos.append({
-                'credito_id': credito.id,
+                'credito_id': credito['credito_id'],
                 'cedula': cedula,
-                'nombre': credito.detalle_libranza.nombre_completo,
+                'nombre': credito['nombre'],
                 'monto': monto_a_pagar,
                 'fila': i
             })
@@ -1008,93 +1292,374 @@ def validar_csv_pagos_masivos(csv_file, empresa):
         logger.error(f"Error al leer CSV: {str(e)}")
         errores.append(f"Error al procesar el archivo: {str(e)}")
 
-    return pagos_validos, errores
+    if not incluir_resumen:
+        return pagos_validos, errores
+
+    resumen = {
+        'cedulas_duplicadas': {cedula: filas for cedula, filas in filas_por_cedula.items() if len(filas) > 1},
+        'totales_por_credito': dict(totales_por_credito),
+        'monto_total': sum(totales_por_credito.values(), Decimal('0.00')),
+    }
+    return pagos_validos, errores, resumen
 
 
 def procesar_pagos_masivos_csv(csv_file, empresa):
     """
     Procesa un archivo CSV de pagos masivos para los créditos de una empresa.
+
+    Las filas se leen completas antes de tocar la base de datos: las cédulas se
+    resuelven en una sola consulta y los pagos se aplican como lote con
+    `aplicar_pagos_masivos`.
     """
-    pagos_exitosos = 0
     errores = []
+    filas = []
 
     try:
         reader = _leer_csv_pagos(csv_file)
 
-        with transaction.atomic():
-            for i, row in enumerate(reader, start=2):
-                normalized = {k.strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
-                cedula = (normalized.get('cedula') or '').strip()
-                monto_str = (normalized.get('monto_a_pagar') or '').strip()
+        for i, row in enumerate(reader, start=2):
+            cedula = row.get('cedula') or ''
+            monto_str = row.get('monto_a_pagar') or ''
 
-                if not cedula or not monto_str:
-                    errores.append(f"Fila {i}: Faltan datos de cédula o monto.")
-                    continue
+            if not cedula or not monto_str:
+                errores.append((i, f"Fila {i}: Faltan datos de cédula o monto."))
+                continue
 
-                try:
-                    monto_limpio = monto_str.replace('$', '').replace('.', '').replace(' ', '').replace(',', '')
-                    monto_a_pagar = Decimal(monto_limpio)
-                    if monto_a_pagar <= 0:
-                        raise ValueError("El monto debe ser positivo.")
-                except (ValueError, TypeError, ConversionSyntax):
-                    errores.append(f"Fila {i} (Cédula {cedula}): Monto '{monto_str}' no es un número válido.")
-                    continue
-
-                credito = Credito.objects.filter(
-                    linea=Credito.LineaCredito.LIBRANZA,
-                    detalle_libranza__empresa=empresa,
-                    detalle_libranza__cedula=cedula,
-                    estado__in=[Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]
-                ).select_related('detalle_libranza').first()
-
-                if not credito:
-                    errores.append(f"Fila {i}: No se encontró un crédito activo para la cédula {cedula}.")
-                    continue
-
-                HistorialPago.objects.create(
-                    credito=credito,
-                    monto=monto_a_pagar,
-                    referencia_pago=f"MASIVO-{credito.id}-{timezone.now().strftime('%Y%m%d%H%M%S%f')}",
-                    estado=HistorialPago.EstadoPago.EXITOSO
-                )
+            try:
+                monto_limpio = monto_str.replace('$', '').replace('.', '').replace(' ', '').replace(',', '')
+                monto_a_pagar = Decimal(monto_limpio)
+                if monto_a_pagar <= 0:
+                    raise ValueError("El monto debe ser positivo.")
+            except (ValueError, TypeError, InvalidOperation):
+                errores.append((i, f"Fila {i} (Cédula {cedula}): Monto '{monto_str}' no es un número válido."))
+                continue
 
-                actualizar_saldo_tras_pago(credito, monto_a_pagar)
+            filas.append((i, cedula, monto_a_pagar))
+
+        creditos_por_cedula = obtener_creditos_libranza_por_cedula(empresa, {cedula for _, cedula, _ in filas})
+        marca = timezone.now().strftime('%Y%m%d%H%M%S%f')
+
+        pagos = []
+        for i, cedula, monto_a_pagar in filas:
+            credito = creditos_por_cedula.get(cedula)
+            if not credito:
+                errores.append((i, f"Fila {i}: No se encontró un crédito activo para la cédula {cedula}."))
+                continue
+            credito_id = credito['credito_id']
+            pagos.append({
+                'credito_id': credito_id,
+                'monto': monto_a_pagar,
+                'referencia': f"MASIVO-{credito_id}-{marca}-{i}",
+            })
+
+        pagos_aplicados = aplicar_pagos_masivos(pagos)
 
-                pagos_exitosos += 1
-    
     except Exception as e:
         logger.error(f"Error al procesar pagos masivos: {e}")
-        errores.append(f"Error inesperado al procesar el archivo: {e}")
+        errores.append((float('inf'), f"Error inesperado al procesar el archivo: {e}"))
+        pagos_aplicados = []
+
+    return len(pagos_aplicados), [mensaje for _, mensaje in sorted(errores, key=lambda e: e[0])]
+
+
+def obtener_creditos_libranza_por_cedula(empresa, cedulas=None):
+    """
+    Construye en una sola consulta el índice cédula -> crédito de libranza
+    ACTIVO o EN_MORA de la empresa. Si una cédula tiene varios créditos se toma
+    el más reciente. Sin `cedulas` se indexan todos los créditos de la empresa.
+
+    Returns:
+        dict: cédula -> {'credito_id', 'nombre'}
+    """
+    creditos = Credito.objects.filter(
+        linea=Credito.LineaCredito.LIBRANZA,
+        detalle_libranza__empresa=empresa,
+        estado__in=[Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]
+    )
+    if cedulas is not None:
+        if not cedulas:
+            return {}
+        creditos = creditos.filter(detalle_libranza__cedula__in=cedulas)
+
+    filas = creditos.order_by('-fecha_solicitud').values_list(
+        'detalle_libranza__cedula', 'id', 'detalle_libranza__nombres', 'detalle_libranza__apellidos'
+    )
+
+    indice = {}
+    for cedula, credito_id, nombres, apellidos in filas:
+        indice.setdefault(cedula, {'credito_id': credito_id, 'nombre': f'{nombres} {apellidos}'})
+    return indice
+
+
+def _credito_requiere_completar_datos(credito, creditos_con_tabla):
+    """
+    Indica si el crédito necesita el flujo individual de `actualizar_saldo_tras_pago`,
+    que completa datos financieros faltantes y genera la tabla de amortización.
+    """
+    return (
+        credito.id not in creditos_con_tabla
+        or credito.monto_aprobado is None
+        or credito.tasa_interes is None
+        or credito.comision is None
+        or credito.iva_comision is None
+        or credito.saldo_pendiente is None
+        or credito.capital_pendiente is None
+        or credito.fecha_proximo_pago is None
+        or (credito.plazo and (credito.valor_cuota is None or credito.total_a_pagar is None))
+    )
+
+
+def aplicar_pagos_masivos(pagos):
+    """
+    Aplica un lote de pagos exitosos con operaciones por conjunto.
+
+    Pasos:
+    1. Descarta las referencias ya registradas (reprocesar un lote es idempotente)
+    2. Bloquea todos los créditos del lote con un único `select_for_update` ordenado por id
+    3. Carga en una consulta las cuotas pendientes de todos los créditos
+    4. Calcula en memoria saldos, reparto en cuotas y cambios de estado, en el
+       orden en que llegan los pagos (un crédito puede recibir varios)
+    5. Persiste con `bulk_create` / `bulk_update`
+    6. Registra los correos de confirmación y de cambio de estado en la bandeja de salida
+
+    Los créditos con datos financieros incompletos o sin tabla de amortización
+    pasan por `actualizar_saldo_tras_pago`, que sabe completarlos.
+
+    Args:
+        pagos (list[dict]): credito_id, monto (Decimal) y referencia (str) de cada pago
+
+    Returns:
+        list[HistorialPago]: Pagos registrados en este llamado
+    """
+    if not pagos:
+        return []
+
+    ahora = timezone.now()
+    hoy = ahora.date()
+
+    with transaction.atomic():
+        referencias_existentes = set(
+            HistorialPago.objects.filter(
+                referencia_pago__in=[p['referencia'] for p in pagos]
+            ).values_list('referencia_pago', flat=True)
+        )
+        pendientes = []
+        for pago in pagos:
+            if pago['referencia'] in referencias_existentes:
+                continue
+            referencias_existentes.add(pago['referencia'])
+            pendientes.append(pago)
+
+        credito_ids = sorted({p['credito_id'] for p in pendientes})
+        creditos = {
+            credito.id: credito
+            for credito in Credito.objects.select_for_update().filter(id__in=credito_ids).order_by('id')
+        }
+        creditos_con_tabla = set(
+            CuotaAmortizacion.objects.filter(credito_id__in=credito_ids).values_list('credito_id', flat=True).distinct()
+        )
+        cuotas_por_credito = defaultdict(list)
+        for cuota in CuotaAmortizacion.objects.filter(
+            credito_id__in=credito_ids, pagada=False
+        ).order_by('credito_id', 'numero_cuota'):
+            cuotas_por_credito[cuota.credito_id].append(cuota)
+
+        historial_pagos = []
+        historial_estados = []
+        cuotas_modificadas = {}
+        creditos_modificados = {}
+        creditos_completados = set()
+        correos = []
+        cambios_estado = []
+        emails_por_credito = dict(
+            Credito.objects.filter(id__in=credito_ids).values_list('id', 'usuario__email')
+        )
+
+        for pago in pendientes:
+            credito = creditos.get(pago['credito_id'])
+            if credito is None:
+                logger.warning(f"Pago masivo {pago['referencia']} omitido: el crédito {pago['credito_id']} no existe.")
+                continue
+
+            monto = Decimal(pago['monto'])
+            historial_pagos.append(HistorialPago(
+                credito=credito,
+                monto=monto,
+                referencia_pago=pago['referencia'],
+                estado=HistorialPago.EstadoPago.EXITOSO,
+            ))
+
+            if _credito_requiere_completar_datos(credito, creditos_con_tabla):
+                actualizar_saldo_tras_pago(credito, monto, pago=historial_pagos[-1])
+                # Sus totales se recalculan después del bulk_create, que es cuando el pago ya existe
+                creditos_completados.add(credito.id)
+                continue
+
+            resultado = _calcular_pago_credito(credito, monto, hoy)
+            asignacion = _distribuir_pago_en_cuotas(cuotas_por_credito[credito.id], monto, ahora)
+            asignacion.registrar_en(historial_pagos[-1])
+            for cuota in asignacion.cuotas:
+                cuotas_modificadas[cuota.id] = cuota
+
+            nuevo_estado = resultado['nuevo_estado']
+            if nuevo_estado:
+                motivo = MOTIVOS_CAMBIO_ESTADO_POR_PAGO[nuevo_estado]
+                historial_estados.append(HistorialEstado(
+                    credito=credito,
+                    estado_anterior=credito.estado,
+                    estado_nuevo=nuevo_estado,
+                    motivo=motivo,
+                ))
+                credito.estado = nuevo_estado
+                cambios_estado.append(credito.id)
+                if nuevo_estado in ESTADOS_CON_CORREO:
+                    correos.append(CorreoSaliente(
+                        tipo=CorreoSaliente.TipoCorreo.CAMBIO_ESTADO,
+                        credito_id=credito.id,
+                        destinatario=emails_por_credito.get(credito.id) or '',
+                        clave=f"pago-estado:{pago['referencia']}:{nuevo_estado}",
+                        datos={'nuevo_estado': nuevo_estado, 'motivo': motivo},
+                    ))
+
+            credito.fecha_actualizacion = ahora
+            creditos_modificados[credito.id] = credito
+            correos.append(CorreoSaliente(
+                tipo=CorreoSaliente.TipoCorreo.CONFIRMACION_PAGO,
+                credito_id=credito.id,
+                destinatario=emails_por_credito.get(credito.id) or '',
+                clave=f"pago:{pago['referencia']}",
+                datos={'monto': str(monto), 'saldo': str(credito.saldo_pendiente)},
+            ))
+
+        HistorialPago.objects.bulk_create(historial_pagos, batch_size=500)
+        CuotaAmortizacion.objects.bulk_update(
+            list(cuotas_modificadas.values()),
+            CAMPOS_PAGO_CUOTA,
+            batch_size=500
+        )
+        Credito.objects.bulk_update(
+            list(creditos_modificados.values()),
+            ['saldo_pendiente', 'capital_pendiente', 'fecha_proximo_pago', 'estado', 'fecha_actualizacion'],
+            batch_size=500
+        )
+        HistorialEstado.objects.bulk_create(historial_estados, batch_size=500)
+
+        if creditos_modificados:
+            actualizar_mora_creditos(list(creditos_modificados), instancias=list(creditos_modificados.values()))
+            actualizar_totales_pagados(list(creditos_modificados), instancias=list(creditos_modificados.values()))
+            saldo_credito_actualizado.send(sender=Credito, credito_ids=list(creditos_modificados))
+        if creditos_completados:
+            actualizar_totales_pagados(
+                list(creditos_completados), instancias=[creditos[credito_id] for credito_id in creditos_completados]
+            )
+        if cambios_estado:
+            estado_credito_cambiado.send(sender=Credito, credito_ids=cambios_estado)
+        correo_saliente_service.encolar_correos(correos)
+
+    logger.info(
+        f"Lote de pagos masivos aplicado: {len(historial_pagos)} pagos, "
+        f"{len(creditos_modificados)} créditos, {len(cuotas_modificadas)} cuotas, "
+        f"{len(historial_estados)} cambios de estado."
+    )
+    return historial_pagos
+
+
+MOTIVO_ENTRADA_MORA = 'El crédito ha entrado en mora por vencimiento de la fecha de pago.'
+NOTIFICACIONES_MORA_POR_TAREA = 200
 
-    return pagos_exitosos, errores
 
 def marcar_creditos_en_mora():
     """
     Busca créditos activos cuya fecha de pago ha vencido y los marca como EN_MORA.
-    Utiliza el servicio centralizado de cambio de estado.
+
+    La transición se hace por lotes: un único UPDATE ... RETURNING cambia el
+    estado de todos los créditos vencidos, el historial se inserta con
+    bulk_create y los correos se encolan en Celery por bloques al confirmar la
+    transacción. El número de consultas no depende del tamaño de la cartera.
     Retorna el número de créditos actualizados.
     """
     hoy = timezone.now().date()
-    #? Se buscan los créditos que tienen una fecha de próximo pago vencida en cualquiera de sus detalles
-    creditos_vencidos = Credito.objects.filter(
-        estado=Credito.EstadoCredito.ACTIVO,
-        fecha_proximo_pago__lt=hoy
-    ).distinct()
-
-    creditos_actualizados = 0
-    for credito in creditos_vencidos:
-        try:
-            gestionar_cambio_estado_credito(
-                credito=credito,
-                nuevo_estado=Credito.EstadoCredito.EN_MORA,
-                motivo='El crédito ha entrado en mora por vencimiento de la fecha de pago.',
+
+    with transaction.atomic():
+        credito_ids = _actualizar_creditos_vencidos_a_mora(hoy)
+        if not credito_ids:
+            return 0
+
+        HistorialEstado.objects.bulk_create([
+            HistorialEstado(
+                credito_id=credito_id,
+                estado_anterior=Credito.EstadoCredito.ACTIVO,
+                estado_nuevo=Credito.EstadoCredito.EN_MORA,
+                motivo=MOTIVO_ENTRADA_MORA,
                 usuario_modificacion=None  #? Es un proceso automático
             )
-            creditos_actualizados += 1
+            for credito_id in credito_ids
+        ])
+        estado_credito_cambiado.send(sender=Credito, credito_ids=credito_ids)
+        transaction.on_commit(partial(_encolar_notificaciones_mora, credito_ids))
+
+    logger.info(f"{len(credito_ids)} créditos marcados EN_MORA. Motivo: {MOTIVO_ENTRADA_MORA}")
+    return len(credito_ids)
+
+
+def _actualizar_creditos_vencidos_a_mora(hoy):
+    """
+    Cambia a EN_MORA los créditos ACTIVO con fecha de próximo pago vencida y
+    retorna sus ids. Usa UPDATE ... RETURNING en PostgreSQL y SQLite >= 3.35;
+    en otros motores bloquea las filas y actualiza por ids.
+    """
+    ahora = timezone.now()
+    soporta_returning = connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+    if not soporta_returning:
+        vencidos = Credito.objects.select_for_update().filter(
+            estado=Credito.EstadoCredito.ACTIVO,
+            fecha_proximo_pago__lt=hoy
+        )
+        credito_ids = sorted(vencidos.values_list('id', flat=True))
+        Credito.objects.filter(id__in=credito_ids).update(
+            estado=Credito.EstadoCredito.EN_MORA,
+            fecha_actualizacion=ahora
+        )
+        return credito_ids
+
+    qn = connection.ops.quote_name
+    opts = Credito._meta
+    sql = (
+        f"UPDATE {qn(opts.db_table)} "
+        f"SET {qn(opts.get_field('estado').column)} = %s, {qn(opts.get_field('fecha_actualizacion').column)} = %s "
+        f"WHERE {qn(opts.get_field('estado').column)} = %s AND {qn(opts.get_field('fecha_proximo_pago').column)} < %s "
+        f"RETURNING {qn(opts.pk.column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            Credito.EstadoCredito.EN_MORA,
+            connection.ops.adapt_datetimefield_value(ahora),
+            Credito.EstadoCredito.ACTIVO,
+            connection.ops.adapt_datefield_value(hoy),
+        ])
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def _encolar_notificaciones_mora(credito_ids):
+    """
+    Reparte los avisos de entrada en mora en tareas de Celery de tamaño fijo.
+    Si el broker no está disponible, los envía en línea para no perderlos.
+    """
+    from .tasks import enviar_notificaciones_mora_task
+
+    bloques = [
+        credito_ids[i:i + NOTIFICACIONES_MORA_POR_TAREA]
+        for i in range(0, len(credito_ids), NOTIFICACIONES_MORA_POR_TAREA)
+    ]
+    for bloque in bloques:
+        try:
+            enviar_notificaciones_mora_task.delay(bloque)
         except Exception as e:
-            logger.error(f"Error al marcar en mora el crédito {credito.numero_credito}: {e}")
-            
-    return creditos_actualizados
+            logger.error(f"No se pudieron encolar los avisos de mora, se envían en línea: {e}")
+            enviar_notificaciones_mora_task(bloque)
 
 @transaction.atomic
 def gestionar_consignacion_billetera(movimiento_id: int, es_aprobado: bool, usuario_admin, nota: str):
@@ -1177,24 +1742,26 @@ def calcular_cuotas_restantes(credito):
     return cuotas_pendientes
 
 
-def generar_plan_pagos_actual(credito):
+def generar_plan_pagos_actual(credito, cuotas_pendientes=None):
     """
     Genera un JSON con el plan de pagos actual del crédito.
 
     Args:
         credito: Instancia del modelo Credito
+        cuotas_pendientes (list, opcional): Cuotas pendientes ya cargadas, en orden
 
     Returns:
         dict: Plan de pagos con cuotas restantes
     """
-    cuotas_pendientes = credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota')
+    if cuotas_pendientes is None:
+        cuotas_pendientes = list(credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota'))
 
     plan = {
         'cuotas': [],
         'total_capital': Decimal('0.00'),
         'total_intereses': Decimal('0.00'),
         'total_pagar': Decimal('0.00'),
-        'num_cuotas': cuotas_pendientes.count()
+        'num_cuotas': len(cuotas_pendientes)
     }
 
     for cuota in cuotas_pendientes:
@@ -1218,7 +1785,7 @@ def generar_plan_pagos_actual(credito):
     return plan
 
 
-def calcular_plan_con_abono(credito, monto_abono, tipo_abono='NORMAL'):
+def calcular_plan_con_abono(credito, monto_abono, tipo_abono='NORMAL', cuotas_pendientes=None):
     """
     Calcula el nuevo plan de pagos después de aplicar un abono.
 
@@ -1226,14 +1793,14 @@ def calcular_plan_con_abono(credito, monto_abono, tipo_abono='NORMAL'):
         credito: Instancia del modelo Credito
         monto_abono (Decimal): Monto del abono
         tipo_abono (str): 'NORMAL', 'CAPITAL', o 'MAYOR'
+        cuotas_pendientes (list, opcional): Cuotas pendientes ya cargadas, en orden
 
     Returns:
         dict: Nuevo plan de pagos después del abono
     """
-    from .models import ReestructuracionCredito
-
     # Obtener cuotas pendientes
-    cuotas_pendientes = list(credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota'))
+    if cuotas_pendientes is None:
+        cuotas_pendientes = list(credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota'))
 
     if not cuotas_pendientes:
         return {
@@ -1244,50 +1811,29 @@ def calcular_plan_con_abono(credito, monto_abono, tipo_abono='NORMAL'):
             'num_cuotas': 0
         }
 
-    tasa_mensual = credito.tasa_interes / Decimal('100')  # Convertir porcentaje a decimal
     monto_restante = monto_abono
 
     if tipo_abono == 'CAPITAL':
         # Abono directo a capital - reduce el saldo pero mantiene el mismo plazo
-        nuevo_capital_pendiente = max(Decimal('0.00'), credito.capital_pendiente - monto_abono)
-
-        # Recalcular cuotas con el nuevo capital
-        if nuevo_capital_pendiente > 0:
-            cuotas_restantes = len(cuotas_pendientes)
-            nueva_cuota = calcular_cuota_fija(nuevo_capital_pendiente, tasa_mensual, cuotas_restantes)
-        else:
-            nueva_cuota = Decimal('0.00')
-            cuotas_restantes = 0
-
-        # Generar nuevo plan
+        tabla = _tabla_abono_capital(credito, monto_abono, cuotas_pendientes)
         plan = {
-            'cuotas': [],
-            'total_capital': Decimal('0.00'),
-            'total_intereses': Decimal('0.00'),
-            'total_pagar': Decimal('0.00'),
-            'num_cuotas': cuotas_restantes
+            'cuotas': [
+                {
+                    'numero': cuota['numero'],
+                    'fecha_vencimiento': cuota['fecha_vencimiento'].isoformat(),
+                    'capital': float(cuota['capital']),
+                    'interes': float(cuota['interes']),
+                    'cuota': float(cuota['cuota']),
+                    'saldo_pendiente': float(cuota['saldo_pendiente'])
+                }
+                for cuota in tabla['cuotas']
+            ],
+            'total_capital': tabla['total_capital'],
+            'total_intereses': tabla['total_intereses'],
+            'total_pagar': tabla['total_pagar'],
+            'num_cuotas': len(tabla['cuotas'])
         }
 
-        saldo = nuevo_capital_pendiente
-        fecha_base = cuotas_pendientes[0].fecha_vencimiento
-
-        for i in range(cuotas_restantes):
-            interes = saldo * tasa_mensual
-            capital = nueva_cuota - interes
-            saldo -= capital
-
-            plan['cuotas'].append({
-                'numero': cuotas_pendientes[0].numero_cuota + i,
-                'fecha_vencimiento': (fecha_base + relativedelta(months=i)).isoformat(),
-                'capital': float(capital),
-                'interes': float(interes),
-                'cuota': float(nueva_cuota),
-                'saldo_pendiente': float(max(Decimal('0.00'), saldo))
-            })
-            plan['total_capital'] += capital
-            plan['total_intereses'] += interes
-            plan['total_pagar'] += nueva_cuota
-
     else:  # NORMAL o MAYOR
         # Abono que paga cuotas completas desde la más próxima
         plan = {
@@ -1328,29 +1874,23 @@ def calcular_plan_con_abono(credito, monto_abono, tipo_abono='NORMAL'):
     return plan
 
 
-def calcular_cuota_fija(capital, tasa_mensual, num_cuotas):
+def _tabla_abono_capital(credito, monto_abono, cuotas_pendientes):
     """
-    Calcula el valor de la cuota fija usando la fórmula de amortización francesa.
-
-    Args:
-        capital (Decimal): Capital a financiar
-        tasa_mensual (Decimal): Tasa de interés mensual (en decimal, ej: 0.02 para 2%)
-        num_cuotas (int): Número de cuotas
-
-    Returns:
-        Decimal: Valor de la cuota mensual
+    Tabla que reemplaza las cuotas pendientes tras un abono a capital: el
+    capital pendiente menos el abono, amortizado en el mismo número de cuotas
+    desde la próxima. Montos Decimal del motor de amortización.
     """
-    if num_cuotas == 0 or capital == 0:
-        return Decimal('0.00')
-
-    if tasa_mensual == 0:
-        return capital / num_cuotas
-
-    # Fórmula: C = P * (i * (1 + i)^n) / ((1 + i)^n - 1)
-    factor = (1 + tasa_mensual) ** num_cuotas
-    cuota = capital * (tasa_mensual * factor) / (factor - 1)
-
-    return cuota.quantize(Decimal('0.01'))
+    nuevo_capital_pendiente = max(Decimal('0.00'), (credito.capital_pendiente or Decimal('0.00')) - monto_abono)
+    cuotas_restantes = len(cuotas_pendientes) if nuevo_capital_pendiente > 0 else 0
+    primera = cuotas_pendientes[0] if cuotas_pendientes else None
+
+    return generar_tabla_amortizacion(
+        capital=nuevo_capital_pendiente,
+        tasa_mensual=credito.tasa_interes / Decimal('100'),
+        plazo=cuotas_restantes,
+        fecha_primera_cuota=primera.fecha_vencimiento if primera else None,
+        numero_inicial=primera.numero_cuota if primera else 1,
+    )
 
 
 def calcular_ahorro_intereses(credito, monto_abono, tipo_abono='NORMAL'):
@@ -1365,12 +1905,7 @@ def calcular_ahorro_intereses(credito, monto_abono, tipo_abono='NORMAL'):
     Returns:
         Decimal: Ahorro en intereses
     """
-    plan_actual = generar_plan_pagos_actual(credito)
-    plan_nuevo = calcular_plan_con_abono(credito, monto_abono, tipo_abono)
-
-    ahorro = Decimal(str(plan_actual['total_intereses'])) - Decimal(str(plan_nuevo['total_intereses']))
-
-    return max(Decimal('0.00'), ahorro)
+    return SimulacionAbono(credito).ahorro_intereses(monto_abono, tipo_abono)
 
 
 def analizar_abono_credito(credito, monto_abono, tipo_abono='NORMAL'):
@@ -1385,63 +1920,11 @@ def analizar_abono_credito(credito, monto_abono, tipo_abono='NORMAL'):
     Returns:
         dict: Información sobre el abono y si requiere reestructuración
     """
-    from .models import ReestructuracionCredito
-
-    cuota_normal = credito.valor_cuota or Decimal('0.00')
-
-    # Determinar si requiere reestructuración
-    requiere_reestructuracion = (
-        tipo_abono == 'CAPITAL' or
-        monto_abono > (cuota_normal * 2)
-    )
-
-    # Obtener planes
-    plan_actual = generar_plan_pagos_actual(credito)
-    plan_nuevo = calcular_plan_con_abono(credito, monto_abono, tipo_abono)
-
-    # Calcular ahorro
-    ahorro = calcular_ahorro_intereses(credito, monto_abono, tipo_abono)
-
-    # Calcular nuevo plazo
-    nuevo_plazo = plan_nuevo['num_cuotas']
-    plazo_actual = plan_actual['num_cuotas']
-
-    # Calcular nueva cuota mensual (si cambió)
-    nueva_cuota = None
-    if tipo_abono == 'CAPITAL' and plan_nuevo['num_cuotas'] > 0:
-        nueva_cuota = Decimal(str(plan_nuevo['cuotas'][0]['cuota']))
-
-    resultado = {
-        'requiere_reestructuracion': requiere_reestructuracion,
-        'plan_actual': plan_actual,
-        'plan_nuevo': plan_nuevo,
-        'ahorro_intereses': float(ahorro),
-        'tipo_abono_calculado': tipo_abono,
-        'plazo_actual': plazo_actual,
-        'nuevo_plazo': nuevo_plazo,
-        'cuota_actual': float(cuota_normal),
-        'nueva_cuota': float(nueva_cuota) if nueva_cuota else float(cuota_normal),
-        'advertencia': None
-    }
-
-    if requiere_reestructuracion:
-        if tipo_abono == 'CAPITAL':
-            resultado['advertencia'] = (
-                'Este abono a capital reducirá significativamente sus intereses, '
-                'pero su cuota mensual cambiará. El plan de pagos será reestructurado.'
-            )
-        else:
-            resultado['advertencia'] = (
-                f'Este abono de ${monto_abono:,.0f} cubre más de 2 cuotas. '
-                f'Su plan de pagos será reestructurado, ahorrará ${ahorro:,.0f} en intereses '
-                f'y su nuevo plazo será de {nuevo_plazo} cuotas.'
-            )
-
-    return resultado
+    return SimulacionAbono(credito).analizar(monto_abono, tipo_abono)
 
 
 @transaction.atomic
-def aplicar_abono_credito(credito, monto_abono, tipo_abono, usuario, referencia_pago):
+def aplicar_abono_credito(credito, monto_abono, tipo_abono, usuario, referencia_pago, analisis=None):
     """
     Aplica un abono al crédito, crea el registro de reestructuración si es necesario,
     y actualiza la tabla de amortización.
@@ -1452,6 +1935,8 @@ def aplicar_abono_credito(credito, monto_abono, tipo_abono, usuario, referencia_
         tipo_abono (str): 'NORMAL', 'CAPITAL', o 'MAYOR'
         usuario: Usuario que aprueba el abono
         referencia_pago (str): Referencia del pago que generó el abono
+        analisis (dict, opcional): Análisis ya calculado para este crédito y abono
+            (`simulacion_abono_service.analizar_abono_cacheado`)
 
     Returns:
         tuple: (HistorialPago, ReestructuracionCredito o None)
@@ -1459,7 +1944,8 @@ def aplicar_abono_credito(credito, monto_abono, tipo_abono, usuario, referencia_
     from .models import ReestructuracionCredito
 
     # Analizar el abono
-    analisis = analizar_abono_credito(credito, monto_abono, tipo_abono)
+    if analisis is None:
+        analisis = analizar_abono_credito(credito, monto_abono, tipo_abono)
 
     # Crear el registro del pago
     pago = HistorialPago.objects.create(
@@ -1473,7 +1959,7 @@ def aplicar_abono_credito(credito, monto_abono, tipo_abono, usuario, referencia_
     # Guardar estado anterior del crédito
     saldo_anterior = credito.saldo_pendiente or Decimal('0.00')
     capital_anterior = credito.capital_pendiente or Decimal('0.00')
-    plazo_anterior = calcular_cuotas_restantes(credito)
+    plazo_anterior = analisis['plazo_actual']
 
     # Si requiere reestructuración, crear el registro
     reestructuracion = None
@@ -1497,20 +1983,19 @@ def aplicar_abono_credito(credito, monto_abono, tipo_abono, usuario, referencia_
             observaciones=analisis['advertencia'] or ''
         )
 
-    # Actualizar tabla de amortización
+    # Actualizar tabla de amortización y campos del crédito
     if tipo_abono == 'CAPITAL':
         # Abono a capital: recalcular todas las cuotas pendientes
-        _recalcular_amortizacion_por_capital(credito, analisis['plan_nuevo'])
+        tabla = _recalcular_amortizacion_por_capital(credito, monto_abono)
+        credito.saldo_pendiente = tabla['total_pagar']
+        credito.capital_pendiente = tabla['total_capital']
+        if tabla['cuotas']:
+            credito.valor_cuota = tabla['valor_cuota']
     else:
         # Abono normal/mayor: marcar cuotas pagadas
         _marcar_cuotas_pagadas(credito, monto_abono, pago)
-
-    # Actualizar campos del crédito
-    credito.saldo_pendiente = Decimal(str(analisis['plan_nuevo']['total_pagar']))
-    credito.capital_pendiente = Decimal(str(analisis['plan_nuevo']['total_capital']))
-
-    if tipo_abono == 'CAPITAL' and analisis['nueva_cuota']:
-        credito.valor_cuota = Decimal(str(analisis['nueva_cuota']))
+        credito.saldo_pendiente = Decimal(str(analisis['plan_nuevo']['total_pagar']))
+        credito.capital_pendiente = Decimal(str(analisis['plan_nuevo']['total_capital']))
 
     # Si se pagó todo el crédito, cambiar estado
     if credito.saldo_pendiente <= Decimal('0.01'):
@@ -1519,6 +2004,12 @@ def aplicar_abono_credito(credito, monto_abono, tipo_abono, usuario, referencia_
         credito.capital_pendiente = Decimal('0.00')
 
     credito.save()
+    actualizar_mora_creditos([credito.id], instancias=[credito])
+    actualizar_totales_pagados([credito.id], instancias=[credito])
+    # Invalida los KPIs de saldo y, si el abono saldó el crédito, los de estado
+    saldo_credito_actualizado.send(sender=Credito, credito_ids=[credito.id])
+    if credito.estado == Credito.EstadoCredito.PAGADO:
+        estado_credito_cambiado.send(sender=Credito, credito_ids=[credito.id])
 
     logger.info(
         f"Abono aplicado al crédito {credito.numero_credito}. "
@@ -1529,65 +2020,47 @@ def aplicar_abono_credito(credito, monto_abono, tipo_abono, usuario, referencia_
     return pago, reestructuracion
 
 
-def _recalcular_amortizacion_por_capital(credito, plan_nuevo):
+def _recalcular_amortizacion_por_capital(credito, monto_abono):
     """
     Recalcula la tabla de amortización cuando se hace un abono a capital.
-    Elimina las cuotas pendientes y crea nuevas con los valores recalculados.
+    Elimina las cuotas pendientes y crea las nuevas con un único `bulk_create`,
+    con los montos Decimal del motor de amortización.
 
     Args:
-        credito: Instancia del modelo Credito
-        plan_nuevo (dict): Nuevo plan de pagos
+        credito: Instancia del modelo Credito (con el capital previo al abono)
+        monto_abono (Decimal): Monto del abono
+
+    Returns:
+        dict: Tabla del motor de amortización con las nuevas cuotas
     """
-    # Eliminar cuotas pendientes
-    credito.tabla_amortizacion.filter(pagada=False).delete()
+    cuotas_pendientes = credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota')
+    tabla = _tabla_abono_capital(credito, monto_abono, list(cuotas_pendientes))
 
-    # Crear nuevas cuotas
-    for cuota_data in plan_nuevo['cuotas']:
-        CuotaAmortizacion.objects.create(
-            credito=credito,
-            numero_cuota=cuota_data['numero'],
-            fecha_vencimiento=datetime.fromisoformat(cuota_data['fecha_vencimiento']).date(),
-            capital_a_pagar=Decimal(str(cuota_data['capital'])),
-            interes_a_pagar=Decimal(str(cuota_data['interes'])),
-            valor_cuota=Decimal(str(cuota_data['cuota'])),
-            saldo_capital_pendiente=Decimal(str(cuota_data['saldo_pendiente'])),
-            pagada=False
-        )
+    cuotas_pendientes.delete()
+    CuotaAmortizacion.objects.bulk_create(_construir_cuotas_amortizacion(credito, tabla))
 
     logger.info(f"Tabla de amortización recalculada para crédito {credito.numero_credito}")
+    return tabla
 
 
 def _marcar_cuotas_pagadas(credito, monto_abono, pago):
     """
     Marca cuotas como pagadas cuando se hace un abono normal o mayor.
 
+    Solo se marcan cuotas completas; el reparto se calcula en memoria y se
+    guarda con un único `bulk_update`.
+
     Args:
         credito: Instancia del modelo Credito
         monto_abono (Decimal): Monto del abono
         pago: Instancia de HistorialPago
     """
-    monto_restante = monto_abono
     cuotas_pendientes = credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota')
+    asignacion = _distribuir_pago_en_cuotas(
+        cuotas_pendientes, monto_abono, timezone.now(), permitir_parcial=False
+    )
+    CuotaAmortizacion.objects.bulk_update(asignacion.cuotas, CAMPOS_PAGO_CUOTA)
 
-    for cuota in cuotas_pendientes:
-        if monto_restante >= cuota.valor_cuota:
-            # Marcar cuota como pagada
-            cuota.pagada = True
-            cuota.fecha_pago = timezone.now()
-            cuota.monto_pagado = cuota.valor_cuota
-            cuota.save()
-
-            monto_restante -= cuota.valor_cuota
-
-            # Actualizar el desglose del pago
-            if pago.capital_abonado is None:
-                pago.capital_abonado = Decimal('0.00')
-                pago.intereses_pagados = Decimal('0.00')
-
-            pago.capital_abonado += cuota.capital_a_pagar
-            pago.intereses_pagados += cuota.interes_a_pagar
-        else:
-            break
-
-    pago.save()
+    asignacion.registrar_en(pago)
+    pago.save(update_fields=CAMPOS_ASIGNACION_PAGO)
     logger.info(f"Cuotas marcadas como pagadas para crédito {credito.numero_credito}")
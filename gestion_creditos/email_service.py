@@ -13,7 +13,7 @@ Configuración:
 """
 import logging
 import io
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail, EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string, get_template
 from django.conf import settings
 from django.utils import timezone
@@ -24,6 +24,9 @@ from .models import Credito
 
 logger = logging.getLogger(__name__)
 
+# Gmail corta las sesiones SMTP largas; se reabre la conexión cada tantos mensajes
+MENSAJES_POR_CONEXION_SMTP = 100
+
 
 def _obtener_resumen_cuenta_destino(detalle):
     """
@@ -114,6 +117,58 @@ def enviar_notificacion_interna_nueva_solicitud(credito):
         return False
 
 
+def construir_email_html(destinatario, asunto, template_html, context):
+    """
+    Arma (sin enviar) un email con contenido HTML y texto plano como fallback.
+    """
+    html_content = render_to_string(template_html, context)
+    email = EmailMultiAlternatives(
+        subject=asunto,
+        body=context.get('mensaje_texto', ''),  # Texto plano como fallback
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[destinatario]
+    )
+    email.attach_alternative(html_content, "text/html")
+    return email
+
+
+def enviar_emails_en_lote(mensajes):
+    """
+    Envía varios emails reutilizando una sola conexión SMTP autenticada
+    (se reabre cada `MENSAJES_POR_CONEXION_SMTP` mensajes). Un fallo en un
+    mensaje no detiene el resto del lote.
+
+    Args:
+        mensajes (list[EmailMessage]): Emails ya armados
+
+    Returns:
+        list: Por cada mensaje, None si se envió o la excepción que lo impidió
+    """
+    resultados = []
+    for inicio in range(0, len(mensajes), MENSAJES_POR_CONEXION_SMTP):
+        bloque = mensajes[inicio:inicio + MENSAJES_POR_CONEXION_SMTP]
+        conexion = get_connection()
+        try:
+            conexion.open()
+        except Exception as e:
+            logger.error(f"No se pudo abrir la conexión SMTP para {len(bloque)} emails: {e}")
+            resultados.extend([e] * len(bloque))
+            continue
+
+        try:
+            for mensaje in bloque:
+                try:
+                    # La conexión ya está abierta: send_messages no la cierra
+                    conexion.send_messages([mensaje])
+                    resultados.append(None)
+                except Exception as e:
+                    logger.error(f"Error al enviar email a {', '.join(mensaje.to)}: {e}")
+                    resultados.append(e)
+        finally:
+            conexion.close()
+    return resultados
+
+
 def enviar_email_html(destinatario, asunto, template_html, context, template_text=None):
     """
     Envía un email con contenido HTML y texto plano como fallback.
@@ -129,17 +184,7 @@ def enviar_email_html(destinatario, asunto, template_html, context, template_tex
         bool: True si se envió exitosamente, False en caso contrario
     """
     try:
-        # Renderizar contenido HTML
-        html_content = render_to_string(template_html, context)
-
-        # Crear email con alternativas
-        email = EmailMultiAlternatives(
-            subject=asunto,
-            body=context.get('mensaje_texto', ''),  # Texto plano como fallback
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[destinatario]
-        )
-        email.attach_alternative(html_content, "text/html")
+        email = construir_email_html(destinatario, asunto, template_html, context)
         email.send()
 
         logger.info(f"Email enviado exitosamente a {destinatario}: {asunto}")
@@ -150,50 +195,51 @@ def enviar_email_html(destinatario, asunto, template_html, context, template_tex
         return False
 
 
-def enviar_notificacion_cambio_estado(credito, nuevo_estado, motivo=""):
+# Asunto y plantilla del aviso al cliente según el nuevo estado del crédito.
+# NOTA: APROBADO no envía email porque se integra con el proveedor de firma
+CORREOS_CAMBIO_ESTADO = {
+    Credito.EstadoCredito.EN_REVISION: {
+        'asunto': 'Tu solicitud de crédito ha sido recibida',
+        'template': 'emails/credito_en_revision.html',
+    },
+    Credito.EstadoCredito.RECHAZADO: {
+        'asunto': 'Actualización sobre tu solicitud de crédito',
+        'template': 'emails/credito_rechazado.html',
+    },
+    Credito.EstadoCredito.ACTIVO: {
+        'asunto': '¡Tu crédito ha sido desembolsado!',
+        'template': 'emails/credito_desembolsado.html',
+    },
+    Credito.EstadoCredito.EN_MORA: {
+        'asunto': 'Alerta: Tu crédito está en mora',
+        'template': 'emails/credito_en_mora.html',
+    },
+    Credito.EstadoCredito.PAGADO: {
+        'asunto': '¡Felicitaciones! Has completado tu crédito',
+        'template': 'emails/credito_pagado.html',
+    },
+}
+
+ESTADOS_CON_CORREO = frozenset(CORREOS_CAMBIO_ESTADO)
+
+
+def construir_email_cambio_estado(credito, nuevo_estado, motivo=""):
     """
-    Envía notificación al cliente cuando cambia el estado de su crédito.
+    Arma (sin enviar) la notificación de cambio de estado del crédito.
 
-    Args:
-        credito (Credito): Instancia del crédito
-        nuevo_estado (str): Nuevo estado del crédito
-        motivo (str): Motivo del cambio de estado
+    Returns:
+        EmailMultiAlternatives | None: None si el estado no envía correo
     """
-    # Configurar asunto y mensaje según el estado
-    # NOTA: APROBADO no envía email porque se integra con el proveedor de firma
-    configuraciones = {
-        Credito.EstadoCredito.EN_REVISION: {
-            'asunto': 'Tu solicitud de crédito ha sido recibida',
-            'template': 'emails/credito_en_revision.html',
-        },
-        Credito.EstadoCredito.RECHAZADO: {
-            'asunto': 'Actualización sobre tu solicitud de crédito',
-            'template': 'emails/credito_rechazado.html',
-        },
-        Credito.EstadoCredito.ACTIVO: {
-            'asunto': '¡Tu crédito ha sido desembolsado!',
-            'template': 'emails/credito_desembolsado.html',
-        },
-        Credito.EstadoCredito.EN_MORA: {
-            'asunto': 'Alerta: Tu crédito está en mora',
-            'template': 'emails/credito_en_mora.html',
-        },
-        Credito.EstadoCredito.PAGADO: {
-            'asunto': '¡Felicitaciones! Has completado tu crédito',
-            'template': 'emails/credito_pagado.html',
-        },
-    }
-
-    config = configuraciones.get(nuevo_estado)
+    config = CORREOS_CAMBIO_ESTADO.get(nuevo_estado)
     if not config:
         if nuevo_estado in {
             Credito.EstadoCredito.APROBADO_PAGADOR,
             Credito.EstadoCredito.APROBADO,
             Credito.EstadoCredito.PENDIENTE_FIRMA,
         }:
-            return False
+            return None
         logger.warning(f"No hay configuración de email para el estado: {nuevo_estado}")
-        return False
+        return None
 
     detalle = credito.detalle
     cedula_solicitante = "No registrada"
@@ -217,7 +263,7 @@ def enviar_notificacion_cambio_estado(credito, nuevo_estado, motivo=""):
     context = {
         'credito': credito,
         'nombre_cliente': credito.nombre_cliente,
-        'nuevo_estado': credito.get_estado_display(),
+        'nuevo_estado': Credito.EstadoCredito(nuevo_estado).label,
         'motivo': motivo,
         'numero_credito': credito.numero_credito,
         'cedula_solicitante': cedula_solicitante,
@@ -254,23 +300,35 @@ def enviar_notificacion_cambio_estado(credito, nuevo_estado, motivo=""):
         except Exception as e:
             logger.error(f"Error al generar PDF del plan de pagos para crédito {credito.numero_credito}: {e}")
 
+    return email
+
+
+def enviar_notificacion_cambio_estado(credito, nuevo_estado, motivo=""):
+    """
+    Envía notificación al cliente cuando cambia el estado de su crédito.
+
+    Args:
+        credito (Credito): Instancia del crédito
+        nuevo_estado (str): Nuevo estado del crédito
+        motivo (str): Motivo del cambio de estado
+    """
+    email = construir_email_cambio_estado(credito, nuevo_estado, motivo)
+    if email is None:
+        return False
+
     # Enviar email
     try:
         email.send()
-        logger.info(f"Email enviado exitosamente a {credito.usuario.email}: {config['asunto']}")
+        logger.info(f"Email enviado exitosamente a {credito.usuario.email}: {email.subject}")
         return True
     except Exception as e:
         logger.error(f"Error al enviar email a {credito.usuario.email}: {e}")
         return False
 
 
-def enviar_recordatorio_pago(credito, dias_restantes):
+def construir_recordatorio_pago(credito, dias_restantes):
     """
-    Envía recordatorio de pago próximo a vencer.
-
-    Args:
-        credito (Credito): Instancia del crédito
-        dias_restantes (int): Días que faltan para el vencimiento
+    Arma (sin enviar) el recordatorio de pago próximo a vencer.
     """
     asunto = f"Recordatorio: Tu cuota vence en {dias_restantes} días"
 
@@ -283,7 +341,7 @@ def enviar_recordatorio_pago(credito, dias_restantes):
         'numero_credito': credito.numero_credito,
     }
 
-    return enviar_email_html(
+    return construir_email_html(
         destinatario=credito.usuario.email,
         asunto=asunto,
         template_html='emails/recordatorio_pago.html',
@@ -291,7 +349,18 @@ def enviar_recordatorio_pago(credito, dias_restantes):
     )
 
 
-def enviar_confirmacion_pago(
+def enviar_recordatorio_pago(credito, dias_restantes):
+    """
+    Envía recordatorio de pago próximo a vencer.
+
+    Args:
+        credito (Credito): Instancia del crédito
+        dias_restantes (int): Días que faltan para el vencimiento
+    """
+    return enviar_emails_en_lote([construir_recordatorio_pago(credito, dias_restantes)])[0] is None
+
+
+def construir_confirmacion_pago(
     credito,
     monto_pagado,
     nuevo_saldo,
@@ -305,12 +374,7 @@ def enviar_confirmacion_pago(
     cta_label=None,
 ):
     """
-    Envía confirmación de pago recibido.
-
-    Args:
-        credito (Credito): Instancia del crédito
-        monto_pagado (Decimal): Monto del pago
-        nuevo_saldo (Decimal): Nuevo saldo pendiente
+    Arma (sin enviar) la confirmación de pago recibido.
     """
     asunto = "Confirmación de pago recibido"
 
@@ -329,7 +393,7 @@ def enviar_confirmacion_pago(
         'cta_label': cta_label,
     }
 
-    return enviar_email_html(
+    return construir_email_html(
         destinatario=destinatario or credito.usuario.email,
         asunto=asunto,
         template_html='emails/confirmacion_pago.html',
@@ -337,13 +401,30 @@ def enviar_confirmacion_pago(
     )
 
 
-def enviar_alerta_mora(credito, dias_mora):
+def enviar_confirmacion_pago(credito, monto_pagado, nuevo_saldo, **kwargs):
     """
-    Envía alerta cuando el crédito entra en mora.
+    Envía confirmación de pago recibido.
 
     Args:
         credito (Credito): Instancia del crédito
-        dias_mora (int): Días en mora
+        monto_pagado (Decimal): Monto del pago
+        nuevo_saldo (Decimal): Nuevo saldo pendiente
+        **kwargs: destinatario, nombre_destinatario, referencia, metodo_pago,
+            banco, fecha_pago, cta_url y cta_label (ver `construir_confirmacion_pago`)
+    """
+    try:
+        email = construir_confirmacion_pago(credito, monto_pagado, nuevo_saldo, **kwargs)
+        email.send()
+        logger.info(f"Email enviado exitosamente a {email.to[0]}: {email.subject}")
+        return True
+    except Exception as e:
+        logger.error(f"Error al enviar confirmación de pago del crédito {credito.numero_credito}: {e}")
+        return False
+
+
+def construir_alerta_mora(credito, dias_mora):
+    """
+    Arma (sin enviar) la alerta de días en mora.
     """
     asunto = f"URGENTE: Tu crédito tiene {dias_mora} días de mora"
 
@@ -356,7 +437,7 @@ def enviar_alerta_mora(credito, dias_mora):
         'numero_credito': credito.numero_credito,
     }
 
-    return enviar_email_html(
+    return construir_email_html(
         destinatario=credito.usuario.email,
         asunto=asunto,
         template_html='emails/alerta_mora.html',
@@ -364,6 +445,17 @@ def enviar_alerta_mora(credito, dias_mora):
     )
 
 
+def enviar_alerta_mora(credito, dias_mora):
+    """
+    Envía alerta cuando el crédito entra en mora.
+
+    Args:
+        credito (Credito): Instancia del crédito
+        dias_mora (int): Días en mora
+    """
+    return enviar_emails_en_lote([construir_alerta_mora(credito, dias_mora)])[0] is None
+
+
 def enviar_email_simple(destinatario, asunto, mensaje):
     """
     Envía un email simple sin template (texto plano).
@@ -0,0 +1,32 @@
+"""
+Comando Django para reconstruir las fotos mensuales de cartera de meses anteriores.
+
+Uso:
+    python manage.py generar_snapshots_cartera [--meses 12] [--sobrescribir]
+"""
+from django.core.management.base import BaseCommand
+
+from gestion_creditos.services.cartera_service import reconstruir_snapshots_cartera
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye las fotos de cartera de los meses cerrados que aún no tienen foto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=12, help='Meses cerrados a reconstruir (por defecto 12)')
+        parser.add_argument(
+            '--sobrescribir', action='store_true',
+            help='Recalcula también los meses que ya tienen foto'
+        )
+
+    def handle(self, *args, **options):
+        snapshots = reconstruir_snapshots_cartera(meses=options['meses'], sobrescribir=options['sobrescribir'])
+        meses = sorted({s.mes for s in snapshots})
+
+        if meses:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Fotos de cartera generadas para {len(meses)} mes(es): '
+                f'{meses[0]:%Y-%m} a {meses[-1]:%Y-%m}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Todos los meses ya tienen foto de cartera'))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0016_alter_credito_estado_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaNumeroCredito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveIntegerField(unique=True)),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de número de crédito',
+                'verbose_name_plural': 'Secuencias de número de crédito',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-17 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0017_secuencianumerocredito'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarteraSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes de la foto')),
+                ('linea', models.CharField(choices=[('EMPRENDIMIENTO', 'Emprendimiento'), ('LIBRANZA', 'Libranza')], max_length=20)),
+                ('saldo_cartera', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('creditos_vigentes', models.PositiveIntegerField(default=0)),
+                ('creditos_en_mora', models.PositiveIntegerField(default=0)),
+                ('saldo_en_mora', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('monto_vencido', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('creditos_desembolsados', models.PositiveIntegerField(default=0)),
+                ('monto_desembolsado', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('fecha_corte', models.DateField(help_text='Último día con datos incluidos en la foto')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Snapshot de cartera',
+                'verbose_name_plural': 'Snapshots de cartera',
+                'ordering': ['mes', 'linea'],
+                'constraints': [models.UniqueConstraint(fields=('mes', 'linea'), name='uniq_cartera_snapshot_mes_linea')],
+            },
+        ),
+    ]
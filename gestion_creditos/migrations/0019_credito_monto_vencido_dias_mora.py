@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-17 17:28
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Min, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def _calcular_mora_inicial(apps, schema_editor):
+    Credito = apps.get_model('gestion_creditos', 'Credito')
+    CuotaAmortizacion = apps.get_model('gestion_creditos', 'CuotaAmortizacion')
+    hoy = timezone.now().date()
+
+    vencido = (
+        CuotaAmortizacion.objects.filter(
+            pagada=False,
+            fecha_vencimiento__lt=hoy,
+            credito__estado__in=['ACTIVO', 'EN_MORA'],
+        )
+        .values('credito_id')
+        .annotate(
+            monto=Sum(F('valor_cuota') - Coalesce(F('monto_pagado'), Value(Decimal('0.00')))),
+            primera_vencida=Min('fecha_vencimiento'),
+        )
+        .order_by()
+    )
+
+    creditos = []
+    for fila in vencido.iterator():
+        monto = max(fila['monto'] or Decimal('0.00'), Decimal('0.00'))
+        creditos.append(Credito(
+            id=fila['credito_id'],
+            monto_vencido=monto,
+            dias_mora=(hoy - fila['primera_vencida']).days if monto > 0 else 0,
+            fecha_calculo_mora=hoy,
+        ))
+    if creditos:
+        Credito.objects.bulk_update(creditos, ['monto_vencido', 'dias_mora', 'fecha_calculo_mora'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0018_carterasnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='credito',
+            name='dias_mora',
+            field=models.PositiveIntegerField(default=0, help_text='Días desde el vencimiento de la cuota impaga más antigua'),
+        ),
+        migrations.AddField(
+            model_name='credito',
+            name='fecha_calculo_mora',
+            field=models.DateField(blank=True, help_text='Fecha a la que corresponden monto_vencido y dias_mora', null=True),
+        ),
+        migrations.AddField(
+            model_name='credito',
+            name='monto_vencido',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Suma de cuotas vencidas no pagadas a la fecha de cálculo', max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='credito',
+            index=models.Index(condition=models.Q(('monto_vencido__gt', 0)), fields=['-dias_mora', 'monto_vencido'], name='idx_credito_mora_vencida'),
+        ),
+        migrations.AddIndex(
+            model_name='cuotaamortizacion',
+            index=models.Index(condition=models.Q(('pagada', False)), fields=['credito', 'fecha_vencimiento'], name='idx_cuota_impaga_venc'),
+        ),
+        migrations.RunPython(_calcular_mora_inicial, migrations.RunPython.noop),
+    ]
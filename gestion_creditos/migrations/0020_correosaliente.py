@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 17:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0019_credito_monto_vencido_dias_mora'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSaliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CAMBIO_ESTADO', 'Cambio de estado'), ('CONFIRMACION_PAGO', 'Confirmación de pago')], max_length=30)),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('clave', models.CharField(help_text='Clave de deduplicación por destinatario', max_length=150)),
+                ('datos', models.JSONField(blank=True, default=dict, help_text='Datos para armar el correo al enviarlo')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIANDO', 'Enviando'), ('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(help_text='Cuándo puede tomarse (o retomarse si un envío quedó a medias)')),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+                ('credito', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='correos_salientes', to='gestion_creditos.credito')),
+            ],
+            options={
+                'verbose_name': 'Correo saliente',
+                'verbose_name_plural': 'Correos salientes',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='idx_correo_estado_intento')],
+                'constraints': [models.UniqueConstraint(fields=('destinatario', 'clave'), name='uniq_correo_destinatario_clave')],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-17 17:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Mismos días que estaban fijos en las tareas de recordatorios y alertas
+REGLAS_INICIALES = [
+    ('RECORDATORIO_PAGO', 7, None),
+    ('RECORDATORIO_PAGO', 3, None),
+    ('ALERTA_MORA', 1, None),
+    ('ALERTA_MORA', 7, None),
+    ('ALERTA_MORA', 15, None),
+    ('ALERTA_MORA', 30, 30),
+]
+
+
+def _crear_reglas_iniciales(apps, schema_editor):
+    ReglaNotificacionCredito = apps.get_model('gestion_creditos', 'ReglaNotificacionCredito')
+    ReglaNotificacionCredito.objects.bulk_create([
+        ReglaNotificacionCredito(tipo=tipo, dias=dias, repetir_cada=repetir_cada)
+        for tipo, dias, repetir_cada in REGLAS_INICIALES
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0020_correosaliente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReglaNotificacionCredito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('RECORDATORIO_PAGO', 'Recordatorio de pago'), ('ALERTA_MORA', 'Alerta de mora')], max_length=20)),
+                ('dias', models.PositiveIntegerField(help_text='Días antes del vencimiento (recordatorio) o días en mora (alerta)')),
+                ('repetir_cada', models.PositiveIntegerField(blank=True, help_text="Solo alertas de mora: repetir cada N días después de 'dias'", null=True)),
+                ('activa', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Regla de notificación',
+                'verbose_name_plural': 'Reglas de notificación',
+                'ordering': ['tipo', 'dias'],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'dias'), name='uniq_regla_notificacion_tipo_dias')],
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificacionCreditoEnviada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('RECORDATORIO_PAGO', 'Recordatorio de pago'), ('ALERTA_MORA', 'Alerta de mora')], max_length=20)),
+                ('fecha_vencimiento', models.DateField(help_text='Fecha de pago a la que corresponde el aviso')),
+                ('dias', models.IntegerField()),
+                ('fecha_programada', models.DateField(help_text='Día en que correspondía enviar el aviso')),
+                ('fecha_envio', models.DateTimeField(auto_now_add=True)),
+                ('credito', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones_enviadas', to='gestion_creditos.credito')),
+            ],
+            options={
+                'verbose_name': 'Notificación enviada',
+                'verbose_name_plural': 'Notificaciones enviadas',
+                'ordering': ['-fecha_programada'],
+                'indexes': [models.Index(fields=['fecha_programada', 'credito'], name='idx_notif_enviada_fecha')],
+                'constraints': [models.UniqueConstraint(fields=('credito', 'tipo', 'fecha_vencimiento', 'dias'), name='uniq_notificacion_credito_nivel')],
+            },
+        ),
+        migrations.RunPython(_crear_reglas_iniciales, migrations.RunPython.noop),
+    ]
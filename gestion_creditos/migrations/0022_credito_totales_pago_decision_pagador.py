@@ -0,0 +1,85 @@
+# Generated by Django 5.2 on 2026-10-17 17:46
+
+from django.db import migrations, models
+from django.db.models import Max, Sum
+
+
+def _calcular_totales_y_decisiones(apps, schema_editor):
+    Credito = apps.get_model('gestion_creditos', 'Credito')
+    HistorialPago = apps.get_model('gestion_creditos', 'HistorialPago')
+    HistorialEstado = apps.get_model('gestion_creditos', 'HistorialEstado')
+
+    pagos = (
+        HistorialPago.objects.filter(estado='EXITOSO')
+        .values('credito_id')
+        .annotate(total=Sum('monto'), ultimo=Max('fecha_pago'))
+        .order_by()
+    )
+    Credito.objects.bulk_update(
+        [
+            Credito(id=fila['credito_id'], total_pagado=fila['total'] or 0, ultimo_pago=fila['ultimo'])
+            for fila in pagos.iterator()
+        ],
+        ['total_pagado', 'ultimo_pago'],
+        batch_size=500,
+    )
+
+    # Última decisión registrada por un usuario pagador (la más reciente gana)
+    decisiones = {}
+    for credito_id, estado, motivo, fecha in (
+        HistorialEstado.objects.filter(
+            usuario_modificacion__perfil_pagador__isnull=False,
+            estado_nuevo__in=['APROBADO_PAGADOR', 'RECHAZADO'],
+        )
+        .order_by('credito_id', 'fecha')
+        .values_list('credito_id', 'estado_nuevo', 'motivo', 'fecha')
+        .iterator()
+    ):
+        decisiones[credito_id] = Credito(
+            id=credito_id,
+            pagador_decision_estado=estado,
+            pagador_decision_motivo=motivo or '',
+            pagador_decision_fecha=fecha,
+        )
+    Credito.objects.bulk_update(
+        list(decisiones.values()),
+        ['pagador_decision_estado', 'pagador_decision_motivo', 'pagador_decision_fecha'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0021_reglas_notificacion_credito'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='credito',
+            name='pagador_decision_estado',
+            field=models.CharField(blank=True, choices=[('SOLICITUD', 'Solicitud'), ('EN_REVISION', 'En Revisión'), ('APROBADO_PAGADOR', 'Aprobado por Pagador'), ('APROBADO', 'Aprobado'), ('RECHAZADO', 'Rechazado'), ('PENDIENTE_FIRMA', 'Pendiente Firma'), ('FIRMADO', 'Firmado'), ('PENDIENTE_TRANSFERENCIA', 'Pendiente por Transferencia'), ('ACTIVO', 'Activo'), ('EN_MORA', 'En Mora'), ('PAGADO', 'Pagado')], help_text='Decisión del pagador de la empresa (APROBADO_PAGADOR o RECHAZADO)', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='credito',
+            name='pagador_decision_fecha',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='credito',
+            name='pagador_decision_motivo',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='credito',
+            name='total_pagado',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Suma de pagos exitosos (se actualiza al registrar cada pago)', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='credito',
+            name='ultimo_pago',
+            field=models.DateTimeField(blank=True, help_text='Fecha del último pago exitoso', null=True),
+        ),
+        migrations.RunPython(_calcular_totales_y_decisiones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-17 17:58
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+CAMPOS_DOCUMENTO = (
+    'numero_credito',
+    'usuario__username',
+    'usuario__email',
+    'detalle_emprendimiento__nombre',
+    'detalle_emprendimiento__numero_cedula',
+    'detalle_libranza__nombres',
+    'detalle_libranza__apellidos',
+    'detalle_libranza__cedula',
+)
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.split())
+
+
+def _construir_documentos(apps, schema_editor):
+    Credito = apps.get_model('gestion_creditos', 'Credito')
+    creditos = []
+    for credito_id, *valores in Credito.objects.values_list('id', *CAMPOS_DOCUMENTO).iterator():
+        creditos.append(Credito(
+            id=credito_id,
+            texto_busqueda=_normalizar(' '.join(str(v) for v in valores if v)),
+        ))
+        if len(creditos) >= 500:
+            Credito.objects.bulk_update(creditos, ['texto_busqueda'])
+            creditos = []
+    Credito.objects.bulk_update(creditos, ['texto_busqueda'])
+
+
+def _crear_indice_trigramas(apps, schema_editor):
+    # Solo Postgres: LIKE '%texto%' usa el índice GIN con gin_trgm_ops
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_credito_busqueda_trgm '
+        'ON gestion_creditos_credito USING gin (texto_busqueda gin_trgm_ops)'
+    )
+
+
+def _eliminar_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS idx_credito_busqueda_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0022_credito_totales_pago_decision_pagador'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='credito',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(_construir_documentos, migrations.RunPython.noop),
+        migrations.RunPython(_crear_indice_trigramas, _eliminar_indice_trigramas),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2 on 2026-10-17 17:57
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def _programar_intentos_en_curso(apps, schema_editor):
+    """
+    Los aprobados ya fueron aplicados por el callback o el webhook. Los pendientes
+    recientes se programan para el worker; los de CSV masivo no, porque sus filas
+    quedaron en la sesión del navegador.
+    """
+    WompiIntent = apps.get_model('gestion_creditos', 'WompiIntent')
+    WompiIntent.objects.filter(status='APPROVED').update(aplicado_en=F('updated_at'))
+
+    ahora = timezone.now()
+    en_curso = WompiIntent.objects.filter(
+        status__in=['CREATED', 'PENDING'],
+        wompi_transaction_id__isnull=False,
+        created_at__gte=ahora - timedelta(days=2),
+    ).exclude(referencia__startswith='CSV-MASIVO-')
+    en_curso.filter(referencia__startswith='ABONO-').update(tipo_pago='CAPITAL')
+    en_curso.update(proxima_consulta=ahora)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0023_credito_texto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wompiintent',
+            name='aplicado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wompiintent',
+            name='consultas_estado',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wompiintent',
+            name='datos_transaccion',
+            field=models.JSONField(blank=True, help_text='Última respuesta de Wompi para la transacción', null=True),
+        ),
+        migrations.AddField(
+            model_name='wompiintent',
+            name='pagos_pendientes',
+            field=models.JSONField(blank=True, help_text='Filas del CSV de pago masivo a aplicar al aprobarse', null=True),
+        ),
+        migrations.AddField(
+            model_name='wompiintent',
+            name='proxima_consulta',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wompiintent',
+            name='tipo_pago',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='wompiintent',
+            index=models.Index(condition=models.Q(('proxima_consulta__isnull', False)), fields=['proxima_consulta'], name='wompi_int_conciliar_idx'),
+        ),
+        migrations.RunPython(_programar_intentos_en_curso, migrations.RunPython.noop),
+    ]
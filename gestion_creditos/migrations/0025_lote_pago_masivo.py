@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-17 18:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0024_wompiintent_conciliacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='wompiintent',
+            name='pagos_pendientes',
+        ),
+        migrations.CreateModel(
+            name='LotePagoMasivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('referencia', models.CharField(max_length=100, unique=True)),
+                ('estado', models.CharField(choices=[('VALIDADO', 'Validado'), ('COBRADO', 'Cobrado'), ('APLICADO', 'Aplicado'), ('RECHAZADO', 'Rechazado')], default='VALIDADO', max_length=20)),
+                ('monto_total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('cantidad_pagos', models.PositiveIntegerField()),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_cobro', models.DateTimeField(blank=True, null=True)),
+                ('fecha_aplicacion', models.DateTimeField(blank=True, null=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lotes_pago_masivo', to='gestion_creditos.empresa')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lote de Pago Masivo',
+                'verbose_name_plural': 'Lotes de Pago Masivo',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetalleLotePagoMasivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cedula', models.CharField(max_length=20)),
+                ('nombre', models.CharField(blank=True, max_length=200)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('credito', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='pagos_en_lote', to='gestion_creditos.credito')),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='gestion_creditos.lotepagomasivo')),
+            ],
+            options={
+                'verbose_name': 'Detalle de Lote de Pago Masivo',
+                'verbose_name_plural': 'Detalles de Lote de Pago Masivo',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='wompiintent',
+            name='lote',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='intentos_wompi', to='gestion_creditos.lotepagomasivo'),
+        ),
+        migrations.AddIndex(
+            model_name='lotepagomasivo',
+            index=models.Index(fields=['empresa', 'estado'], name='idx_lote_pago_emp_estado'),
+        ),
+        migrations.AddConstraint(
+            model_name='detallelotepagomasivo',
+            constraint=models.UniqueConstraint(fields=('lote', 'credito'), name='uniq_lote_pago_credito'),
+        ),
+    ]
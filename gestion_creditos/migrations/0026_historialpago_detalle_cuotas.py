@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0025_lote_pago_masivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historialpago',
+            name='detalle_cuotas',
+            field=models.JSONField(blank=True, help_text='Cuotas cubiertas por el pago: número, monto, capital, interés y si quedó pagada', null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 18:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0026_historialpago_detalle_cuotas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WompiWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(max_length=100)),
+                ('status', models.CharField(help_text='Estado de la transacción reportado por WOMPI', max_length=20)),
+                ('referencia', models.CharField(blank=True, max_length=100)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('PROCESADO', 'Procesado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(help_text='Cuándo puede tomarse (o retomarse si un proceso quedó a medias)')),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('recibido_en', models.DateTimeField(auto_now_add=True)),
+                ('procesado_en', models.DateTimeField(blank=True, null=True)),
+                ('credito', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos_wompi', to='gestion_creditos.credito')),
+            ],
+            options={
+                'verbose_name': 'Evento webhook Wompi',
+                'verbose_name_plural': 'Eventos webhook Wompi',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='idx_wompi_evento_estado'), models.Index(fields=['credito', 'estado'], name='idx_wompi_evento_credito')],
+                'constraints': [models.UniqueConstraint(fields=('transaction_id', 'status'), name='uniq_wompi_evento_tx_status')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+# Tareas periódicas de la programación anterior (8:00 y 9:00). Ahora las
+# reemplaza `programar-notificaciones-credito`; si siguen en django_celery_beat
+# corren el mismo envío dos o tres veces por día y compiten entre sí.
+TAREAS_REEMPLAZADAS = [
+    'gestion_creditos.tasks.enviar_recordatorios_pago_task',
+    'gestion_creditos.tasks.enviar_alertas_mora_task',
+]
+
+
+def _quitar_tareas_reemplazadas(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTasks = apps.get_model('django_celery_beat', 'PeriodicTasks')
+
+    if PeriodicTask.objects.filter(task__in=TAREAS_REEMPLAZADAS).delete()[0]:
+        # Avisa al DatabaseScheduler para que recargue la programación
+        PeriodicTasks.objects.update_or_create(ident=1, defaults={'last_update': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_creditos', '0027_wompi_webhook_event'),
+        ('django_celery_beat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(_quitar_tareas_reemplazadas, migrations.RunPython.noop),
+    ]
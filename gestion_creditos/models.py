@@ -223,6 +223,44 @@ class Credito(models.Model):
         blank=True,
         help_text="Fecha de vencimiento de la próxima cuota"
     )
+    # Mora desnormalizada: la mantienen los pagos y la tarea nocturna de mora
+    monto_vencido = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text="Suma de cuotas vencidas no pagadas a la fecha de cálculo"
+    )
+    dias_mora = models.PositiveIntegerField(
+        default=0,
+        help_text="Días desde el vencimiento de la cuota impaga más antigua"
+    )
+    fecha_calculo_mora = models.DateField(
+        null=True,
+        blank=True,
+        help_text="Fecha a la que corresponden monto_vencido y dias_mora"
+    )
+    total_pagado = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text="Suma de pagos exitosos (se actualiza al registrar cada pago)"
+    )
+    ultimo_pago = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Fecha del último pago exitoso"
+    )
+    pagador_decision_estado = models.CharField(
+        max_length=30,
+        choices=EstadoCredito.choices,
+        blank=True,
+        help_text="Decisión del pagador de la empresa (APROBADO_PAGADOR o RECHAZADO)"
+    )
+    pagador_decision_motivo = models.TextField(blank=True)
+    pagador_decision_fecha = models.DateTimeField(null=True, blank=True)
+    # Documento de búsqueda normalizado (ver services/busqueda_service.py).
+    # En Postgres lleva un índice GIN gin_trgm_ops creado en la migración 0023.
+    texto_busqueda = models.TextField(blank=True, default='', editable=False)
     fecha_desembolso = models.DateTimeField(
         null=True,
         blank=True,
@@ -259,53 +297,65 @@ class Credito(models.Model):
     fecha_solicitud = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    # Estado leído de la BD; lo fijan from_db/refresh_from_db y cada save()
+    _estado_cargado = None
+
     def save(self, *args, **kwargs):
         """
         Método save unificado que:
         1. Genera el numero_credito si no existe
-        2. Valida las transiciones de estado permitidas
+        2. Valida las transiciones de estado permitidas contra el estado cargado
+           de la BD (sin volver a consultarla). Si `update_fields` no incluye
+           `estado`, la validación se omite.
         """
         # 1. Generar numero_credito si es un crédito nuevo
         if not self.numero_credito:
-            from django.utils import timezone
-            today = timezone.now()
-            year = today.year
-            
-            # Generar el prefijo y buscar el último número para ese año
-            prefix = f'CR-{year}-'
-            last_credit = Credito.objects.filter(numero_credito__startswith=prefix).order_by('numero_credito').last()
-            
-            if last_credit and last_credit.numero_credito[len(prefix):].isdigit():
-                last_sequence = int(last_credit.numero_credito[len(prefix):])
-                new_sequence = last_sequence + 1
-            else:
-                new_sequence = 1
-            
-            self.numero_credito = f'{prefix}{new_sequence:05d}'
+            from .services.numeracion_service import siguiente_numero_credito
+            self.numero_credito = siguiente_numero_credito()
 
         # 2. Validación de transiciones de estado
-        if self.pk:  # Si el objeto ya existe en la BD
-            try:
-                credito_anterior = Credito.objects.get(pk=self.pk)
-                
-                # Validar que un crédito ACTIVO solo pueda cambiar a EN_MORA o PAGADO
-                if (credito_anterior.estado == self.EstadoCredito.ACTIVO and 
-                    self.estado not in [self.EstadoCredito.ACTIVO, self.EstadoCredito.EN_MORA, self.EstadoCredito.PAGADO]):
-                    raise ValidationError(
-                        f'Un crédito en estado "Activo" no puede cambiar a "{self.get_estado_display()}". '
-                        f'Solo se permiten las transiciones: Activo → En Mora o Activo → Pagado.'
-                    )
-                
-                # Validar que un crédito PAGADO no pueda cambiar de estado
-                if credito_anterior.estado == self.EstadoCredito.PAGADO:
-                    raise ValidationError(
-                        'Un crédito en estado "Pagado" no puede cambiar de estado.'
-                    )
-                    
-            except Credito.DoesNotExist:
-                pass  # El objeto es nuevo, no hay estado anterior para comparar
+        update_fields = kwargs.get('update_fields')
+        valida_estado = update_fields is None or 'estado' in update_fields
+        if self.pk and valida_estado:
+            estado_anterior = self._estado_cargado
+            if estado_anterior is None:
+                # Instancia creada a mano con pk o con `estado` diferido: no hay snapshot
+                estado_anterior = Credito.objects.filter(pk=self.pk).values_list('estado', flat=True).first()
+            self._validar_transicion_estado(estado_anterior)
 
         super(Credito, self).save(*args, **kwargs)
+        if valida_estado:
+            self._estado_cargado = self.estado
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot del estado persistido para validar transiciones en save()
+        instance._estado_cargado = instance.__dict__.get('estado')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or 'estado' in fields:
+            self._estado_cargado = self.estado
+
+    def _validar_transicion_estado(self, estado_anterior):
+        if estado_anterior is None or estado_anterior == self.estado:
+            return
+
+        # Validar que un crédito ACTIVO solo pueda cambiar a EN_MORA o PAGADO
+        if (estado_anterior == self.EstadoCredito.ACTIVO and
+            self.estado not in [self.EstadoCredito.EN_MORA, self.EstadoCredito.PAGADO]):
+            raise ValidationError(
+                f'Un crédito en estado "Activo" no puede cambiar a "{self.get_estado_display()}". '
+                f'Solo se permiten las transiciones: Activo → En Mora o Activo → Pagado.'
+            )
+
+        # Validar que un crédito PAGADO no pueda cambiar de estado
+        if estado_anterior == self.EstadoCredito.PAGADO:
+            raise ValidationError(
+                'Un crédito en estado "Pagado" no puede cambiar de estado.'
+            )
 
     class Meta:
         ordering = ['-fecha_solicitud']
@@ -329,6 +379,13 @@ class Credito(models.Model):
 
             # Índice para búsquedas por número de crédito (aunque ya es unique, ayuda en JOINs)
             models.Index(fields=['numero_credito'], name='idx_credito_numero'),
+
+            # Índice parcial para la cartera vencida (orden y suma de mora)
+            models.Index(
+                fields=['-dias_mora', 'monto_vencido'],
+                name='idx_credito_mora_vencida',
+                condition=models.Q(monto_vencido__gt=0),
+            ),
         ]
 
     def __str__(self):
@@ -419,6 +476,51 @@ class Credito(models.Model):
 
 
 #? ----- Modelo de crédito de emprendimiento -----
+class SecuenciaNumeroCredito(models.Model):
+    """
+    Contador por año para los números CR-YYYY-NNNNN.
+    Se usa en motores sin secuencias nativas (en PostgreSQL se usa una SEQUENCE por año).
+    """
+    anio = models.PositiveIntegerField(unique=True)
+    ultimo_numero = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Secuencia de número de crédito'
+        verbose_name_plural = 'Secuencias de número de crédito'
+
+    def __str__(self):
+        return f'CR-{self.anio}: {self.ultimo_numero}'
+
+
+class CarteraSnapshot(models.Model):
+    """
+    Foto mensual de la cartera por línea de crédito. La tarea nocturna
+    actualiza la fila del mes en curso; al cerrar el mes queda el valor final.
+    """
+    mes = models.DateField(help_text="Primer día del mes de la foto")
+    linea = models.CharField(max_length=20, choices=Credito.LineaCredito.choices)
+    saldo_cartera = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    creditos_vigentes = models.PositiveIntegerField(default=0)
+    creditos_en_mora = models.PositiveIntegerField(default=0)
+    saldo_en_mora = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    monto_vencido = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    creditos_desembolsados = models.PositiveIntegerField(default=0)
+    monto_desembolsado = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    fecha_corte = models.DateField(help_text="Último día con datos incluidos en la foto")
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['mes', 'linea']
+        verbose_name = 'Snapshot de cartera'
+        verbose_name_plural = 'Snapshots de cartera'
+        constraints = [
+            models.UniqueConstraint(fields=['mes', 'linea'], name='uniq_cartera_snapshot_mes_linea'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_linea_display()} {self.mes:%Y-%m}: {self.saldo_cartera}'
+
+
 class CreditoEmprendimiento(models.Model):
     """
     Modelo para créditos de emprendimiento.
@@ -678,6 +780,11 @@ class HistorialPago(models.Model):
         blank=True,
         help_text="Porción del pago que cubrió intereses"
     )
+    detalle_cuotas = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Cuotas cubiertas por el pago: número, monto, capital, interés y si quedó pagada"
+    )
     
     # Observaciones
     notas = models.TextField(
@@ -695,6 +802,62 @@ class HistorialPago(models.Model):
         return f"Pago {self.referencia_pago} - ${self.monto} ({self.get_estado_display()})"
 
 
+#? ----- Lotes de pago masivo (CSV del pagador) -----
+class LotePagoMasivo(models.Model):
+    """
+    Pagos validados de un CSV del pagador, pendientes de cobrarse por WOMPI.
+
+    Estados: VALIDADO (CSV aceptado) -> COBRADO (WOMPI aprobó el cobro) ->
+    APLICADO (pagos registrados en los créditos). RECHAZADO si el cobro falla.
+    """
+    class Estado(models.TextChoices):
+        VALIDADO = 'VALIDADO', 'Validado'
+        COBRADO = 'COBRADO', 'Cobrado'
+        APLICADO = 'APLICADO', 'Aplicado'
+        RECHAZADO = 'RECHAZADO', 'Rechazado'
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.PROTECT, related_name='lotes_pago_masivo')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    referencia = models.CharField(max_length=100, unique=True)
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.VALIDADO)
+    monto_total = models.DecimalField(max_digits=14, decimal_places=2)
+    cantidad_pagos = models.PositiveIntegerField()
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_cobro = models.DateTimeField(null=True, blank=True)
+    fecha_aplicacion = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        verbose_name = 'Lote de Pago Masivo'
+        verbose_name_plural = 'Lotes de Pago Masivo'
+        indexes = [
+            models.Index(fields=['empresa', 'estado'], name='idx_lote_pago_emp_estado'),
+        ]
+
+    def __str__(self):
+        return f"Lote {self.referencia} - {self.get_estado_display()}"
+
+
+class DetalleLotePagoMasivo(models.Model):
+    """Pago de un crédito dentro de un lote (filas repetidas del CSV ya sumadas)."""
+    lote = models.ForeignKey(LotePagoMasivo, on_delete=models.CASCADE, related_name='detalles')
+    credito = models.ForeignKey(Credito, on_delete=models.PROTECT, related_name='pagos_en_lote')
+    cedula = models.CharField(max_length=20)
+    nombre = models.CharField(max_length=200, blank=True)
+    monto = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Detalle de Lote de Pago Masivo'
+        verbose_name_plural = 'Detalles de Lote de Pago Masivo'
+        constraints = [
+            models.UniqueConstraint(fields=['lote', 'credito'], name='uniq_lote_pago_credito'),
+        ]
+
+    def __str__(self):
+        return f"{self.lote.referencia} - {self.cedula}: ${self.monto}"
+
+
 #? ----- Modelo de intentos de pago WOMPI -----
 class WompiIntent(models.Model):
     """
@@ -719,6 +882,15 @@ class WompiIntent(models.Model):
     user_agent = models.CharField(max_length=255, blank=True)
     referer = models.CharField(max_length=255, blank=True)
     attempts = models.PositiveIntegerField(default=1)
+    # Conciliación en segundo plano (services/conciliacion_wompi_service.py)
+    tipo_pago = models.CharField(max_length=20, blank=True)
+    lote = models.ForeignKey(
+        LotePagoMasivo, on_delete=models.SET_NULL, null=True, blank=True, related_name='intentos_wompi'
+    )
+    datos_transaccion = models.JSONField(null=True, blank=True, help_text="Última respuesta de Wompi para la transacción")
+    consultas_estado = models.PositiveIntegerField(default=0)
+    proxima_consulta = models.DateTimeField(null=True, blank=True)
+    aplicado_en = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -729,12 +901,63 @@ class WompiIntent(models.Model):
         indexes = [
             models.Index(fields=['credito', 'status'], name='wompi_int_c_s_idx'),
             models.Index(fields=['referencia'], name='wompi_int_ref_idx'),
+            models.Index(
+                fields=['proxima_consulta'],
+                name='wompi_int_conciliar_idx',
+                condition=models.Q(proxima_consulta__isnull=False),
+            ),
         ]
 
     def __str__(self):
         return f"WompiIntent {self.referencia} - {self.status}"
 
 
+class WompiWebhookEvent(models.Model):
+    """
+    Bandeja de entrada de los webhooks de WOMPI.
+
+    El webhook solo verifica la firma y guarda el evento; un worker de Celery
+    lo procesa después, en orden de llegada por crédito. La pareja
+    (transaction_id, status) es única: los reenvíos de WOMPI no duplican el evento.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        PROCESANDO = 'PROCESANDO', 'Procesando'
+        PROCESADO = 'PROCESADO', 'Procesado'
+        FALLIDO = 'FALLIDO', 'Fallido'
+
+    transaction_id = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, help_text="Estado de la transacción reportado por WOMPI")
+    referencia = models.CharField(max_length=100, blank=True)
+    credito = models.ForeignKey(
+        Credito, on_delete=models.SET_NULL, null=True, blank=True, related_name='eventos_wompi'
+    )
+    payload = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(
+        help_text="Cuándo puede tomarse (o retomarse si un proceso quedó a medias)"
+    )
+    ultimo_error = models.TextField(blank=True)
+    recibido_en = models.DateTimeField(auto_now_add=True)
+    procesado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Evento webhook Wompi'
+        verbose_name_plural = 'Eventos webhook Wompi'
+        constraints = [
+            models.UniqueConstraint(fields=['transaction_id', 'status'], name='uniq_wompi_evento_tx_status'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='idx_wompi_evento_estado'),
+            models.Index(fields=['credito', 'estado'], name='idx_wompi_evento_credito'),
+        ]
+
+    def __str__(self):
+        return f"Evento Wompi {self.transaction_id} - {self.status} ({self.estado})"
+
+
 #? ----- Modelo de historial de estados -----
 class HistorialEstado(models.Model):
     """
@@ -835,6 +1058,14 @@ class CuotaAmortizacion(models.Model):
     class Meta:
         ordering = ['credito', 'numero_cuota']
         unique_together = ('credito', 'numero_cuota')
+        indexes = [
+            # Cuotas impagas por vencimiento (recálculo de mora)
+            models.Index(
+                fields=['credito', 'fecha_vencimiento'],
+                name='idx_cuota_impaga_venc',
+                condition=models.Q(pagada=False),
+            ),
+        ]
         verbose_name = 'Cuota de Amortización'
         verbose_name_plural = 'Cuotas de Amortización'
 
@@ -1059,6 +1290,130 @@ class Notificacion(models.Model):
             self.save(update_fields=['leida', 'fecha_leida'])
 
 
+#? ----- Bandeja de salida de correos -----
+class CorreoSaliente(models.Model):
+    """
+    Bandeja de salida transaccional de correos.
+
+    Las filas se crean dentro de la misma transacción que el cambio de negocio
+    y un worker de Celery las envía después del commit, con reintentos.
+    """
+    class TipoCorreo(models.TextChoices):
+        CAMBIO_ESTADO = 'CAMBIO_ESTADO', 'Cambio de estado'
+        CONFIRMACION_PAGO = 'CONFIRMACION_PAGO', 'Confirmación de pago'
+
+    class EstadoCorreo(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        ENVIANDO = 'ENVIANDO', 'Enviando'
+        ENVIADO = 'ENVIADO', 'Enviado'
+        FALLIDO = 'FALLIDO', 'Fallido'
+
+    tipo = models.CharField(max_length=30, choices=TipoCorreo.choices)
+    credito = models.ForeignKey(
+        Credito,
+        on_delete=models.CASCADE,
+        related_name='correos_salientes',
+        null=True,
+        blank=True
+    )
+    destinatario = models.EmailField()
+    clave = models.CharField(
+        max_length=150,
+        help_text="Clave de deduplicación por destinatario"
+    )
+    datos = models.JSONField(default=dict, blank=True, help_text="Datos para armar el correo al enviarlo")
+    estado = models.CharField(max_length=20, choices=EstadoCorreo.choices, default=EstadoCorreo.PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(
+        help_text="Cuándo puede tomarse (o retomarse si un envío quedó a medias)"
+    )
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Correo saliente'
+        verbose_name_plural = 'Correos salientes'
+        constraints = [
+            models.UniqueConstraint(fields=['destinatario', 'clave'], name='uniq_correo_destinatario_clave'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='idx_correo_estado_intento'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_display()} a {self.destinatario} ({self.estado})'
+
+
+#? ----- Recordatorios y alertas de mora programados -----
+class ReglaNotificacionCredito(models.Model):
+    """
+    Días en que se envía un recordatorio de pago (antes del vencimiento) o una
+    alerta de mora (después). Se ajustan desde el admin sin tocar código.
+    """
+    class TipoNotificacion(models.TextChoices):
+        RECORDATORIO_PAGO = 'RECORDATORIO_PAGO', 'Recordatorio de pago'
+        ALERTA_MORA = 'ALERTA_MORA', 'Alerta de mora'
+
+    tipo = models.CharField(max_length=20, choices=TipoNotificacion.choices)
+    dias = models.PositiveIntegerField(
+        help_text="Días antes del vencimiento (recordatorio) o días en mora (alerta)"
+    )
+    repetir_cada = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Solo alertas de mora: repetir cada N días después de 'dias'"
+    )
+    activa = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['tipo', 'dias']
+        verbose_name = 'Regla de notificación'
+        verbose_name_plural = 'Reglas de notificación'
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'dias'], name='uniq_regla_notificacion_tipo_dias'),
+        ]
+
+    def __str__(self):
+        repeticion = f' y cada {self.repetir_cada}' if self.repetir_cada else ''
+        return f'{self.get_tipo_display()}: día {self.dias}{repeticion}'
+
+
+class NotificacionCreditoEnviada(models.Model):
+    """
+    Registro de recordatorios y alertas de mora ya enviados. Evita repetir el
+    mismo aviso si la tarea se vuelve a ejecutar.
+    """
+    credito = models.ForeignKey(
+        Credito,
+        on_delete=models.CASCADE,
+        related_name='notificaciones_enviadas'
+    )
+    tipo = models.CharField(max_length=20, choices=ReglaNotificacionCredito.TipoNotificacion.choices)
+    fecha_vencimiento = models.DateField(help_text="Fecha de pago a la que corresponde el aviso")
+    dias = models.IntegerField()
+    fecha_programada = models.DateField(help_text="Día en que correspondía enviar el aviso")
+    fecha_envio = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-fecha_programada']
+        verbose_name = 'Notificación enviada'
+        verbose_name_plural = 'Notificaciones enviadas'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['credito', 'tipo', 'fecha_vencimiento', 'dias'],
+                name='uniq_notificacion_credito_nivel'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['fecha_programada', 'credito'], name='idx_notif_enviada_fecha'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_display()} {self.dias} días - {self.credito_id}'
+
+
 #? ----- Modelo de reestructuración de crédito -----
 class ReestructuracionCredito(models.Model):
     """
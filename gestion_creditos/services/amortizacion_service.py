@@ -0,0 +1,227 @@
+"""
+Motor de amortizacion francesa (cuota fija) compartido por activacion, pagos,
+pagares y simuladores de abono.
+
+Las tablas se calculan por lotes: los saldos de todas las cuotas de todos los
+creditos se obtienen con NumPy en forma cerrada y luego se redondean a centavos
+enteros, de modo que capital, interes y saldo se reconcilian de forma exacta en
+Decimal. La ultima cuota absorbe la diferencia de redondeo.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+
+CENTAVO = Decimal('0.01')
+
+
+def _a_decimal(valor):
+    if isinstance(valor, Decimal):
+        return valor
+    return Decimal(str(valor or 0))
+
+
+def _centavos_a_decimal(centavos):
+    return Decimal(centavos).scaleb(-2)
+
+
+def calcular_cuota_fija(capital, tasa_mensual, num_cuotas):
+    """
+    Calcula el valor de la cuota fija usando la fórmula de amortización francesa.
+
+    Args:
+        capital (Decimal): Capital a financiar
+        tasa_mensual (Decimal): Tasa de interés mensual (en decimal, ej: 0.02 para 2%)
+        num_cuotas (int): Número de cuotas
+
+    Returns:
+        Decimal: Valor de la cuota mensual redondeado a centavos
+    """
+    capital = _a_decimal(capital)
+    tasa_mensual = _a_decimal(tasa_mensual)
+
+    if not num_cuotas or capital == 0:
+        return Decimal('0.00')
+
+    if tasa_mensual <= 0:
+        return (capital / num_cuotas).quantize(CENTAVO)
+
+    # Fórmula: C = P * (i * (1 + i)^n) / ((1 + i)^n - 1)
+    factor = (1 + tasa_mensual) ** num_cuotas
+    cuota = capital * (tasa_mensual * factor) / (factor - 1)
+
+    return cuota.quantize(CENTAVO)
+
+
+def generar_tablas_amortizacion(parametros):
+    """
+    Genera las tablas de amortización de varios créditos en un solo cálculo.
+
+    Args:
+        parametros (list[dict]): Un dict por crédito con las claves
+            - capital (Decimal): Capital a amortizar
+            - tasa_mensual (Decimal): Tasa mensual en decimal (0.019 = 1.9%)
+            - plazo (int): Número de cuotas
+            - fecha_primera_cuota (date, opcional): Vencimiento de la primera cuota
+            - valor_cuota (Decimal, opcional): Cuota fija ya pactada; si no se
+              envía se calcula con `calcular_cuota_fija`
+            - numero_inicial (int, opcional): Número de la primera cuota (default 1)
+
+    Returns:
+        list[dict]: Una tabla por crédito, en el mismo orden de entrada, con
+        `valor_cuota`, `cuotas` (numero, fecha_vencimiento, capital, interes,
+        cuota, saldo_pendiente) y los totales de capital, intereses y pago.
+        Todos los montos son Decimal con dos decimales.
+    """
+    parametros = list(parametros)
+    if not parametros:
+        return []
+
+    capitales = []
+    tasas = []
+    plazos = []
+    cuotas_fijas = []
+    for item in parametros:
+        capital = _a_decimal(item['capital']).quantize(CENTAVO)
+        tasa = _a_decimal(item.get('tasa_mensual'))
+        plazo = int(item.get('plazo') or 0)
+        valor_cuota = item.get('valor_cuota')
+        if valor_cuota is None:
+            valor_cuota = calcular_cuota_fija(capital, tasa, plazo)
+        capitales.append(capital)
+        tasas.append(tasa)
+        plazos.append(plazo)
+        cuotas_fijas.append(_a_decimal(valor_cuota).quantize(CENTAVO))
+
+    max_plazo = max(plazos)
+    if max_plazo <= 0:
+        return [_tabla_vacia(cuota) for cuota in cuotas_fijas]
+
+    capital_cent = np.array([int(c.scaleb(2)) for c in capitales], dtype=np.int64)
+    cuota_cent = np.array([int(c.scaleb(2)) for c in cuotas_fijas], dtype=np.int64)
+    tasa_arr = np.array([float(t) for t in tasas], dtype=np.float64)
+    plazo_arr = np.array(plazos, dtype=np.int64)
+
+    # Saldo antes de la cuota k en forma cerrada:
+    #   B_k = P(1+i)^k - C((1+i)^k - 1) / i      (i > 0)
+    #   B_k = P - C*k                             (i = 0)
+    k = np.arange(max_plazo, dtype=np.float64)
+    capital_f = capital_cent[:, None].astype(np.float64)
+    cuota_f = cuota_cent[:, None].astype(np.float64)
+    tasa_col = tasa_arr[:, None]
+    crecimiento = np.power(1.0 + tasa_col, k[None, :])
+    con_tasa = tasa_col > 0
+    tasa_segura = np.where(con_tasa, tasa_col, 1.0)
+    saldo_previo = np.where(
+        con_tasa,
+        capital_f * crecimiento - cuota_f * (crecimiento - 1.0) / tasa_segura,
+        capital_f - cuota_f * k[None, :],
+    )
+
+    # A partir de aquí todo es aritmética entera en centavos (exacta).
+    interes_cent = np.rint(np.maximum(saldo_previo, 0.0) * tasa_col).astype(np.int64)
+    capital_cuota_cent = cuota_cent[:, None] - interes_cent
+    activas = k[None, :] < plazo_arr[:, None]
+    capital_cuota_cent = np.where(activas, capital_cuota_cent, 0)
+    interes_cent = np.where(activas, interes_cent, 0)
+
+    # Reconciliación de la última cuota: amortiza exactamente el saldo restante.
+    filas = np.arange(len(parametros))
+    ultima = np.maximum(plazo_arr - 1, 0)
+    pagado_antes_ultima = np.cumsum(capital_cuota_cent, axis=1)
+    pagado_antes_ultima = np.where(
+        ultima > 0,
+        pagado_antes_ultima[filas, np.maximum(ultima - 1, 0)],
+        0,
+    )
+    capital_ultima = capital_cent - pagado_antes_ultima
+    interes_ultima = cuota_cent - capital_ultima
+    negativo = interes_ultima < 0
+    interes_ultima = np.where(negativo, 0, interes_ultima)
+    capital_ultima = np.where(negativo, cuota_cent, capital_ultima)
+    con_cuotas = plazo_arr > 0
+    capital_cuota_cent[filas[con_cuotas], ultima[con_cuotas]] = capital_ultima[con_cuotas]
+    interes_cent[filas[con_cuotas], ultima[con_cuotas]] = interes_ultima[con_cuotas]
+
+    saldo_cent = np.maximum(capital_cent[:, None] - np.cumsum(capital_cuota_cent, axis=1), 0)
+
+    capital_filas = capital_cuota_cent.tolist()
+    interes_filas = interes_cent.tolist()
+    saldo_filas = saldo_cent.tolist()
+    fechas_cache = {}
+
+    tablas = []
+    for idx, item in enumerate(parametros):
+        plazo = plazos[idx]
+        valor_cuota = cuotas_fijas[idx]
+        if plazo <= 0:
+            tablas.append(_tabla_vacia(valor_cuota))
+            continue
+
+        fechas = _fechas_vencimiento(item.get('fecha_primera_cuota'), plazo, fechas_cache)
+        numero_inicial = int(item.get('numero_inicial') or 1)
+        capital_fila = capital_filas[idx][:plazo]
+        interes_fila = interes_filas[idx][:plazo]
+        saldo_fila = saldo_filas[idx]
+        cuotas = [
+            {
+                'numero': numero_inicial + j,
+                'fecha_vencimiento': fechas[j],
+                'capital': _centavos_a_decimal(capital_fila[j]),
+                'interes': _centavos_a_decimal(interes_fila[j]),
+                'cuota': valor_cuota,
+                'saldo_pendiente': _centavos_a_decimal(saldo_fila[j]),
+            }
+            for j in range(plazo)
+        ]
+
+        tablas.append({
+            'valor_cuota': valor_cuota,
+            'cuotas': cuotas,
+            'total_capital': _centavos_a_decimal(sum(capital_fila)),
+            'total_intereses': _centavos_a_decimal(sum(interes_fila)),
+            'total_pagar': valor_cuota * plazo,
+        })
+
+    return tablas
+
+
+def generar_tabla_amortizacion(capital, tasa_mensual, plazo, fecha_primera_cuota=None, valor_cuota=None, numero_inicial=1):
+    """
+    Atajo de `generar_tablas_amortizacion` para un único crédito.
+    """
+    return generar_tablas_amortizacion([{
+        'capital': capital,
+        'tasa_mensual': tasa_mensual,
+        'plazo': plazo,
+        'fecha_primera_cuota': fecha_primera_cuota,
+        'valor_cuota': valor_cuota,
+        'numero_inicial': numero_inicial,
+    }])[0]
+
+
+def _fechas_vencimiento(fecha_primera_cuota, plazo, cache):
+    """
+    Fechas mensuales desde la primera cuota. Se reutilizan entre créditos con la
+    misma fecha de inicio, que es lo normal en una activación por lotes.
+    """
+    if not fecha_primera_cuota:
+        return [None] * plazo
+
+    fechas = cache.get(fecha_primera_cuota)
+    if fechas is None or len(fechas) < plazo:
+        fechas = [fecha_primera_cuota + relativedelta(months=j) for j in range(plazo)]
+        cache[fecha_primera_cuota] = fechas
+    return fechas
+
+
+def _tabla_vacia(valor_cuota):
+    return {
+        'valor_cuota': valor_cuota,
+        'cuotas': [],
+        'total_capital': Decimal('0.00'),
+        'total_intereses': Decimal('0.00'),
+        'total_pagar': Decimal('0.00'),
+    }
@@ -0,0 +1,81 @@
+"""
+Búsqueda de créditos por texto (nombre, cédula, número de crédito, usuario o email).
+
+Cada crédito guarda en `Credito.texto_busqueda` esos datos normalizados
+(minúsculas, sin tildes), de modo que la búsqueda es un único LIKE sobre una
+columna en lugar de ocho `icontains` sobre tres tablas unidas. En Postgres la
+columna tiene un índice GIN `gin_trgm_ops` (migración 0023) que resuelve el
+LIKE '%texto%' sin recorrer la tabla; en SQLite (desarrollo) se usa el mismo
+LIKE sin índice.
+
+El documento se mantiene con las señales de `gestion_creditos.signals` al
+guardar el crédito, sus detalles o el usuario.
+"""
+
+import unicodedata
+
+from gestion_creditos.models import Credito
+
+CAMPOS_DOCUMENTO = (
+    'numero_credito',
+    'usuario__username',
+    'usuario__email',
+    'detalle_emprendimiento__nombre',
+    'detalle_emprendimiento__numero_cedula',
+    'detalle_libranza__nombres',
+    'detalle_libranza__apellidos',
+    'detalle_libranza__cedula',
+)
+
+
+def normalizar_texto_busqueda(texto):
+    """Minúsculas, sin tildes y con espacios simples."""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.split())
+
+
+def construir_documento(*valores):
+    return normalizar_texto_busqueda(' '.join(str(v) for v in valores if v))
+
+
+def actualizar_documentos_busqueda(credito_ids=None, batch_size=500):
+    """
+    Recalcula `texto_busqueda` de los créditos indicados (o de todos) con una
+    consulta y actualizaciones por lotes.
+
+    Returns:
+        int: Número de créditos cuyo documento cambió
+    """
+    creditos = Credito.objects.all()
+    if credito_ids is not None:
+        if not credito_ids:
+            return 0
+        creditos = creditos.filter(id__in=credito_ids)
+
+    modificados = []
+    actualizados = 0
+    filas = creditos.order_by().values_list('id', 'texto_busqueda', *CAMPOS_DOCUMENTO)
+    for credito_id, actual, *valores in filas.iterator(chunk_size=batch_size):
+        documento = construir_documento(*valores)
+        if documento == actual:
+            continue
+        modificados.append(Credito(id=credito_id, texto_busqueda=documento))
+        if len(modificados) >= batch_size:
+            Credito.objects.bulk_update(modificados, ['texto_busqueda'])
+            actualizados += len(modificados)
+            modificados = []
+
+    Credito.objects.bulk_update(modificados, ['texto_busqueda'])
+    return actualizados + len(modificados)
+
+
+def buscar_creditos(queryset, texto):
+    """
+    Filtra `queryset` (de Credito) por texto libre. Es la búsqueda que usan
+    los listados del admin y del pagador.
+    """
+    texto = normalizar_texto_busqueda(texto)
+    if not texto:
+        return queryset
+    return queryset.filter(texto_busqueda__contains=texto)
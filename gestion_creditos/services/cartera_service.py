@@ -0,0 +1,226 @@
+"""
+Fotos mensuales de cartera (`CarteraSnapshot`) para el dashboard de administración.
+
+La tarea nocturna llama a `generar_snapshot_cartera`, que agrega la cartera
+viva por línea y guarda la fila del mes en curso. El dashboard lee la serie
+histórica con `obtener_serie_cartera` sin recorrer la tabla de créditos.
+
+Los meses anteriores a la primera ejecución de la tarea se reconstruyen una
+vez con `reconstruir_snapshots_cartera` (comando `generar_snapshots_cartera`)
+a partir de las tablas de amortización.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import Count, DateField, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from gestion_creditos.models import CarteraSnapshot, Credito, CuotaAmortizacion
+
+
+CERO = Decimal('0.00')
+ESTADOS_VIGENTES = [Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]
+
+
+def _agrupar_por_linea(filas):
+    return {fila.pop('linea'): fila for fila in filas}
+
+
+@transaction.atomic
+def generar_snapshot_cartera(fecha_corte=None):
+    """
+    Calcula y guarda la foto del mes de `fecha_corte` (por defecto hoy) para
+    cada línea de crédito.
+
+    Returns:
+        list[CarteraSnapshot]: Una fila por línea
+    """
+    fecha_corte = fecha_corte or timezone.localdate()
+    mes = fecha_corte.replace(day=1)
+    decimal_field = DecimalField(max_digits=16, decimal_places=2)
+
+    cartera = _agrupar_por_linea(
+        Credito.objects.filter(estado__in=ESTADOS_VIGENTES)
+        .values('linea')
+        .annotate(
+            saldo_cartera=Coalesce(Sum('saldo_pendiente'), Value(CERO), output_field=decimal_field),
+            creditos_vigentes=Count('id'),
+            creditos_en_mora=Count('id', filter=Q(estado=Credito.EstadoCredito.EN_MORA)),
+            saldo_en_mora=Coalesce(
+                Sum('saldo_pendiente', filter=Q(estado=Credito.EstadoCredito.EN_MORA)),
+                Value(CERO),
+                output_field=decimal_field,
+            ),
+        )
+        .order_by()
+    )
+
+    monto_vencido_expr = ExpressionWrapper(
+        F('valor_cuota') - Coalesce(F('monto_pagado'), Value(CERO)),
+        output_field=decimal_field,
+    )
+    vencido = _agrupar_por_linea(
+        CuotaAmortizacion.objects.filter(
+            pagada=False,
+            fecha_vencimiento__lt=fecha_corte,
+            credito__estado__in=ESTADOS_VIGENTES,
+        )
+        .values(linea=F('credito__linea'))
+        .annotate(monto_vencido=Coalesce(Sum(monto_vencido_expr), Value(CERO), output_field=decimal_field))
+        .order_by()
+    )
+
+    desembolsos = _agrupar_por_linea(
+        Credito.objects.filter(
+            fecha_desembolso__date__gte=mes,
+            fecha_desembolso__date__lte=fecha_corte,
+        )
+        .values('linea')
+        .annotate(
+            creditos_desembolsados=Count('id'),
+            monto_desembolsado=Coalesce(Sum('monto_aprobado'), Value(CERO), output_field=decimal_field),
+        )
+        .order_by()
+    )
+
+    snapshots = []
+    for linea in Credito.LineaCredito.values:
+        valores = {
+            'saldo_cartera': CERO,
+            'creditos_vigentes': 0,
+            'creditos_en_mora': 0,
+            'saldo_en_mora': CERO,
+            'monto_vencido': CERO,
+            'creditos_desembolsados': 0,
+            'monto_desembolsado': CERO,
+            'fecha_corte': fecha_corte,
+        }
+        valores.update(cartera.get(linea, {}))
+        valores.update(vencido.get(linea, {}))
+        valores.update(desembolsos.get(linea, {}))
+        snapshot, _ = CarteraSnapshot.objects.update_or_create(mes=mes, linea=linea, defaults=valores)
+        snapshots.append(snapshot)
+
+    return snapshots
+
+
+def obtener_serie_cartera(meses=12, hoy=None):
+    """
+    Serie de saldo de cartera por línea para los últimos `meses` meses,
+    leída de `CarteraSnapshot` en una sola consulta. Los meses sin foto
+    quedan en cero.
+
+    Returns:
+        dict: labels, emprendimiento, libranza y total (listas de float)
+    """
+    hoy = hoy or timezone.localdate()
+    meses_serie = [(hoy - relativedelta(months=i)).replace(day=1) for i in range(meses - 1, -1, -1)]
+
+    saldos = {
+        (mes, linea): saldo
+        for mes, linea, saldo in CarteraSnapshot.objects.filter(
+            mes__gte=meses_serie[0], mes__lte=meses_serie[-1]
+        ).values_list('mes', 'linea', 'saldo_cartera')
+    }
+
+    emprendimiento = [float(saldos.get((mes, Credito.LineaCredito.EMPRENDIMIENTO), CERO)) for mes in meses_serie]
+    libranza = [float(saldos.get((mes, Credito.LineaCredito.LIBRANZA), CERO)) for mes in meses_serie]
+
+    return {
+        'labels': [mes.strftime('%b %Y') for mes in meses_serie],
+        'emprendimiento': emprendimiento,
+        'libranza': libranza,
+        'total': [e + l for e, l in zip(emprendimiento, libranza)],
+    }
+
+
+def reconstruir_snapshots_cartera(meses=12, hoy=None, sobrescribir=False):
+    """
+    Reconstruye las fotos de los `meses` meses cerrados anteriores al actual a
+    partir de las tablas de amortización, para que la serie del dashboard no
+    arranque en cero. Por defecto no toca los meses que ya tienen foto.
+
+    Al cierre de cada mes se cuenta como cartera el capital de las cuotas que
+    aún no estaban pagadas, y como vencido el valor de las que además ya
+    estaban vencidas; un crédito con cuotas vencidas cuenta como en mora. Es
+    una aproximación: los abonos parciales y las reestructuraciones de la
+    tabla no quedan reflejados.
+
+    Returns:
+        list[CarteraSnapshot]: Filas creadas o actualizadas
+    """
+    hoy = hoy or timezone.localdate()
+    mes_actual = hoy.replace(day=1)
+    cierres = {}
+    for i in range(meses, 0, -1):
+        mes = mes_actual - relativedelta(months=i)
+        cierres[mes] = mes + relativedelta(months=1) - timedelta(days=1)
+    if not sobrescribir:
+        existentes = set(CarteraSnapshot.objects.filter(mes__in=list(cierres)).values_list('mes', flat=True))
+        cierres = {mes: cierre for mes, cierre in cierres.items() if mes not in existentes}
+    if not cierres:
+        return []
+
+    primer_mes, ultimo_cierre = min(cierres), max(cierres.values())
+    # (mes, linea) -> credito_id -> [capital pendiente, monto vencido]
+    pendientes = defaultdict(lambda: defaultdict(lambda: [CERO, CERO]))
+    cuotas = CuotaAmortizacion.objects.filter(
+        credito__estado__in=ESTADOS_VIGENTES + [Credito.EstadoCredito.PAGADO],
+        credito__fecha_desembolso__isnull=False,
+        credito__fecha_desembolso__date__lte=ultimo_cierre,
+    ).exclude(
+        fecha_pago__date__lt=primer_mes
+    ).values_list(
+        'credito_id', 'credito__linea', 'credito__fecha_desembolso',
+        'fecha_vencimiento', 'capital_a_pagar', 'valor_cuota', 'pagada', 'fecha_pago',
+    )
+    for credito_id, linea, desembolso, vencimiento, capital, valor_cuota, pagada, fecha_pago in cuotas.iterator():
+        desembolso = timezone.localtime(desembolso).date()
+        pago = timezone.localtime(fecha_pago).date() if pagada and fecha_pago else None
+        for mes, cierre in cierres.items():
+            if desembolso > cierre or (pagada and (pago is None or pago <= cierre)):
+                continue
+            acumulado = pendientes[mes, linea][credito_id]
+            acumulado[0] += capital
+            if vencimiento < cierre:
+                acumulado[1] += valor_cuota
+
+    decimal_field = DecimalField(max_digits=16, decimal_places=2)
+    filas_desembolso = (
+        Credito.objects.filter(fecha_desembolso__date__gte=primer_mes, fecha_desembolso__date__lte=ultimo_cierre)
+        .annotate(mes=TruncMonth('fecha_desembolso', output_field=DateField()))
+        .values('mes', 'linea')
+        .annotate(
+            creditos_desembolsados=Count('id'),
+            monto_desembolsado=Coalesce(Sum('monto_aprobado'), Value(CERO), output_field=decimal_field),
+        )
+        .order_by()
+    )
+    desembolsos = {(fila.pop('mes'), fila.pop('linea')): fila for fila in filas_desembolso}
+
+    snapshots = []
+    with transaction.atomic():
+        for mes, cierre in sorted(cierres.items()):
+            for linea in Credito.LineaCredito.values:
+                creditos = pendientes[mes, linea]
+                en_mora = [saldos for saldos in creditos.values() if saldos[1] > 0]
+                valores = {
+                    'saldo_cartera': sum((saldos[0] for saldos in creditos.values()), CERO),
+                    'creditos_vigentes': len(creditos),
+                    'creditos_en_mora': len(en_mora),
+                    'saldo_en_mora': sum((saldos[0] for saldos in en_mora), CERO),
+                    'monto_vencido': sum((saldos[1] for saldos in en_mora), CERO),
+                    'creditos_desembolsados': 0,
+                    'monto_desembolsado': CERO,
+                    'fecha_corte': cierre,
+                }
+                valores.update(desembolsos.get((mes, linea), {}))
+                snapshot, _ = CarteraSnapshot.objects.update_or_create(mes=mes, linea=linea, defaults=valores)
+                snapshots.append(snapshot)
+
+    return snapshots
@@ -0,0 +1,223 @@
+"""
+Conciliación de pagos Wompi en segundo plano.
+
+Cada `WompiIntent` con transacción creada queda programado
+(`proxima_consulta`). La tarea periódica reclama los vencidos con
+`select_for_update(skip_locked)`, consulta Wompi fuera de la transacción y,
+si el pago fue aprobado, lo aplica una sola vez (`aplicado_en`). Entre
+consultas se espera cada vez más (`ESPERAS_CONSULTA_SEGUNDOS`) y, agotadas,
+el intento se marca como expirado.
+
+El navegador ya no consulta Wompi: solo lee el estado guardado en el intento.
+"""
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from gestion_creditos.models import Credito, HistorialPago, WompiIntent
+from gestion_creditos.services import lote_pago_masivo_service
+
+logger = logging.getLogger(__name__)
+
+TIPO_PAGO_CSV_MASIVO = 'CSV_MASIVO'
+TIPO_PAGO_CAPITAL = 'CAPITAL'
+
+# Espera antes de cada nueva consulta; la última se repite hasta agotar el máximo
+ESPERAS_CONSULTA_SEGUNDOS = (10, 20, 30, 60, 120, 300, 600, 1800, 3600)
+MAX_CONSULTAS_ESTADO = 30
+INTENTOS_POR_EJECUCION = 100
+
+ESTADOS_FINALES = {
+    WompiIntent.Estado.APPROVED,
+    WompiIntent.Estado.DECLINED,
+    WompiIntent.Estado.ERROR,
+    WompiIntent.Estado.EXPIRED,
+}
+
+
+def mapear_estado_wompi(status):
+    if not status:
+        return WompiIntent.Estado.PENDING
+    normalized = str(status).upper()
+    if normalized in WompiIntent.Estado.values:
+        return normalized
+    if normalized == 'VOIDED':
+        return WompiIntent.Estado.EXPIRED
+    return WompiIntent.Estado.PENDING
+
+
+def espera_consulta(consultas):
+    indice = min(consultas, len(ESPERAS_CONSULTA_SEGUNDOS) - 1)
+    return timedelta(seconds=ESPERAS_CONSULTA_SEGUNDOS[indice])
+
+
+def programar_conciliacion(intent, transaction_id, status):
+    """Guarda la transacción creada y programa su primera consulta."""
+    intent.status = mapear_estado_wompi(status)
+    intent.wompi_transaction_id = transaction_id or intent.wompi_transaction_id
+    # Un aprobado se sigue programando hasta que quede aplicado
+    pendiente = intent.status not in ESTADOS_FINALES or intent.status == WompiIntent.Estado.APPROVED
+    intent.proxima_consulta = (
+        timezone.now() + espera_consulta(0) if intent.wompi_transaction_id and pendiente else None
+    )
+    intent.save(update_fields=['status', 'wompi_transaction_id', 'proxima_consulta', 'updated_at'])
+
+
+def reclamar_intentos_pendientes(limite=INTENTOS_POR_EJECUCION, ahora=None, intent_id=None):
+    """
+    Toma los intentos cuya consulta venció y corre su siguiente consulta hacia
+    adelante, de modo que otro worker no los tome mientras se consultan.
+    Con `intent_id` toma ese intento sin esperar su turno.
+
+    Returns:
+        list[WompiIntent]: Intentos reclamados
+    """
+    ahora = ahora or timezone.now()
+    with transaction.atomic():
+        pendientes = WompiIntent.objects.select_for_update(skip_locked=True).filter(
+            proxima_consulta__isnull=False,
+            aplicado_en__isnull=True,
+            wompi_transaction_id__isnull=False,
+        )
+        if intent_id is not None:
+            pendientes = pendientes.filter(id=intent_id)
+        else:
+            pendientes = pendientes.filter(proxima_consulta__lte=ahora)
+        intentos = list(pendientes.order_by('proxima_consulta')[:limite])
+
+        for intent in intentos:
+            intent.consultas_estado += 1
+            intent.proxima_consulta = ahora + espera_consulta(intent.consultas_estado)
+        WompiIntent.objects.bulk_update(intentos, ['consultas_estado', 'proxima_consulta'])
+    return intentos
+
+
+def conciliar_intento(intent, client):
+    """
+    Consulta la transacción en Wompi y actualiza el intento: aplica el pago si
+    fue aprobado, cierra los rechazados y expira los que agotaron consultas.
+
+    Returns:
+        str: Estado resultante del intento
+    """
+    from gestion_creditos.services.wompi_client import WompiAPIException
+
+    try:
+        datos = client.get_transaction(intent.wompi_transaction_id).get('data', {})
+    except WompiAPIException as e:
+        logger.warning('No se pudo consultar la transacción Wompi %s: %s', intent.wompi_transaction_id, e)
+        return intent.status
+
+    estado = mapear_estado_wompi(datos.get('status'))
+    if estado == WompiIntent.Estado.APPROVED:
+        aplicar_pago_aprobado(intent.id, datos)
+        return estado
+
+    campos = {'status': estado, 'datos_transaccion': datos, 'updated_at': timezone.now()}
+    if estado in ESTADOS_FINALES:
+        campos['proxima_consulta'] = None
+    elif intent.consultas_estado >= MAX_CONSULTAS_ESTADO:
+        estado = campos['status'] = WompiIntent.Estado.EXPIRED
+        campos['proxima_consulta'] = None
+        logger.warning('Intento Wompi %s expiró sin estado final tras %s consultas', intent.id, intent.consultas_estado)
+
+    WompiIntent.objects.filter(id=intent.id, aplicado_en__isnull=True).update(**campos)
+    if estado in ESTADOS_FINALES and intent.lote_id:
+        lote_pago_masivo_service.marcar_rechazado(intent.lote_id)
+    return estado
+
+
+def aplicar_pago_aprobado(intent_id, datos_transaccion):
+    """
+    Aplica una sola vez el pago aprobado de un intento, según su tipo: el lote
+    del CSV masivo, un abono a capital o un pago de cuota. El lote se marca
+    cobrado antes de aplicarse, de modo que un fallo al aplicarlo queda visible.
+
+    Returns:
+        tuple[WompiIntent, bool]: El intento y si se aplicó en este llamado
+    """
+    from gestion_creditos import credit_services
+
+    lote_id = WompiIntent.objects.filter(id=intent_id, aplicado_en__isnull=True).values_list('lote_id', flat=True).first()
+    if lote_id:
+        lote_pago_masivo_service.marcar_cobrado(lote_id)
+
+    with transaction.atomic():
+        intent = WompiIntent.objects.select_for_update().get(id=intent_id)
+        if intent.aplicado_en:
+            return intent, False
+
+        referencia = intent.referencia
+        monto = Decimal(datos_transaccion.get('amount_in_cents') or intent.amount_in_cents) / 100
+
+        if intent.tipo_pago == TIPO_PAGO_CSV_MASIVO:
+            if intent.lote_id:
+                lote_pago_masivo_service.aplicar_lote(intent.lote_id)
+        elif intent.tipo_pago == TIPO_PAGO_CAPITAL:
+            if not HistorialPago.objects.filter(referencia_pago=referencia).exists():
+                credit_services.aplicar_abono_credito(
+                    credito=intent.credito,
+                    monto_abono=monto,
+                    tipo_abono='CAPITAL',
+                    usuario=intent.usuario,
+                    referencia_pago=referencia,
+                )
+        else:
+            credito = Credito.objects.select_for_update().get(id=intent.credito_id)
+            pago, created = HistorialPago.objects.get_or_create(
+                referencia_pago=referencia,
+                defaults={
+                    'credito': credito,
+                    'monto': monto,
+                    'estado': HistorialPago.EstadoPago.EXITOSO,
+                }
+            )
+            if created:
+                credit_services.actualizar_saldo_tras_pago(credito, monto, pago=pago)
+
+        intent.status = WompiIntent.Estado.APPROVED
+        intent.datos_transaccion = datos_transaccion
+        intent.aplicado_en = timezone.now()
+        intent.proxima_consulta = None
+        intent.save(update_fields=['status', 'datos_transaccion', 'aplicado_en', 'proxima_consulta', 'updated_at'])
+    return intent, True
+
+
+def conciliar_intentos_pendientes(client=None, limite=INTENTOS_POR_EJECUCION, intent_id=None):
+    """
+    Reclama y concilia los intentos vencidos (o uno solo con `intent_id`).
+
+    Returns:
+        dict: estado -> número de intentos
+    """
+    from gestion_creditos.services.wompi_client import WompiClient
+
+    intentos = reclamar_intentos_pendientes(limite, intent_id=intent_id)
+    if not intentos:
+        return {}
+
+    client = client or WompiClient()
+    resumen = {}
+    for intent in intentos:
+        try:
+            estado = conciliar_intento(intent, client)
+        except Exception:
+            logger.exception('Error conciliando el intento Wompi %s', intent.id)
+            estado = 'FALLO'
+        resumen[estado] = resumen.get(estado, 0) + 1
+    return resumen
+
+
+def estado_para_navegador(intent):
+    """Estado que consulta la página de espera del navegador."""
+    return {
+        'status': intent.status,
+        'aplicado': intent.aplicado_en is not None,
+        'finalizado': intent.aplicado_en is not None or (
+            intent.status in ESTADOS_FINALES and intent.status != WompiIntent.Estado.APPROVED
+        ),
+    }
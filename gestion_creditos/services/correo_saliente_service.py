@@ -0,0 +1,228 @@
+"""
+Bandeja de salida transaccional de correos (`CorreoSaliente`).
+
+Los servicios de negocio registran el correo dentro de su transacción con
+`encolar_*`; al confirmar la transacción se programa el despacho en Celery.
+Así ningún request, webhook ni bloqueo `select_for_update` espera al SMTP.
+
+El despacho toma lotes de filas pendientes (con `skip_locked` para que varios
+workers no tomen las mismas), los envía reutilizando la conexión SMTP (`enviar_emails_en_lote`) y
+reprograma los fallidos con backoff exponencial. La pareja
+(destinatario, clave) es única: encolar dos veces el mismo evento no duplica
+el correo.
+"""
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from gestion_creditos.email_service import (
+    ESTADOS_CON_CORREO,
+    construir_confirmacion_pago,
+    construir_email_cambio_estado,
+    enviar_emails_en_lote,
+)
+from gestion_creditos.models import CorreoSaliente
+
+logger = logging.getLogger(__name__)
+
+CORREOS_POR_LOTE = 50
+MAX_LOTES_POR_DESPACHO = 20
+MAX_INTENTOS = 5
+RETRASO_BASE_SEGUNDOS = 60
+RETRASO_MAXIMO_SEGUNDOS = 3600
+# Tiempo que una fila tomada queda reservada; si el worker muere se retoma después
+RESERVA_ENVIO = timedelta(minutes=10)
+
+
+def encolar_correos(correos):
+    """
+    Registra correos en la bandeja de salida (ignora duplicados por
+    destinatario y clave) y programa el despacho al confirmar la transacción.
+
+    Args:
+        correos (list[CorreoSaliente]): Instancias sin guardar
+    """
+    correos = [c for c in correos if c.destinatario]
+    if not correos:
+        return
+
+    ahora = timezone.now()
+    for correo in correos:
+        correo.proximo_intento = correo.proximo_intento or ahora
+    CorreoSaliente.objects.bulk_create(correos, ignore_conflicts=True, batch_size=500)
+    transaction.on_commit(_programar_despacho)
+
+
+def correo_cambio_estado(credito, nuevo_estado, motivo='', clave=None):
+    """
+    Arma (sin guardar) el aviso de cambio de estado, o None si el estado no
+    notifica por correo.
+    """
+    if nuevo_estado not in ESTADOS_CON_CORREO:
+        return None
+    return CorreoSaliente(
+        tipo=CorreoSaliente.TipoCorreo.CAMBIO_ESTADO,
+        credito_id=credito.id,
+        destinatario=credito.usuario.email,
+        clave=clave or f'estado:{credito.id}:{nuevo_estado}:{timezone.now().date().isoformat()}',
+        datos={'nuevo_estado': nuevo_estado, 'motivo': motivo or ''},
+    )
+
+
+def correo_confirmacion_pago(credito, monto_pagado, nuevo_saldo, clave, destinatario=None, **extra):
+    """
+    Arma (sin guardar) la confirmación de pago. `extra` admite los mismos
+    argumentos opcionales que `construir_confirmacion_pago`.
+    """
+    datos = {'monto': str(monto_pagado), 'saldo': str(nuevo_saldo)}
+    for campo, valor in extra.items():
+        if valor is None:
+            continue
+        datos[campo] = valor.isoformat() if hasattr(valor, 'isoformat') else valor
+    return CorreoSaliente(
+        tipo=CorreoSaliente.TipoCorreo.CONFIRMACION_PAGO,
+        credito_id=credito.id,
+        destinatario=destinatario or credito.usuario.email,
+        clave=clave,
+        datos=datos,
+    )
+
+
+def encolar_notificacion_cambio_estado(credito, nuevo_estado, motivo='', clave=None):
+    correo = correo_cambio_estado(credito, nuevo_estado, motivo, clave=clave)
+    if correo:
+        encolar_correos([correo])
+
+
+def encolar_confirmacion_pago(credito, monto_pagado, nuevo_saldo, clave, destinatario=None, **extra):
+    encolar_correos([
+        correo_confirmacion_pago(credito, monto_pagado, nuevo_saldo, clave, destinatario=destinatario, **extra)
+    ])
+
+
+def _programar_despacho():
+    from gestion_creditos.tasks import despachar_correos_task
+
+    try:
+        despachar_correos_task.delay()
+    except Exception as e:
+        # La tarea periódica de despacho los tomará en el siguiente ciclo
+        logger.error(f"No se pudo programar el despacho de correos: {e}")
+
+
+def _construir_mensaje(correo):
+    datos = correo.datos or {}
+    if correo.tipo == CorreoSaliente.TipoCorreo.CAMBIO_ESTADO:
+        return construir_email_cambio_estado(correo.credito, datos['nuevo_estado'], datos.get('motivo', ''))
+
+    if correo.tipo == CorreoSaliente.TipoCorreo.CONFIRMACION_PAGO:
+        extra = {k: v for k, v in datos.items() if k not in ('monto', 'saldo')}
+        if extra.get('fecha_pago'):
+            extra['fecha_pago'] = parse_datetime(extra['fecha_pago'])
+        return construir_confirmacion_pago(
+            correo.credito,
+            Decimal(datos['monto']),
+            Decimal(datos['saldo']),
+            destinatario=correo.destinatario,
+            **extra
+        )
+
+    raise ValueError(f"Tipo de correo no soportado: {correo.tipo}")
+
+
+def _reservar_lote(limite):
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            CorreoSaliente.objects.select_for_update(skip_locked=True)
+            .filter(
+                estado__in=[CorreoSaliente.EstadoCorreo.PENDIENTE, CorreoSaliente.EstadoCorreo.ENVIANDO],
+                proximo_intento__lte=ahora,
+            )
+            .order_by('id')
+            .values_list('id', flat=True)[:limite]
+        )
+        if ids:
+            CorreoSaliente.objects.filter(id__in=ids).update(
+                estado=CorreoSaliente.EstadoCorreo.ENVIANDO,
+                proximo_intento=ahora + RESERVA_ENVIO,
+                intentos=F('intentos') + 1,
+            )
+    return ids
+
+
+def _registrar_fallo(correo, error, ahora):
+    correo.ultimo_error = str(error)[:2000]
+    if correo.intentos >= MAX_INTENTOS:
+        correo.estado = CorreoSaliente.EstadoCorreo.FALLIDO
+        logger.error(f"Correo {correo.id} a {correo.destinatario} descartado tras {correo.intentos} intentos: {error}")
+        return
+    retraso = min(RETRASO_BASE_SEGUNDOS * 2 ** (correo.intentos - 1), RETRASO_MAXIMO_SEGUNDOS)
+    correo.estado = CorreoSaliente.EstadoCorreo.PENDIENTE
+    correo.proximo_intento = ahora + timedelta(seconds=retraso)
+    logger.warning(f"Correo {correo.id} a {correo.destinatario} falló (intento {correo.intentos}), reintento en {retraso}s: {error}")
+
+
+def _marcar_enviado(correo):
+    correo.estado = CorreoSaliente.EstadoCorreo.ENVIADO
+    correo.fecha_envio = timezone.now()
+    correo.ultimo_error = ''
+
+
+def _enviar_lote(ids):
+    correos = list(
+        CorreoSaliente.objects.filter(id__in=ids).select_related(
+            'credito__usuario', 'credito__detalle_libranza', 'credito__detalle_emprendimiento'
+        ).order_by('id')
+    )
+    por_enviar, mensajes = [], []
+    for correo in correos:
+        try:
+            mensaje = _construir_mensaje(correo)
+        except Exception as e:
+            _registrar_fallo(correo, e, timezone.now())
+            continue
+        if mensaje is None:
+            _marcar_enviado(correo)
+        else:
+            por_enviar.append(correo)
+            mensajes.append(mensaje)
+
+    for correo, error in zip(por_enviar, enviar_emails_en_lote(mensajes)):
+        if error is None:
+            _marcar_enviado(correo)
+        else:
+            _registrar_fallo(correo, error, timezone.now())
+
+    CorreoSaliente.objects.bulk_update(
+        correos, ['estado', 'proximo_intento', 'fecha_envio', 'ultimo_error'], batch_size=500
+    )
+    enviados = sum(1 for c in correos if c.estado == CorreoSaliente.EstadoCorreo.ENVIADO)
+    return enviados, len(correos)
+
+
+def despachar_correos_pendientes(limite=CORREOS_POR_LOTE, max_lotes=MAX_LOTES_POR_DESPACHO):
+    """
+    Envía los correos pendientes cuyo turno ya llegó, por lotes de `limite`
+    sobre una conexión SMTP por lote.
+
+    Returns:
+        dict: enviados y procesados
+    """
+    enviados = procesados = 0
+    for _ in range(max_lotes):
+        ids = _reservar_lote(limite)
+        if not ids:
+            break
+        lote_enviados, lote_procesados = _enviar_lote(ids)
+        enviados += lote_enviados
+        procesados += lote_procesados
+        if len(ids) < limite:
+            break
+    return {'enviados': enviados, 'procesados': procesados}
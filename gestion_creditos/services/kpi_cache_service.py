@@ -0,0 +1,74 @@
+"""
+Caché de KPIs de los dashboards administrativos.
+
+Cada métrica se guarda en el caché de Django bajo una clave versionada
+(`kpi:<metrica>:v<version>`). Invalidar una métrica solo incrementa su
+versión, así las entradas viejas quedan huérfanas y expiran solas. Además
+cada entrada tiene un TTL corto (`DASHBOARD_KPI_CACHE_SECONDS`) que acota
+cuánto puede atrasarse un dashboard si se pierde una invalidación.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+RESUMEN_CARTERA = 'resumen_cartera'
+CREDITOS_ACTIVOS = 'creditos_activos'
+CARTERA_MORA = 'cartera_mora'
+
+METRICAS = (RESUMEN_CARTERA, CREDITOS_ACTIVOS, CARTERA_MORA)
+
+# Métricas afectadas por cada tipo de evento del crédito
+METRICAS_POR_EVENTO = {
+    'estado': METRICAS,
+    'saldo': METRICAS,
+}
+
+
+def _timeout():
+    return int(getattr(settings, 'DASHBOARD_KPI_CACHE_SECONDS', 60))
+
+
+def _clave_version(metrica):
+    return f'kpi:version:{metrica}'
+
+
+def _version(metrica):
+    version = cache.get(_clave_version(metrica))
+    if version is None:
+        cache.add(_clave_version(metrica), 1, timeout=None)
+        version = cache.get(_clave_version(metrica), 1)
+    return version
+
+
+def obtener_kpi(metrica, calcular, sufijo=''):
+    """
+    Retorna el valor cacheado de la métrica o lo calcula con `calcular()`.
+
+    Args:
+        metrica (str): Nombre de la métrica (una de METRICAS)
+        calcular (callable): Función sin argumentos que calcula el valor
+        sufijo (str): Parte adicional de la clave (p. ej. la fecha del día)
+    """
+    clave = f'kpi:{metrica}:v{_version(metrica)}'
+    if sufijo:
+        clave = f'{clave}:{sufijo}'
+
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, timeout=_timeout())
+    return valor
+
+
+def invalidar_kpis(*metricas):
+    """
+    Invalida las métricas indicadas (todas si no se indica ninguna).
+    """
+    for metrica in metricas or METRICAS:
+        clave = _clave_version(metrica)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            # La versión no existía (o expiró): cualquier valor nuevo invalida lo anterior
+            cache.set(clave, 2, timeout=None)
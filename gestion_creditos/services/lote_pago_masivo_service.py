@@ -0,0 +1,91 @@
+"""
+Lotes de pago masivo del pagador.
+
+El CSV validado se guarda como `LotePagoMasivo` con un detalle por crédito
+(las filas repetidas de una cédula se suman). La sesión solo guarda el id
+del lote, y el worker de conciliación de Wompi lo aplica cuando el cobro es
+aprobado, aunque el navegador ya no esté abierto.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from gestion_creditos.models import DetalleLotePagoMasivo, LotePagoMasivo
+
+Estado = LotePagoMasivo.Estado
+
+
+def crear_lote(empresa, usuario, pagos_validos, totales_por_credito, referencia):
+    """
+    Registra el lote validado con un detalle por crédito.
+
+    Args:
+        pagos_validos (list[dict]): Filas válidas de `validar_csv_pagos_masivos`
+        totales_por_credito (dict): credito_id -> monto total del crédito en el CSV
+
+    Returns:
+        LotePagoMasivo: Lote en estado VALIDADO
+    """
+    primera_fila = {}
+    for pago in pagos_validos:
+        primera_fila.setdefault(pago['credito_id'], pago)
+
+    with transaction.atomic():
+        lote = LotePagoMasivo.objects.create(
+            empresa=empresa,
+            usuario=usuario,
+            referencia=referencia,
+            monto_total=sum(totales_por_credito.values()),
+            cantidad_pagos=len(totales_por_credito),
+        )
+        DetalleLotePagoMasivo.objects.bulk_create([
+            DetalleLotePagoMasivo(
+                lote=lote,
+                credito_id=credito_id,
+                cedula=primera_fila[credito_id]['cedula'],
+                nombre=(primera_fila[credito_id]['nombre'] or '')[:200],
+                monto=monto,
+            )
+            for credito_id, monto in totales_por_credito.items()
+        ], batch_size=500)
+    return lote
+
+
+def marcar_cobrado(lote_id):
+    """VALIDADO -> COBRADO. Queda registrado aunque la aplicación falle y se reintente."""
+    return LotePagoMasivo.objects.filter(
+        id=lote_id, estado__in=[Estado.VALIDADO, Estado.RECHAZADO]
+    ).update(estado=Estado.COBRADO, fecha_cobro=timezone.now())
+
+
+def marcar_rechazado(lote_id):
+    return LotePagoMasivo.objects.filter(id=lote_id, estado=Estado.VALIDADO).update(estado=Estado.RECHAZADO)
+
+
+def aplicar_lote(lote_id):
+    """
+    Aplica los pagos del lote en una sola pasada (`aplicar_pagos_masivos`) y lo
+    deja APLICADO. Reaplicar un lote no registra pagos de nuevo.
+
+    Returns:
+        list[HistorialPago]: Pagos registrados en este llamado
+    """
+    from gestion_creditos import credit_services
+
+    with transaction.atomic():
+        lote = LotePagoMasivo.objects.select_for_update().get(id=lote_id)
+        if lote.estado == Estado.APLICADO:
+            return []
+
+        pagos = [
+            {'credito_id': credito_id, 'monto': monto, 'referencia': f"{lote.referencia}-{credito_id}"}
+            for credito_id, monto in lote.detalles.order_by('id').values_list('credito_id', 'monto')
+        ]
+        aplicados = credit_services.aplicar_pagos_masivos(pagos)
+
+        ahora = timezone.now()
+        lote.estado = Estado.APLICADO
+        lote.fecha_cobro = lote.fecha_cobro or ahora
+        lote.fecha_aplicacion = ahora
+        lote.save(update_fields=['estado', 'fecha_cobro', 'fecha_aplicacion'])
+    return aplicados
@@ -0,0 +1,132 @@
+"""
+Selección de recordatorios de pago y alertas de mora del día.
+
+Las reglas (`ReglaNotificacionCredito`) dicen en qué días se avisa. Con ellas
+se calculan las fechas de vencimiento que tocan hoy y una sola consulta trae
+todos los créditos a notificar, excluyendo los que ya tienen el aviso en el
+registro (`NotificacionCreditoEnviada`). Así la tarea puede reejecutarse sin
+duplicar correos.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from gestion_creditos.models import Credito, NotificacionCreditoEnviada, ReglaNotificacionCredito
+
+TipoNotificacion = ReglaNotificacionCredito.TipoNotificacion
+
+# Hasta cuántos días de mora se siguen generando alertas repetidas
+HORIZONTE_MORA_DIAS = 1825
+
+ESTADO_POR_TIPO = {
+    TipoNotificacion.RECORDATORIO_PAGO: Credito.EstadoCredito.ACTIVO,
+    TipoNotificacion.ALERTA_MORA: Credito.EstadoCredito.EN_MORA,
+}
+
+
+def obtener_reglas():
+    return list(
+        ReglaNotificacionCredito.objects.filter(activa=True).values_list('tipo', 'dias', 'repetir_cada')
+    )
+
+
+def fechas_objetivo(hoy, reglas):
+    """
+    Traduce las reglas a fechas de vencimiento que corresponden a `hoy`.
+
+    Returns:
+        dict: tipo -> {fecha_vencimiento: dias}
+    """
+    fechas = {tipo: {} for tipo in ESTADO_POR_TIPO}
+    for tipo, dias, repetir_cada in reglas:
+        if tipo == TipoNotificacion.RECORDATORIO_PAGO:
+            fechas[tipo][hoy + timedelta(days=dias)] = dias
+            continue
+
+        while 0 < dias <= HORIZONTE_MORA_DIAS:
+            fechas[tipo][hoy - timedelta(days=dias)] = dias
+            if not repetir_cada:
+                break
+            dias += repetir_cada
+    return fechas
+
+
+def fecha_vencimiento_objetivo(tipo, dias, fecha_programada):
+    if tipo == TipoNotificacion.RECORDATORIO_PAGO:
+        return fecha_programada + timedelta(days=dias)
+    return fecha_programada - timedelta(days=dias)
+
+
+def seleccionar_notificaciones_pendientes(hoy=None):
+    """
+    Créditos que deben recibir hoy un recordatorio o una alerta de mora y aún
+    no la tienen registrada.
+
+    Returns:
+        dict: (tipo, dias) -> [credito_id, ...]
+    """
+    hoy = hoy or timezone.now().date()
+    fechas = fechas_objetivo(hoy, obtener_reglas())
+
+    filtro = Q()
+    for tipo, por_fecha in fechas.items():
+        if por_fecha:
+            filtro |= Q(estado=ESTADO_POR_TIPO[tipo], fecha_proximo_pago__in=list(por_fecha))
+    if not filtro:
+        return {}
+
+    ya_notificado = NotificacionCreditoEnviada.objects.filter(
+        credito=OuterRef('pk'),
+        fecha_vencimiento=OuterRef('fecha_proximo_pago'),
+        fecha_programada=hoy,
+    )
+    filas = (
+        Credito.objects.filter(filtro)
+        .exclude(Exists(ya_notificado))
+        .order_by('id')
+        .values_list('id', 'estado', 'fecha_proximo_pago')
+    )
+
+    tipo_por_estado = {estado: tipo for tipo, estado in ESTADO_POR_TIPO.items()}
+    pendientes = defaultdict(list)
+    for credito_id, estado, fecha_proximo_pago in filas:
+        tipo = tipo_por_estado[estado]
+        pendientes[(tipo, fechas[tipo][fecha_proximo_pago])].append(credito_id)
+    return dict(pendientes)
+
+
+def creditos_por_notificar(tipo, dias, credito_ids, fecha_programada):
+    """
+    Vuelve a cargar un bloque de créditos justo antes del envío, descartando los
+    que cambiaron (pagaron, salieron de mora) o ya fueron notificados.
+    """
+    fecha_vencimiento = fecha_vencimiento_objetivo(tipo, dias, fecha_programada)
+    ya_notificado = NotificacionCreditoEnviada.objects.filter(
+        credito=OuterRef('pk'), tipo=tipo, fecha_vencimiento=fecha_vencimiento, dias=dias
+    )
+    return list(
+        Credito.objects.select_related('usuario', 'detalle_libranza', 'detalle_emprendimiento')
+        .filter(id__in=credito_ids, estado=ESTADO_POR_TIPO[tipo], fecha_proximo_pago=fecha_vencimiento)
+        .exclude(Exists(ya_notificado))
+        .order_by('id')
+    )
+
+
+def registrar_notificaciones_enviadas(tipo, dias, creditos, fecha_programada):
+    NotificacionCreditoEnviada.objects.bulk_create(
+        [
+            NotificacionCreditoEnviada(
+                credito_id=credito.id,
+                tipo=tipo,
+                fecha_vencimiento=credito.fecha_proximo_pago,
+                dias=dias,
+                fecha_programada=fecha_programada,
+            )
+            for credito in creditos
+        ],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
@@ -0,0 +1,111 @@
+"""
+Asignación de números de crédito CR-YYYY-NNNNN.
+
+En PostgreSQL cada año tiene su propia SEQUENCE: nextval no bloquea y no
+participa de la transacción, así que solicitudes concurrentes no compiten
+por una fila ni chocan con el unique de `numero_credito`. En los demás
+motores (SQLite en local, MySQL) se usa una fila contadora por año en
+`SecuenciaNumeroCredito`, bloqueada con select_for_update.
+
+Ambas variantes se inicializan con el mayor consecutivo existente del año,
+de modo que continúan la numeración previa. La SEQUENCE del año se crea con
+la primera solicitud, bajo un bloqueo consultivo para que dos solicitudes
+simultáneas no intenten crearla a la vez.
+"""
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from gestion_creditos.models import Credito, SecuenciaNumeroCredito
+
+
+def formatear_numero_credito(anio, consecutivo):
+    return f'CR-{anio}-{consecutivo:05d}'
+
+
+def siguiente_numero_credito(anio=None):
+    """
+    Retorna el siguiente número de crédito del año (por defecto el actual).
+    """
+    return reservar_numeros_credito(1, anio=anio)[0]
+
+
+def reservar_numeros_credito(cantidad, anio=None):
+    """
+    Reserva un bloque de números de crédito para cargas masivas.
+
+    Args:
+        cantidad (int): Cuántos números reservar
+        anio (int, opcional): Año de la numeración; por defecto el actual
+
+    Returns:
+        list[str]: Números reservados en orden ascendente. Con la fila contadora
+        el bloque es contiguo; con SEQUENCE puede intercalarse con otras reservas.
+    """
+    if cantidad <= 0:
+        return []
+    anio = anio or timezone.now().year
+
+    if connection.vendor == 'postgresql':
+        consecutivos = _reservar_con_secuencia(anio, cantidad)
+    else:
+        consecutivos = _reservar_con_contador(anio, cantidad)
+
+    return [formatear_numero_credito(anio, n) for n in consecutivos]
+
+
+def _ultimo_consecutivo_existente(anio):
+    """
+    Mayor consecutivo ya emitido para el año. Solo se consulta al crear la
+    secuencia o el contador del año.
+    """
+    prefijo = f'CR-{anio}-'
+    numeros = Credito.objects.filter(numero_credito__startswith=prefijo).values_list('numero_credito', flat=True)
+    consecutivos = [int(n[len(prefijo):]) for n in numeros if n[len(prefijo):].isdigit()]
+    return max(consecutivos, default=0)
+
+
+# Primera clave del bloqueo consultivo que serializa la creación de la secuencia del año
+BLOQUEO_CREACION_SECUENCIA = 7301
+
+
+def _nombre_secuencia(anio):
+    return f'gestion_creditos_numero_credito_{anio}'
+
+
+def _reservar_con_secuencia(anio, cantidad):
+    nombre = connection.ops.quote_name(_nombre_secuencia(anio))
+    sql = f'SELECT nextval(%s) FROM generate_series(1, %s)'
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [nombre, cantidad])
+            return sorted(row[0] for row in cursor.fetchall())
+    except DatabaseError:
+        # La secuencia del año aún no existe
+        pass
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Dos CREATE SEQUENCE IF NOT EXISTS simultáneos pueden chocar en el
+        # catálogo; el bloqueo consultivo deja crearla a un solo proceso por año
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [BLOQUEO_CREACION_SECUENCIA, anio])
+        inicio = _ultimo_consecutivo_existente(anio) + 1
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {nombre} START WITH {int(inicio)}')
+        cursor.execute(sql, [nombre, cantidad])
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def _reservar_con_contador(anio, cantidad):
+    with transaction.atomic():
+        contador = SecuenciaNumeroCredito.objects.select_for_update().filter(anio=anio).first()
+        if contador is None:
+            contador, _ = SecuenciaNumeroCredito.objects.get_or_create(
+                anio=anio,
+                defaults={'ultimo_numero': _ultimo_consecutivo_existente(anio)},
+            )
+            contador = SecuenciaNumeroCredito.objects.select_for_update().get(pk=contador.pk)
+
+        inicio = contador.ultimo_numero + 1
+        contador.ultimo_numero += cantidad
+        contador.save(update_fields=['ultimo_numero'])
+
+    return list(range(inicio, inicio + cantidad))
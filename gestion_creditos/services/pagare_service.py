@@ -16,6 +16,7 @@ from django.utils import timezone
 from weasyprint import HTML
 
 from gestion_creditos.models import Credito, Pagare
+from gestion_creditos.services.amortizacion_service import calcular_cuota_fija
 from gestion_creditos.services.libranza_rules import obtener_fecha_primera_cuota_credito
 from gestion_creditos.services.tasa_service import obtener_tasa_credito
 from .pagare_utils import numero_a_letras, numero_a_letras_simple, formatear_cop
@@ -194,7 +195,7 @@ def _preparar_contexto_pagare(credito, detalle, numero_pagare):
 
     valor_cuota = credito.valor_cuota
     if not valor_cuota:
-        valor_cuota = _calcular_valor_cuota(capital_financiado, tasa_mensual, credito.plazo or 0)
+        valor_cuota = calcular_cuota_fija(capital_financiado, tasa_mensual, credito.plazo or 0)
     else:
         valor_cuota = Decimal(str(valor_cuota)).quantize(Decimal('0.01'))
 
@@ -276,18 +277,6 @@ def _obtener_tasa_interes(credito):
     return obtener_tasa_credito(credito.linea)
 
 
-def _calcular_valor_cuota(capital_financiado, tasa_mensual, plazo_cuotas):
-    if not plazo_cuotas:
-        return Decimal('0.00')
-
-    if tasa_mensual <= 0:
-        return (capital_financiado / plazo_cuotas).quantize(Decimal('0.01'))
-
-    factor = (tasa_mensual * (1 + tasa_mensual) ** plazo_cuotas) / (((1 + tasa_mensual) ** plazo_cuotas) - 1)
-    cuota = capital_financiado * factor
-    return cuota.quantize(Decimal('0.01'))
-
-
 def _calcular_fecha_vencimiento(fecha_primer_pago, plazo_cuotas):
     """
     Calcula la fecha de vencimiento final basandose en el primer pago y el plazo.
@@ -0,0 +1,115 @@
+"""
+Paginación por cursor (keyset) para listados grandes.
+
+En lugar de OFFSET, cada página pide las filas posteriores a la última vista
+según (campo de orden, pk). El costo no crece con el número de página y las
+filas nuevas no desplazan las ya mostradas. Los NULL van siempre al final,
+igual en SQLite y en Postgres.
+
+El total de filas se toma del estimado del planificador de Postgres
+(`contar_aproximado`) para no pagar un COUNT(*) por cada página.
+"""
+
+import base64
+import binascii
+import json
+
+from django.db import connections
+from django.db.models import F, Q
+
+TAMANO_PAGINA = 50
+
+# Por debajo de este estimado se hace el COUNT(*) exacto, que ya es barato
+UMBRAL_CONTEO_EXACTO = 1000
+
+
+class PaginaKeyset:
+    def __init__(self, items, siguiente_cursor=None):
+        self.items = items
+        self.siguiente_cursor = siguiente_cursor
+
+    @property
+    def tiene_siguiente(self):
+        return self.siguiente_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def codificar_cursor(valor, pk):
+    if valor is not None and not isinstance(valor, (str, int, float, bool)):
+        valor = valor.isoformat() if hasattr(valor, 'isoformat') else str(valor)
+    datos = json.dumps([valor, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (valor, pk) o None si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        datos = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valor, pk = json.loads(datos)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if not isinstance(pk, int):
+        return None
+    return valor, pk
+
+
+def paginar_keyset(queryset, orden, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Devuelve la página de `queryset` que sigue a `cursor`, ordenada por `orden`
+    (un campo, con '-' para descendente; admite relaciones con '__') y por pk.
+
+    Returns:
+        PaginaKeyset: Filas de la página y cursor de la siguiente (o None)
+    """
+    descendente = orden.startswith('-')
+    campo = orden.lstrip('-')
+
+    valor = F('valor_keyset')
+    queryset = queryset.annotate(valor_keyset=F(campo)).order_by(
+        valor.desc(nulls_last=True) if descendente else valor.asc(nulls_last=True),
+        'pk',
+    )
+
+    posicion = decodificar_cursor(cursor)
+    if posicion:
+        ultimo_valor, ultimo_pk = posicion
+        if ultimo_valor is None:
+            queryset = queryset.filter(valor_keyset__isnull=True, pk__gt=ultimo_pk)
+        else:
+            comparacion = 'lt' if descendente else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'valor_keyset__{comparacion}': ultimo_valor})
+                | Q(valor_keyset=ultimo_valor, pk__gt=ultimo_pk)
+                | Q(valor_keyset__isnull=True)
+            )
+
+    filas = list(queryset[:tamano + 1])
+    if len(filas) <= tamano:
+        return PaginaKeyset(filas)
+
+    filas = filas[:tamano]
+    return PaginaKeyset(filas, codificar_cursor(filas[-1].valor_keyset, filas[-1].pk))
+
+
+def contar_aproximado(queryset, umbral_exacto=UMBRAL_CONTEO_EXACTO):
+    """
+    Número de filas de `queryset`. En Postgres usa las filas estimadas por
+    EXPLAIN (estadísticas de la tabla) y solo cuenta exacto si el estimado
+    es menor que `umbral_exacto`; en otros motores hace COUNT(*).
+    """
+    queryset = queryset.order_by().values('pk')
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+
+    plan = json.loads(queryset.explain(format='json'))
+    estimado = int(plan[0]['Plan']['Plan Rows'])
+    if estimado < umbral_exacto:
+        return queryset.count()
+    return estimado
@@ -0,0 +1,272 @@
+"""
+Simulación de abonos al crédito (simulador del emprendedor y aplicación del abono).
+
+`SimulacionAbono` carga una sola vez las cuotas pendientes del crédito y
+memoiza el plan actual, el plan con cada abono simulado y el ahorro en
+intereses, que antes se recalculaban (con sus consultas) hasta tres veces
+por análisis.
+
+El análisis completo se guarda además en el caché de Django por un tiempo
+corto (`SIMULACION_ABONO_CACHE_SECONDS`). La clave incluye la versión del
+crédito (`fecha_actualizacion` y saldo pendiente): cualquier pago o abono
+guarda el crédito y cambia la clave, de modo que el simulador (que consulta
+en cada tecla) y la confirmación del abono reutilizan el mismo cálculo
+mientras el crédito no cambie.
+
+El simulador con deslizador pide varios montos a la vez (`simular_abonos`).
+Esos resúmenes no recorren cuotas: con las sumas acumuladas de las cuotas
+pendientes (calculadas una vez por versión del crédito y cacheadas) un abono
+NORMAL/MAYOR se resuelve con una búsqueda binaria y uno a CAPITAL con la
+fórmula de cuota fija.
+"""
+
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from gestion_creditos.services.amortizacion_service import CENTAVO, calcular_cuota_fija
+
+
+SIMULACION_ABONO_CACHE_SECONDS = 300
+MAX_MONTOS_SIMULACION = 50
+
+
+class SimulacionAbono:
+    """Planes de pago de un crédito calculados sobre sus cuotas pendientes."""
+
+    def __init__(self, credito, acumulados=None):
+        self.credito = credito
+        self._cuotas_pendientes = None
+        self._plan_actual = None
+        self._planes = {}
+        self._acumulados = acumulados
+
+    @property
+    def cuotas_pendientes(self):
+        if self._cuotas_pendientes is None:
+            self._cuotas_pendientes = list(
+                self.credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota')
+            )
+        return self._cuotas_pendientes
+
+    @property
+    def plan_actual(self):
+        from gestion_creditos import credit_services
+
+        if self._plan_actual is None:
+            self._plan_actual = credit_services.generar_plan_pagos_actual(self.credito, self.cuotas_pendientes)
+        return self._plan_actual
+
+    @property
+    def acumulados(self):
+        """Sumas acumuladas de cuota, interés y capital de las cuotas pendientes."""
+        if self._acumulados is None:
+            acumulados = {'cuota': [Decimal('0.00')], 'interes': [Decimal('0.00')], 'capital': [Decimal('0.00')]}
+            for cuota in self.cuotas_pendientes:
+                acumulados['cuota'].append(acumulados['cuota'][-1] + cuota.valor_cuota)
+                acumulados['interes'].append(acumulados['interes'][-1] + cuota.interes_a_pagar)
+                acumulados['capital'].append(acumulados['capital'][-1] + cuota.capital_a_pagar)
+            self._acumulados = acumulados
+        return self._acumulados
+
+    def resumen_actual(self):
+        acumulados = self.acumulados
+        return {
+            'cuotas_restantes': len(acumulados['cuota']) - 1,
+            'valor_cuota': float(self.credito.valor_cuota or 0),
+            'capital_pendiente': float(self.credito.capital_pendiente or acumulados['capital'][-1]),
+            'total_intereses': float(acumulados['interes'][-1]),
+        }
+
+    def resumen(self, monto_abono, tipo_abono='NORMAL'):
+        """
+        Plan resultante de un abono, sin recorrer cuotas. Coincide con
+        `calcular_plan_con_abono` para los tres tipos de abono.
+
+        Returns:
+            dict: monto_abono, tipo_abono, requiere_reestructuracion,
+            ahorro_intereses y plan_nuevo (cuotas_restantes, valor_cuota,
+            capital_pendiente, total_intereses)
+        """
+        credito = self.credito
+        acumulados = self.acumulados
+        monto_abono = Decimal(monto_abono)
+        num_cuotas = len(acumulados['cuota']) - 1
+        intereses_actuales = acumulados['interes'][-1]
+
+        if tipo_abono == 'CAPITAL':
+            # Misma cuota fija que la tabla del motor: sus intereses suman cuota * n - capital
+            capital_nuevo = max(
+                Decimal('0.00'), (credito.capital_pendiente or Decimal('0.00')) - monto_abono
+            ).quantize(CENTAVO)
+            cuotas_restantes = num_cuotas if capital_nuevo > 0 else 0
+            tasa_mensual = (credito.tasa_interes or Decimal('0.00')) / Decimal('100')
+            valor_cuota = calcular_cuota_fija(capital_nuevo, tasa_mensual, cuotas_restantes)
+            intereses_nuevos = valor_cuota * cuotas_restantes - capital_nuevo
+        else:
+            # Cuotas completas que cubre el abono, desde la más próxima
+            cubiertas = bisect_right(acumulados['cuota'], monto_abono) - 1
+            cuotas_restantes = num_cuotas - cubiertas
+            capital_nuevo = acumulados['capital'][-1] - acumulados['capital'][cubiertas]
+            intereses_nuevos = intereses_actuales - acumulados['interes'][cubiertas]
+            valor_cuota = (
+                acumulados['cuota'][cubiertas + 1] - acumulados['cuota'][cubiertas]
+                if cuotas_restantes else credito.valor_cuota or Decimal('0.00')
+            )
+
+        return {
+            'monto_abono': float(monto_abono),
+            'tipo_abono': tipo_abono,
+            'requiere_reestructuracion': (
+                tipo_abono == 'CAPITAL' or monto_abono > (credito.valor_cuota or Decimal('0.00')) * 2
+            ),
+            'ahorro_intereses': float(max(Decimal('0.00'), intereses_actuales - intereses_nuevos)),
+            'plan_nuevo': {
+                'cuotas_restantes': cuotas_restantes,
+                'valor_cuota': float(valor_cuota),
+                'capital_pendiente': float(capital_nuevo),
+                'total_intereses': float(intereses_nuevos),
+            },
+        }
+
+    def plan_nuevo(self, monto_abono, tipo_abono='NORMAL'):
+        from gestion_creditos import credit_services
+
+        clave = (Decimal(monto_abono), tipo_abono)
+        if clave not in self._planes:
+            self._planes[clave] = credit_services.calcular_plan_con_abono(
+                self.credito, monto_abono, tipo_abono, self.cuotas_pendientes
+            )
+        return self._planes[clave]
+
+    def ahorro_intereses(self, monto_abono, tipo_abono='NORMAL'):
+        ahorro = (
+            Decimal(str(self.plan_actual['total_intereses']))
+            - Decimal(str(self.plan_nuevo(monto_abono, tipo_abono)['total_intereses']))
+        )
+        return max(Decimal('0.00'), ahorro)
+
+    def analizar(self, monto_abono, tipo_abono='NORMAL'):
+        """
+        Analiza un abono al crédito y determina si requiere reestructuración.
+
+        Returns:
+            dict: Información sobre el abono y si requiere reestructuración
+        """
+        credito = self.credito
+        cuota_normal = credito.valor_cuota or Decimal('0.00')
+
+        # Determinar si requiere reestructuración
+        requiere_reestructuracion = (
+            tipo_abono == 'CAPITAL' or
+            monto_abono > (cuota_normal * 2)
+        )
+
+        plan_actual = self.plan_actual
+        plan_nuevo = self.plan_nuevo(monto_abono, tipo_abono)
+        ahorro = self.ahorro_intereses(monto_abono, tipo_abono)
+
+        nuevo_plazo = plan_nuevo['num_cuotas']
+        plazo_actual = plan_actual['num_cuotas']
+
+        # Calcular nueva cuota mensual (si cambió)
+        nueva_cuota = None
+        if tipo_abono == 'CAPITAL' and plan_nuevo['num_cuotas'] > 0:
+            nueva_cuota = Decimal(str(plan_nuevo['cuotas'][0]['cuota']))
+
+        resultado = {
+            'requiere_reestructuracion': requiere_reestructuracion,
+            'plan_actual': plan_actual,
+            'plan_nuevo': plan_nuevo,
+            'ahorro_intereses': float(ahorro),
+            'tipo_abono_calculado': tipo_abono,
+            'plazo_actual': plazo_actual,
+            'nuevo_plazo': nuevo_plazo,
+            'cuota_actual': float(cuota_normal),
+            'nueva_cuota': float(nueva_cuota) if nueva_cuota else float(cuota_normal),
+            'advertencia': None
+        }
+
+        if requiere_reestructuracion:
+            if tipo_abono == 'CAPITAL':
+                resultado['advertencia'] = (
+                    'Este abono a capital reducirá significativamente sus intereses, '
+                    'pero su cuota mensual cambiará. El plan de pagos será reestructurado.'
+                )
+            else:
+                resultado['advertencia'] = (
+                    f'Este abono de ${monto_abono:,.0f} cubre más de 2 cuotas. '
+                    f'Su plan de pagos será reestructurado, ahorrará ${ahorro:,.0f} en intereses '
+                    f'y su nuevo plazo será de {nuevo_plazo} cuotas.'
+                )
+
+        return resultado
+
+
+def _version_credito(credito):
+    version = credito.fecha_actualizacion.timestamp() if credito.fecha_actualizacion else 0
+    return f'{credito.id}:{version}:{credito.saldo_pendiente}'
+
+
+def _clave_analisis(credito, monto_abono, tipo_abono):
+    return f'abono:{_version_credito(credito)}:{tipo_abono}:{Decimal(monto_abono):.2f}'
+
+
+def analizar_abono_cacheado(credito, monto_abono, tipo_abono='NORMAL'):
+    """
+    Análisis del abono (`SimulacionAbono.analizar`) reutilizado desde el caché
+    mientras el crédito no cambie.
+    """
+    clave = _clave_analisis(credito, monto_abono, tipo_abono)
+    analisis = cache.get(clave)
+    if analisis is None:
+        analisis = SimulacionAbono(credito).analizar(monto_abono, tipo_abono)
+        cache.set(clave, analisis, timeout=SIMULACION_ABONO_CACHE_SECONDS)
+    return analisis
+
+
+def simular_abonos(credito, montos, tipo_abono):
+    """
+    Resúmenes (`SimulacionAbono.resumen`) de varios montos candidatos.
+
+    Cada resumen se cachea por versión del crédito, tipo y monto; las sumas
+    acumuladas de las cuotas pendientes se cachean por versión del crédito,
+    de modo que mover el deslizador no consulta la tabla de amortización.
+
+    Args:
+        montos (list[Decimal]): Montos a simular
+        tipo_abono (str): 'CAPITAL', o 'CUOTAS' para que cada monto se
+            simule como NORMAL (hasta 2 cuotas) o MAYOR
+
+    Returns:
+        dict: plan_actual y simulaciones (una por monto, en el mismo orden)
+    """
+    version = _version_credito(credito)
+    cuota_normal = credito.valor_cuota or Decimal('0.00')
+
+    claves = []
+    for monto in montos:
+        tipo = tipo_abono
+        if tipo_abono == 'CUOTAS':
+            tipo = 'MAYOR' if monto > cuota_normal * 2 else 'NORMAL'
+        claves.append((f'abono:sim:{version}:{tipo}:{monto:.2f}', monto, tipo))
+
+    clave_base = f'abono:sim:{version}:acumulados'
+    cacheados = cache.get_many([clave_base] + [clave for clave, _, _ in claves])
+    simulacion = SimulacionAbono(credito, acumulados=cacheados.get(clave_base))
+
+    nuevos = {}
+    for clave, monto, tipo in claves:
+        if clave not in cacheados and clave not in nuevos:
+            nuevos[clave] = simulacion.resumen(monto, tipo)
+    if clave_base not in cacheados:
+        nuevos[clave_base] = simulacion.acumulados
+    if nuevos:
+        cache.set_many(nuevos, timeout=SIMULACION_ABONO_CACHE_SECONDS)
+
+    resultados = {**cacheados, **nuevos}
+    return {
+        'plan_actual': simulacion.resumen_actual(),
+        'simulaciones': [resultados[clave] for clave, _, _ in claves],
+    }
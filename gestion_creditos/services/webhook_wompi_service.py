@@ -0,0 +1,238 @@
+"""
+Bandeja de entrada de los webhooks de WOMPI (`WompiWebhookEvent`).
+
+El endpoint del webhook solo verifica la firma, guarda el evento y responde
+200; nada de bloquear el crédito ni aplicar pagos dentro del request, que es
+lo que hacía lenta la respuesta y provocaba los reenvíos de WOMPI. La pareja
+(transaction_id, status) es única, así que un reenvío no crea otro evento.
+
+Un worker de Celery procesa los eventos en orden de llegada por crédito: en
+cada pasada reserva solo el evento más antiguo sin terminar de cada crédito
+(con `skip_locked` para que varios workers no tomen los mismos), de modo que
+dos eventos del mismo crédito nunca se aplican en desorden ni a la vez. Los
+pagos aprobados se aplican con `conciliacion_wompi_service.aplicar_pago_aprobado`,
+que es idempotente. Los fallos se reintentan con backoff exponencial.
+"""
+
+import hashlib
+import hmac
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from gestion_creditos.models import Credito, HistorialPago, WompiIntent, WompiWebhookEvent
+from gestion_creditos.services.conciliacion_wompi_service import aplicar_pago_aprobado, mapear_estado_wompi
+
+logger = logging.getLogger(__name__)
+
+EVENTO_TRANSACCION = 'transaction.updated'
+EVENTOS_POR_LOTE = 100
+MAX_LOTES_POR_EJECUCION = 20
+MAX_INTENTOS = 5
+RETRASO_BASE_SEGUNDOS = 30
+RETRASO_MAXIMO_SEGUNDOS = 3600
+# Tiempo que un evento tomado queda reservado; si el worker muere se retoma después
+RESERVA_PROCESO = timedelta(minutes=5)
+
+Estado = WompiWebhookEvent.Estado
+ESTADOS_SIN_TERMINAR = [Estado.PENDIENTE, Estado.PROCESANDO]
+
+
+def firma_valida(payload):
+    """
+    Verifica el checksum del evento. Según la documentación de Wompi:
+    checksum = SHA256(valores de `signature.properties` en orden + timestamp + events_secret)
+    """
+    signature_data = payload.get('signature', {})
+    received_checksum = signature_data.get('checksum', '')
+    transaction_data = payload.get('data', {}).get('transaction', {})
+
+    # Las propiedades tienen formato "transaction.id", "transaction.status", etc.
+    concat_values = ''.join(
+        str(transaction_data.get(prop.replace('transaction.', ''), ''))
+        for prop in signature_data.get('properties', [])
+    )
+    events_secret = getattr(settings, 'WOMPI_EVENTS_SECRET', '')
+    string_to_hash = f"{concat_values}{payload.get('timestamp', '')}{events_secret}"
+    expected_checksum = hashlib.sha256(string_to_hash.encode('utf-8')).hexdigest()
+
+    if not hmac.compare_digest(str(received_checksum), expected_checksum):
+        logger.warning(f"Firma inválida en webhook de WOMPI. Esperada: {expected_checksum}, Recibida: {received_checksum}")
+        return False
+    return True
+
+
+def _resolver_credito_id(transaction_id, referencia):
+    """Crédito del evento, para ordenar su proceso. None si no se reconoce."""
+    intentos = WompiIntent.objects.order_by('-created_at').values_list('credito_id', flat=True)
+    credito_id = intentos.filter(wompi_transaction_id=transaction_id).first()
+    if credito_id is None and referencia:
+        credito_id = intentos.filter(referencia=referencia).first()
+    if credito_id is None and referencia.startswith('CUOTA-'):
+        # Referencia de pago de cuota sin intento: CUOTA-{credito_id}-{timestamp}
+        partes = referencia.split('-')
+        if len(partes) > 1 and partes[1].isdigit():
+            credito_id = Credito.objects.filter(id=int(partes[1])).values_list('id', flat=True).first()
+    return credito_id
+
+
+def registrar_evento(payload):
+    """
+    Guarda el evento de transacción del webhook (ya verificado) y programa
+    su proceso al confirmar la transacción. Los demás eventos se ignoran.
+
+    Returns:
+        tuple[WompiWebhookEvent | None, bool]: El evento y si se creó en este llamado
+    """
+    if payload.get('event') != EVENTO_TRANSACCION:
+        return None, False
+
+    transaction_data = payload.get('data', {}).get('transaction', {})
+    transaction_id = transaction_data.get('id')
+    if not transaction_id:
+        return None, False
+
+    status = str(transaction_data.get('status') or '').upper()
+    referencia = transaction_data.get('reference') or ''
+    evento, creado = WompiWebhookEvent.objects.get_or_create(
+        transaction_id=transaction_id,
+        status=status,
+        defaults={
+            'referencia': referencia[:100],
+            'credito_id': _resolver_credito_id(transaction_id, referencia),
+            'payload': payload,
+            'proximo_intento': timezone.now(),
+        }
+    )
+    if creado:
+        transaction.on_commit(_programar_proceso)
+    else:
+        logger.info(f"Evento Wompi {transaction_id} ({status}) repetido, se ignora.")
+    return evento, creado
+
+
+def _programar_proceso():
+    from gestion_creditos.tasks import procesar_webhooks_wompi_task
+
+    try:
+        procesar_webhooks_wompi_task.delay()
+    except Exception as e:
+        # La tarea periódica los tomará en el siguiente ciclo
+        logger.error(f"No se pudo programar el proceso de webhooks de Wompi: {e}")
+
+
+def _aplicar_pago_sin_intento(evento, transaction_data):
+    """Pago de cuota aprobado cuya referencia no tiene `WompiIntent` (flujo anterior)."""
+    from gestion_creditos import credit_services
+
+    monto = Decimal(transaction_data.get('amount_in_cents') or 0) / 100
+    with transaction.atomic():
+        credito = Credito.objects.select_for_update().get(id=evento.credito_id)
+        pago, created = HistorialPago.objects.get_or_create(
+            referencia_pago=evento.referencia,
+            defaults={
+                'credito': credito,
+                'monto': monto,
+                'estado': HistorialPago.EstadoPago.EXITOSO,
+            }
+        )
+        if created:
+            credit_services.actualizar_saldo_tras_pago(credito, monto, pago=pago)
+            logger.info(f"Pago de ${monto} registrado para crédito {credito.id} desde el webhook")
+
+
+def procesar_evento(evento):
+    """
+    Aplica un evento: un pago aprobado se registra una sola vez; cualquier
+    otro estado se anota en el intento y adelanta su conciliación.
+    """
+    transaction_data = (evento.payload or {}).get('data', {}).get('transaction', {})
+    estado = mapear_estado_wompi(evento.status)
+
+    intent = WompiIntent.objects.filter(wompi_transaction_id=evento.transaction_id).order_by('-created_at').first()
+    if intent is None and evento.referencia:
+        intent = WompiIntent.objects.filter(referencia=evento.referencia).order_by('-created_at').first()
+
+    if intent is not None:
+        if estado == WompiIntent.Estado.APPROVED:
+            aplicar_pago_aprobado(intent.id, transaction_data)
+        else:
+            # El worker de conciliación confirma el estado con Wompi en su próxima pasada
+            WompiIntent.objects.filter(id=intent.id, aplicado_en__isnull=True).update(
+                status=estado,
+                wompi_transaction_id=evento.transaction_id,
+                proxima_consulta=timezone.now(),
+                updated_at=timezone.now(),
+            )
+    elif estado == WompiIntent.Estado.APPROVED and evento.referencia.startswith('CUOTA-') and evento.credito_id:
+        _aplicar_pago_sin_intento(evento, transaction_data)
+    else:
+        logger.warning(f"Evento Wompi {evento.transaction_id} ({evento.status}) sin intento ni crédito asociado.")
+
+
+def _reservar_lote(limite):
+    """Toma el evento más antiguo sin terminar de cada crédito."""
+    ahora = timezone.now()
+    anteriores = WompiWebhookEvent.objects.filter(
+        credito_id=OuterRef('credito_id'), estado__in=ESTADOS_SIN_TERMINAR, id__lt=OuterRef('id')
+    )
+    with transaction.atomic():
+        ids = list(
+            WompiWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(estado__in=ESTADOS_SIN_TERMINAR, proximo_intento__lte=ahora)
+            .exclude(Exists(anteriores))
+            .order_by('id')
+            .values_list('id', flat=True)[:limite]
+        )
+        if ids:
+            WompiWebhookEvent.objects.filter(id__in=ids).update(
+                estado=Estado.PROCESANDO,
+                proximo_intento=ahora + RESERVA_PROCESO,
+                intentos=F('intentos') + 1,
+            )
+    return ids
+
+
+def _registrar_fallo(evento, error, ahora):
+    evento.ultimo_error = str(error)[:2000]
+    if evento.intentos >= MAX_INTENTOS:
+        evento.estado = Estado.FALLIDO
+        logger.error(f"Evento Wompi {evento.id} descartado tras {evento.intentos} intentos: {error}")
+        return
+    retraso = min(RETRASO_BASE_SEGUNDOS * 2 ** (evento.intentos - 1), RETRASO_MAXIMO_SEGUNDOS)
+    evento.estado = Estado.PENDIENTE
+    evento.proximo_intento = ahora + timedelta(seconds=retraso)
+    logger.warning(f"Evento Wompi {evento.id} falló (intento {evento.intentos}), reintento en {retraso}s: {error}")
+
+
+def procesar_eventos_pendientes(limite=EVENTOS_POR_LOTE, max_lotes=MAX_LOTES_POR_EJECUCION):
+    """
+    Procesa los eventos pendientes cuyo turno ya llegó, en orden por crédito.
+
+    Returns:
+        dict: procesados y fallidos
+    """
+    procesados = fallidos = 0
+    for _ in range(max_lotes):
+        ids = _reservar_lote(limite)
+        if not ids:
+            break
+        for evento in WompiWebhookEvent.objects.filter(id__in=ids).order_by('id'):
+            try:
+                procesar_evento(evento)
+            except Exception as e:
+                logger.exception(f"Error procesando el evento Wompi {evento.id}")
+                _registrar_fallo(evento, e, timezone.now())
+                fallidos += 1
+            else:
+                evento.estado = Estado.PROCESADO
+                evento.procesado_en = timezone.now()
+                evento.ultimo_error = ''
+                procesados += 1
+            evento.save(update_fields=['estado', 'proximo_intento', 'procesado_en', 'ultimo_error'])
+    return {'procesados': procesados, 'fallidos': fallidos}
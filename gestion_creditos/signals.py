@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import Credito, CreditoEmprendimiento, CreditoLibranza
+from .services.busqueda_service import actualizar_documentos_busqueda
+from .services.kpi_cache_service import METRICAS_POR_EVENTO, invalidar_kpis
+
+
+# Se envían desde credit_services cuando cambia el estado o el saldo de uno o
+# varios créditos. Argumento: credito_ids (list[int]).
+estado_credito_cambiado = Signal()
+saldo_credito_actualizado = Signal()
+
+
+@receiver(estado_credito_cambiado)
+def invalidar_kpis_por_estado(sender, credito_ids=None, **kwargs):
+    transaction.on_commit(lambda: invalidar_kpis(*METRICAS_POR_EVENTO['estado']))
+
+
+@receiver(saldo_credito_actualizado)
+def invalidar_kpis_por_saldo(sender, credito_ids=None, **kwargs):
+    transaction.on_commit(lambda: invalidar_kpis(*METRICAS_POR_EVENTO['saldo']))
+
+
+# Documento de búsqueda (Credito.texto_busqueda): se recalcula cuando cambian
+# los datos que lo componen. El número de crédito se asigna al crearlo.
+@receiver(post_save, sender=Credito)
+def actualizar_busqueda_credito(sender, instance, created, **kwargs):
+    if created:
+        actualizar_documentos_busqueda([instance.id])
+
+
+@receiver(post_save, sender=CreditoLibranza)
+@receiver(post_save, sender=CreditoEmprendimiento)
+def actualizar_busqueda_detalle(sender, instance, **kwargs):
+    actualizar_documentos_busqueda([instance.credito_id])
+
+
+@receiver(post_save, sender=User)
+def actualizar_busqueda_usuario(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not {'username', 'email'} & set(update_fields)):
+        return
+    actualizar_documentos_busqueda(list(instance.creditos.values_list('id', flat=True)))
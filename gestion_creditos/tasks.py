@@ -9,18 +9,81 @@ Este módulo contiene todas las tareas que se ejecutan de forma automática:
 """
 import logging
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
-from .models import Credito
-from .credit_services import marcar_creditos_en_mora, gestionar_cambio_estado_credito
+from datetime import date, timedelta
+from .models import Credito, ReglaNotificacionCredito
+from .credit_services import (
+    marcar_creditos_en_mora,
+    actualizar_mora_creditos,
+    gestionar_cambio_estado_credito,
+    MOTIVO_ENTRADA_MORA,
+)
+from .services.cartera_service import generar_snapshot_cartera
+from .services.correo_saliente_service import despachar_correos_pendientes
+from .services.conciliacion_wompi_service import conciliar_intentos_pendientes
+from .services.webhook_wompi_service import procesar_eventos_pendientes
+from .services import notificacion_programada_service
 from .email_service import (
-    enviar_recordatorio_pago,
-    enviar_alerta_mora,
+    construir_alerta_mora,
+    construir_email_cambio_estado,
+    construir_recordatorio_pago,
+    enviar_emails_en_lote,
     enviar_notificacion_cambio_estado
 )
 
 logger = logging.getLogger(__name__)
 
+# Créditos por tarea de envío masivo (cada tarea usa una conexión SMTP)
+CORREOS_MASIVOS_POR_LOTE = 200
+# Límite de tareas de envío masivo por minuto y worker, para no exceder la cuota de Gmail
+CORREOS_MASIVOS_RATE_LIMIT = getattr(settings, 'CORREOS_MASIVOS_RATE_LIMIT', '10/m')
+
+
+def _en_bloques(ids, tamano=CORREOS_MASIVOS_POR_LOTE):
+    for inicio in range(0, len(ids), tamano):
+        yield ids[inicio:inicio + tamano]
+
+
+def _creditos_para_correo(credito_ids):
+    return Credito.objects.select_related(
+        'usuario', 'detalle_libranza', 'detalle_emprendimiento'
+    ).filter(id__in=credito_ids).order_by('id')
+
+
+def _enviar_correos_creditos(creditos, construir, descripcion):
+    """
+    Arma el email de cada crédito con `construir(credito)` y los envía todos
+    por una misma conexión SMTP.
+
+    Returns:
+        list[Credito]: Créditos cuyo email se envió
+    """
+    mensajes, destinos = [], []
+    for credito in creditos:
+        try:
+            mensaje = construir(credito)
+        except Exception as e:
+            logger.error(f"Error al preparar {descripcion} para crédito {credito.numero_credito}: {e}")
+            continue
+        if mensaje is not None:
+            mensajes.append(mensaje)
+            destinos.append(credito)
+
+    enviados = []
+    for credito, error in zip(destinos, enviar_emails_en_lote(mensajes)):
+        if error is None:
+            enviados.append(credito)
+        else:
+            logger.error(f"Error al enviar {descripcion} para crédito {credito.numero_credito}: {error}")
+    return enviados
+
+
+CONSTRUCTORES_NOTIFICACION = {
+    ReglaNotificacionCredito.TipoNotificacion.RECORDATORIO_PAGO: construir_recordatorio_pago,
+    ReglaNotificacionCredito.TipoNotificacion.ALERTA_MORA: construir_alerta_mora,
+}
+
 
 @shared_task(name='gestion_creditos.tasks.marcar_creditos_en_mora_task')
 def marcar_creditos_en_mora_task():
@@ -28,7 +91,8 @@ def marcar_creditos_en_mora_task():
     Tarea programada que marca automáticamente los créditos en mora.
 
     Se ejecuta diariamente a las 6:00 AM (configurado en celery.py).
-    Busca créditos activos con fecha de pago vencida y los marca como EN_MORA.
+    Busca créditos activos con fecha de pago vencida y los marca como EN_MORA,
+    y recalcula el monto vencido y los días de mora de la cartera.
 
     Returns:
         dict: Resultados de la ejecución con cantidad de créditos actualizados
@@ -37,14 +101,18 @@ def marcar_creditos_en_mora_task():
 
     try:
         creditos_actualizados = marcar_creditos_en_mora()
+        # Recalcula monto_vencido/dias_mora de toda la cartera para el día
+        creditos_mora_recalculada = actualizar_mora_creditos()
 
         logger.info(
-            f"Tarea completada: {creditos_actualizados} créditos marcados en mora"
+            f"Tarea completada: {creditos_actualizados} créditos marcados en mora, "
+            f"{creditos_mora_recalculada} con mora recalculada"
         )
 
         return {
             'status': 'success',
             'creditos_actualizados': creditos_actualizados,
+            'creditos_mora_recalculada': creditos_mora_recalculada,
             'timestamp': timezone.now().isoformat()
         }
 
@@ -57,60 +125,48 @@ def marcar_creditos_en_mora_task():
         }
 
 
-@shared_task(name='gestion_creditos.tasks.enviar_recordatorios_pago_task')
-def enviar_recordatorios_pago_task():
+@shared_task(name='gestion_creditos.tasks.programar_notificaciones_credito_task')
+def programar_notificaciones_credito_task():
     """
-    Tarea programada que envía recordatorios de pago a clientes.
+    Tarea programada que reparte los recordatorios de pago y alertas de mora
+    del día.
 
-    Se ejecuta diariamente a las 8:00 AM (configurado en celery.py).
-    Envía recordatorios a clientes cuya cuota vence en 3 o 7 días.
+    Se ejecuta diariamente a las 8:00 AM (configurado en celery.py). Los días
+    de aviso salen de `ReglaNotificacionCredito` (por defecto: recordatorio 7
+    y 3 días antes; alerta de mora el día 1, 7, 15, 30 y luego cada 30). Una
+    sola consulta trae todos los créditos que aún no tienen el aviso
+    registrado y el envío se reparte en bloques de `CORREOS_MASIVOS_POR_LOTE`
+    entre los workers (`enviar_lote_notificaciones_task`).
 
     Returns:
-        dict: Resultados con cantidad de recordatorios enviados
+        dict: Resultados con cantidad de avisos programados por tipo
     """
-    logger.info("Iniciando tarea: Enviar recordatorios de pago")
+    logger.info("Iniciando tarea: Programar recordatorios y alertas de mora")
 
     try:
         hoy = timezone.now().date()
-        recordatorios_enviados = 0
-
-        # Definir días de anticipación para enviar recordatorios
-        dias_recordatorio = [3, 7]  # Recordar 7 días antes y 3 días antes
-
-        for dias in dias_recordatorio:
-            fecha_objetivo = hoy + timedelta(days=dias)
-
-            # Buscar créditos activos que vencen en esa fecha
-            creditos = Credito.objects.filter(
-                estado=Credito.EstadoCredito.ACTIVO,
-                fecha_proximo_pago=fecha_objetivo
-            ).select_related('usuario')
-
-            for credito in creditos:
-                try:
-                    exito = enviar_recordatorio_pago(credito, dias)
-                    if exito:
-                        recordatorios_enviados += 1
-                        logger.info(
-                            f"Recordatorio enviado a {credito.usuario.email} "
-                            f"para crédito {credito.numero_credito} ({dias} días)"
-                        )
-                except Exception as e:
-                    logger.error(
-                        f"Error al enviar recordatorio para crédito "
-                        f"{credito.numero_credito}: {e}"
-                    )
-
-        logger.info(f"Tarea completada: {recordatorios_enviados} recordatorios enviados")
+        pendientes = notificacion_programada_service.seleccionar_notificaciones_pendientes(hoy)
+
+        programados = {tipo: 0 for tipo in CONSTRUCTORES_NOTIFICACION}
+        lotes = 0
+        for (tipo, dias), credito_ids in pendientes.items():
+            for bloque in _en_bloques(credito_ids):
+                enviar_lote_notificaciones_task.delay(tipo, dias, bloque, hoy.isoformat())
+                lotes += 1
+            programados[tipo] += len(credito_ids)
+
+        logger.info(f"Tarea completada: avisos programados {programados} en {lotes} lotes")
 
         return {
             'status': 'success',
-            'recordatorios_enviados': recordatorios_enviados,
+            'recordatorios_programados': programados[ReglaNotificacionCredito.TipoNotificacion.RECORDATORIO_PAGO],
+            'alertas_programadas': programados[ReglaNotificacionCredito.TipoNotificacion.ALERTA_MORA],
+            'lotes': lotes,
             'timestamp': timezone.now().isoformat()
         }
 
     except Exception as e:
-        logger.error(f"Error en tarea enviar_recordatorios_pago_task: {e}")
+        logger.error(f"Error en tarea programar_notificaciones_credito_task: {e}")
         return {
             'status': 'error',
             'error': str(e),
@@ -118,63 +174,61 @@ def enviar_recordatorios_pago_task():
         }
 
 
-@shared_task(name='gestion_creditos.tasks.enviar_alertas_mora_task')
-def enviar_alertas_mora_task():
+@shared_task(
+    name='gestion_creditos.tasks.enviar_lote_notificaciones_task',
+    rate_limit=CORREOS_MASIVOS_RATE_LIMIT,
+)
+def enviar_lote_notificaciones_task(tipo, dias, credito_ids, fecha_programada):
     """
-    Tarea programada que envía alertas a clientes con créditos en mora.
+    Envía un recordatorio de pago o alerta de mora a un bloque de créditos por
+    una sola conexión SMTP y los registra como enviados.
 
-    Se ejecuta diariamente a las 9:00 AM (configurado en celery.py).
-    Envía alertas escalonadas según los días de mora (1, 7, 15, 30 días).
+    Args:
+        tipo (str): ReglaNotificacionCredito.TipoNotificacion
+        dias (int): Días antes del vencimiento o días en mora
+        credito_ids (list[int]): IDs de los créditos del bloque
+        fecha_programada (str): Fecha ISO del día de la programación
 
     Returns:
-        dict: Resultados con cantidad de alertas enviadas
+        dict: Resultado de la ejecución con cantidad de avisos enviados
     """
-    logger.info("Iniciando tarea: Enviar alertas de mora")
+    fecha = date.fromisoformat(fecha_programada)
+    creditos = notificacion_programada_service.creditos_por_notificar(tipo, dias, credito_ids, fecha)
+    construir = CONSTRUCTORES_NOTIFICACION[tipo]
 
-    try:
-        alertas_enviadas = 0
+    enviados = _enviar_correos_creditos(
+        creditos,
+        lambda credito: construir(credito, dias),
+        ReglaNotificacionCredito.TipoNotificacion(tipo).label.lower(),
+    )
+    notificacion_programada_service.registrar_notificaciones_enviadas(tipo, dias, enviados, fecha)
 
-        # Buscar todos los créditos en mora
-        creditos_mora = Credito.objects.filter(
-            estado=Credito.EstadoCredito.EN_MORA
-        ).select_related('usuario')
-
-        for credito in creditos_mora:
-            try:
-                dias_mora = credito.dias_en_mora
-
-                # Enviar alerta solo en días específicos para no saturar al cliente
-                # Alertas en: día 1, 7, 15, 30 y luego cada 30 días
-                if dias_mora in [1, 7, 15, 30] or (dias_mora > 30 and dias_mora % 30 == 0):
-                    exito = enviar_alerta_mora(credito, dias_mora)
-                    if exito:
-                        alertas_enviadas += 1
-                        logger.info(
-                            f"Alerta de mora enviada a {credito.usuario.email} "
-                            f"para crédito {credito.numero_credito} ({dias_mora} días)"
-                        )
-
-            except Exception as e:
-                logger.error(
-                    f"Error al enviar alerta de mora para crédito "
-                    f"{credito.numero_credito}: {e}"
-                )
-
-        logger.info(f"Tarea completada: {alertas_enviadas} alertas de mora enviadas")
+    logger.info(f"{ReglaNotificacionCredito.TipoNotificacion(tipo).label} ({dias} días) enviados: {len(enviados)}/{len(credito_ids)}")
+    return {
+        'status': 'success',
+        'notificaciones_enviadas': len(enviados),
+        'timestamp': timezone.now().isoformat()
+    }
 
-        return {
-            'status': 'success',
-            'alertas_enviadas': alertas_enviadas,
-            'timestamp': timezone.now().isoformat()
-        }
 
-    except Exception as e:
-        logger.error(f"Error en tarea enviar_alertas_mora_task: {e}")
-        return {
-            'status': 'error',
-            'error': str(e),
-            'timestamp': timezone.now().isoformat()
-        }
+@shared_task(name='gestion_creditos.tasks.enviar_recordatorios_pago_task')
+def enviar_recordatorios_pago_task():
+    """
+    Alias de `programar_notificaciones_credito_task`, conservado solo para los
+    mensajes que ya estaban en la cola al desplegar; ya no tiene tarea
+    periódica propia (migración 0028).
+    """
+    return programar_notificaciones_credito_task()
+
+
+@shared_task(name='gestion_creditos.tasks.enviar_alertas_mora_task')
+def enviar_alertas_mora_task():
+    """
+    Alias de `programar_notificaciones_credito_task`, conservado solo para los
+    mensajes que ya estaban en la cola al desplegar; ya no tiene tarea
+    periódica propia (migración 0028).
+    """
+    return programar_notificaciones_credito_task()
 
 
 @shared_task(name='gestion_creditos.tasks.enviar_notificacion_cambio_estado_async')
@@ -217,6 +271,137 @@ def enviar_notificacion_cambio_estado_async(credito_id, nuevo_estado, motivo="")
         return {'status': 'error', 'error': str(e)}
 
 
+@shared_task(name='gestion_creditos.tasks.despachar_correos_task')
+def despachar_correos_task():
+    """
+    Envía los correos pendientes de la bandeja de salida (`CorreoSaliente`).
+
+    Se programa al confirmar cada transacción que registra correos y además
+    corre cada minuto (configurado en celery.py) para los reintentos.
+
+    Returns:
+        dict: Resultado de la ejecución con cantidad de correos enviados
+    """
+    resultado = despachar_correos_pendientes()
+    if resultado['procesados']:
+        logger.info(
+            f"Correos despachados: {resultado['enviados']}/{resultado['procesados']}"
+        )
+    return {
+        'status': 'success',
+        'correos_enviados': resultado['enviados'],
+        'correos_procesados': resultado['procesados'],
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@shared_task(name='gestion_creditos.tasks.conciliar_pagos_wompi_task')
+def conciliar_pagos_wompi_task(intent_id=None):
+    """
+    Consulta en Wompi los intentos de pago pendientes y aplica los aprobados.
+
+    Corre cada 15 segundos (configurado en celery.py). Con `intent_id` concilia
+    ese intento de inmediato; lo pide el callback de pago al volver de Wompi.
+
+    Returns:
+        dict: Resultado de la ejecución con intentos por estado
+    """
+    resumen = conciliar_intentos_pendientes(intent_id=intent_id)
+    if resumen:
+        logger.info(f"Intentos Wompi conciliados: {resumen}")
+    return {
+        'status': 'success',
+        'intentos_por_estado': resumen,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@shared_task(name='gestion_creditos.tasks.procesar_webhooks_wompi_task')
+def procesar_webhooks_wompi_task():
+    """
+    Procesa los eventos de la bandeja de entrada de webhooks de Wompi
+    (`WompiWebhookEvent`), en orden por crédito.
+
+    Se programa al recibir cada evento y además corre cada 15 segundos
+    (configurado en celery.py) para los reintentos.
+
+    Returns:
+        dict: Resultado de la ejecución con eventos procesados y fallidos
+    """
+    resultado = procesar_eventos_pendientes()
+    if resultado['procesados'] or resultado['fallidos']:
+        logger.info(
+            f"Webhooks Wompi procesados: {resultado['procesados']}, fallidos: {resultado['fallidos']}"
+        )
+    return {
+        'status': 'success',
+        'eventos_procesados': resultado['procesados'],
+        'eventos_fallidos': resultado['fallidos'],
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@shared_task(
+    name='gestion_creditos.tasks.enviar_notificaciones_mora_task',
+    rate_limit=CORREOS_MASIVOS_RATE_LIMIT,
+)
+def enviar_notificaciones_mora_task(credito_ids):
+    """
+    Envía el aviso de entrada en mora a un bloque de créditos marcados por
+    `marcar_creditos_en_mora`, por una sola conexión SMTP.
+
+    Args:
+        credito_ids (list[int]): IDs de los créditos que pasaron a EN_MORA
+
+    Returns:
+        dict: Resultado de la ejecución con cantidad de correos enviados
+    """
+    enviados = len(_enviar_correos_creditos(
+        _creditos_para_correo(credito_ids),
+        lambda credito: construir_email_cambio_estado(
+            credito, Credito.EstadoCredito.EN_MORA, MOTIVO_ENTRADA_MORA
+        ),
+        'aviso de mora',
+    ))
+
+    logger.info(f"Avisos de mora enviados: {enviados}/{len(credito_ids)}")
+    return {
+        'status': 'success',
+        'notificaciones_enviadas': enviados,
+        'timestamp': timezone.now().isoformat()
+    }
+
+
+@shared_task(name='gestion_creditos.tasks.generar_snapshot_cartera_task')
+def generar_snapshot_cartera_task():
+    """
+    Tarea programada que guarda la foto de cartera del mes en curso.
+
+    Se ejecuta diariamente a las 11:50 PM (configurado en celery.py), así la
+    última ejecución de cada mes deja el cierre de ese mes.
+
+    Returns:
+        dict: Resultado de la ejecución con las líneas actualizadas
+    """
+    logger.info("Iniciando tarea: Generar snapshot de cartera")
+
+    try:
+        snapshots = generar_snapshot_cartera()
+        return {
+            'status': 'success',
+            'mes': snapshots[0].mes.isoformat() if snapshots else None,
+            'lineas': [s.linea for s in snapshots],
+            'timestamp': timezone.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error en tarea generar_snapshot_cartera_task: {e}")
+        return {
+            'status': 'error',
+            'error': str(e),
+            'timestamp': timezone.now().isoformat()
+        }
+
+
 @shared_task(name='gestion_creditos.tasks.generar_reporte_cartera_mensual')
 def generar_reporte_cartera_mensual():
     """
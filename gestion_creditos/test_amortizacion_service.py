@@ -0,0 +1,50 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from gestion_creditos.services.amortizacion_service import (
+    calcular_cuota_fija,
+    generar_tabla_amortizacion,
+    generar_tablas_amortizacion,
+)
+
+
+class AmortizacionServiceTests(SimpleTestCase):
+    def test_cuota_fija_amortizacion_francesa(self):
+        self.assertEqual(
+            calcular_cuota_fija(Decimal('1119000'), Decimal('0.019'), 12),
+            Decimal('105163.43'),
+        )
+
+    def test_cuota_fija_sin_interes_divide_el_capital(self):
+        self.assertEqual(calcular_cuota_fija(Decimal('1200'), Decimal('0'), 12), Decimal('100.00'))
+
+    def test_tabla_cuadra_capital_y_saldo_final(self):
+        tabla = generar_tabla_amortizacion(
+            capital=Decimal('1119000'),
+            tasa_mensual=Decimal('0.019'),
+            plazo=12,
+            fecha_primera_cuota=date(2026, 1, 31),
+        )
+        cuotas = tabla['cuotas']
+
+        self.assertEqual(len(cuotas), 12)
+        self.assertEqual(sum(c['capital'] for c in cuotas), Decimal('1119000.00'))
+        self.assertEqual(cuotas[-1]['saldo_pendiente'], Decimal('0.00'))
+        self.assertEqual(cuotas[0]['interes'], Decimal('21261.00'))
+        self.assertEqual(cuotas[1]['fecha_vencimiento'], date(2026, 2, 28))
+        self.assertEqual(tabla['total_pagar'], tabla['total_capital'] + tabla['total_intereses'])
+
+    def test_lote_respeta_orden_y_plazos_distintos(self):
+        tablas = generar_tablas_amortizacion([
+            {'capital': Decimal('500000'), 'tasa_mensual': Decimal('0.035'), 'plazo': 6},
+            {'capital': Decimal('2000000'), 'tasa_mensual': Decimal('0.019'), 'plazo': 24, 'numero_inicial': 5},
+            {'capital': Decimal('0'), 'tasa_mensual': Decimal('0.019'), 'plazo': 0},
+        ])
+
+        self.assertEqual([len(t['cuotas']) for t in tablas], [6, 24, 0])
+        self.assertEqual(tablas[1]['cuotas'][0]['numero'], 5)
+        for tabla, capital in zip(tablas[:2], [Decimal('500000'), Decimal('2000000')]):
+            self.assertEqual(tabla['total_capital'], capital)
+            self.assertEqual(tabla['cuotas'][-1]['saldo_pendiente'], Decimal('0.00'))
@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from gestion_creditos.models import Credito, CreditoLibranza, Empresa
+from gestion_creditos.services.busqueda_service import buscar_creditos, normalizar_texto_busqueda
+
+
+class BusquedaCreditosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='jperez', email='jperez@example.com', password='123')
+        cls.credito = Credito.objects.create(
+            usuario=cls.user,
+            linea=Credito.LineaCredito.LIBRANZA,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+        )
+        CreditoLibranza.objects.create(
+            credito=cls.credito,
+            nombres='José Ángel',
+            apellidos='Pérez Núñez',
+            cedula='1032456789',
+            direccion='Calle 1',
+            telefono='3000000000',
+            correo_electronico='jose@example.com',
+            empresa=Empresa.objects.create(nombre='Empresa Búsqueda'),
+        )
+        otro = User.objects.create_user(username='otro', password='123')
+        Credito.objects.create(
+            usuario=otro,
+            linea=Credito.LineaCredito.EMPRENDIMIENTO,
+            monto_solicitado=Decimal('1000'),
+            plazo_solicitado=12,
+        )
+
+    def _ids(self, texto):
+        return list(buscar_creditos(Credito.objects.all(), texto).values_list('id', flat=True))
+
+    def test_normaliza_tildes_mayusculas_y_espacios(self):
+        self.assertEqual(normalizar_texto_busqueda('  JOSÉ   Ángel '), 'jose angel')
+
+    def test_busca_por_nombre_cedula_numero_y_usuario(self):
+        self.credito.refresh_from_db()
+        for texto in ('jose angel', 'PEREZ', 'núñez', '324567', self.credito.numero_credito, 'JPEREZ@EXAMPLE'):
+            self.assertEqual(self._ids(texto), [self.credito.id], texto)
+        self.assertEqual(len(self._ids('')), 2)
+
+    def test_documento_sigue_cambios_de_usuario(self):
+        self.user.email = 'nuevo.correo@example.com'
+        self.user.save()
+
+        self.assertEqual(self._ids('nuevo.correo'), [self.credito.id])
+        self.assertEqual(self._ids('jperez@example'), [])
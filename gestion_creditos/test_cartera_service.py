@@ -0,0 +1,89 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from gestion_creditos.models import CarteraSnapshot, Credito, CuotaAmortizacion
+from gestion_creditos.services.cartera_service import (
+    generar_snapshot_cartera,
+    obtener_serie_cartera,
+    reconstruir_snapshots_cartera,
+)
+
+
+class CarteraSnapshotTests(TestCase):
+    def _crear_credito(self, linea, estado, saldo):
+        user = User.objects.create_user(username=f'cartera_{User.objects.count()}', password='123')
+        return Credito.objects.create(
+            usuario=user,
+            linea=linea,
+            estado=estado,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+            saldo_pendiente=saldo,
+        )
+
+    def test_snapshot_agrega_por_linea_y_es_idempotente(self):
+        self._crear_credito(Credito.LineaCredito.LIBRANZA, Credito.EstadoCredito.ACTIVO, Decimal('300'))
+        self._crear_credito(Credito.LineaCredito.LIBRANZA, Credito.EstadoCredito.EN_MORA, Decimal('200'))
+        self._crear_credito(Credito.LineaCredito.EMPRENDIMIENTO, Credito.EstadoCredito.PAGADO, Decimal('0'))
+
+        generar_snapshot_cartera(date(2026, 3, 15))
+        generar_snapshot_cartera(date(2026, 3, 16))
+
+        self.assertEqual(CarteraSnapshot.objects.count(), 2)
+        libranza = CarteraSnapshot.objects.get(linea=Credito.LineaCredito.LIBRANZA)
+        self.assertEqual(libranza.mes, date(2026, 3, 1))
+        self.assertEqual(libranza.fecha_corte, date(2026, 3, 16))
+        self.assertEqual(libranza.saldo_cartera, Decimal('500'))
+        self.assertEqual((libranza.creditos_vigentes, libranza.creditos_en_mora), (2, 1))
+        self.assertEqual(libranza.saldo_en_mora, Decimal('200'))
+
+    def test_serie_lee_fotos_en_una_consulta(self):
+        CarteraSnapshot.objects.create(
+            mes=date(2026, 2, 1), linea=Credito.LineaCredito.LIBRANZA,
+            saldo_cartera=Decimal('1000'), fecha_corte=date(2026, 2, 28),
+        )
+
+        with self.assertNumQueries(1):
+            serie = obtener_serie_cartera(meses=3, hoy=date(2026, 3, 10))
+
+        self.assertEqual(serie['labels'], ['Jan 2026', 'Feb 2026', 'Mar 2026'])
+        self.assertEqual(serie['libranza'], [0.0, 1000.0, 0.0])
+        self.assertEqual(serie['total'], [0.0, 1000.0, 0.0])
+
+    def test_reconstruye_meses_anteriores_desde_la_tabla(self):
+        credito = self._crear_credito(Credito.LineaCredito.LIBRANZA, Credito.EstadoCredito.ACTIVO, Decimal('200'))
+        Credito.objects.filter(pk=credito.pk).update(
+            monto_aprobado=Decimal('300'),
+            fecha_desembolso=timezone.make_aware(datetime(2026, 1, 10)),
+        )
+        for numero, vencimiento in enumerate((date(2026, 2, 10), date(2026, 3, 10), date(2026, 4, 10)), start=1):
+            CuotaAmortizacion.objects.create(
+                credito=credito, numero_cuota=numero, fecha_vencimiento=vencimiento,
+                capital_a_pagar=Decimal('100'), interes_a_pagar=Decimal('10'), valor_cuota=Decimal('110'),
+                saldo_capital_pendiente=Decimal(300 - 100 * numero),
+                pagada=numero == 1,
+                fecha_pago=timezone.make_aware(datetime(2026, 2, 9)) if numero == 1 else None,
+            )
+        CarteraSnapshot.objects.create(
+            mes=date(2026, 2, 1), linea=Credito.LineaCredito.LIBRANZA,
+            saldo_cartera=Decimal('999'), fecha_corte=date(2026, 2, 28),
+        )
+
+        reconstruir_snapshots_cartera(meses=3, hoy=date(2026, 4, 15))
+
+        fotos = {
+            foto.mes: foto for foto in CarteraSnapshot.objects.filter(linea=Credito.LineaCredito.LIBRANZA)
+        }
+        self.assertEqual(sorted(fotos), [date(2026, 1, 1), date(2026, 2, 1), date(2026, 3, 1)])
+        enero, marzo = fotos[date(2026, 1, 1)], fotos[date(2026, 3, 1)]
+        self.assertEqual((enero.saldo_cartera, enero.creditos_en_mora), (Decimal('300'), 0))
+        self.assertEqual((enero.creditos_desembolsados, enero.monto_desembolsado), (1, Decimal('300')))
+        self.assertEqual(enero.fecha_corte, date(2026, 1, 31))
+        # El mes con foto de la tarea nocturna no se toca
+        self.assertEqual(fotos[date(2026, 2, 1)].saldo_cartera, Decimal('999'))
+        self.assertEqual((marzo.saldo_cartera, marzo.creditos_en_mora), (Decimal('200'), 1))
+        self.assertEqual((marzo.saldo_en_mora, marzo.monto_vencido), (Decimal('200'), Decimal('110')))
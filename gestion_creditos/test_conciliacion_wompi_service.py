@@ -0,0 +1,148 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from gestion_creditos import credit_services
+from gestion_creditos.models import Credito, CreditoLibranza, Empresa, HistorialPago, LotePagoMasivo, WompiIntent
+from gestion_creditos.services import conciliacion_wompi_service as conciliacion
+from gestion_creditos.services.lote_pago_masivo_service import aplicar_lote, crear_lote
+
+
+class ClienteWompiFalso:
+    def __init__(self, status, amount_in_cents=None):
+        self.status = status
+        self.amount_in_cents = amount_in_cents
+        self.consultas = 0
+
+    def get_transaction(self, transaction_id):
+        self.consultas += 1
+        return {'data': {'id': transaction_id, 'status': self.status, 'amount_in_cents': self.amount_in_cents}}
+
+
+class ConciliacionWompiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Wompi')
+        cls.pagador = User.objects.create_user(username='pagador_wompi', password='123')
+        cls.creditos = []
+        for cedula in ('5001', '5002'):
+            user = User.objects.create_user(username=f'wompi_{cedula}', password='123')
+            credito = Credito.objects.create(
+                usuario=user,
+                linea=Credito.LineaCredito.LIBRANZA,
+                estado=Credito.EstadoCredito.APROBADO,
+                monto_solicitado=Decimal('1000000'),
+                plazo_solicitado=12,
+                monto_aprobado=Decimal('1000000'),
+                plazo=12,
+            )
+            CreditoLibranza.objects.create(
+                credito=credito,
+                nombres='Empleado',
+                apellidos=cedula,
+                cedula=cedula,
+                direccion='Calle 1',
+                telefono='3000000000',
+                correo_electronico=f'{cedula}@example.com',
+                empresa=cls.empresa,
+            )
+            credit_services.activar_credito(credito)
+            Credito.objects.filter(pk=credito.pk).update(estado=Credito.EstadoCredito.ACTIVO)
+            cls.creditos.append(credito)
+
+    def _intent(self, referencia, **extra):
+        intent = WompiIntent.objects.create(
+            credito=self.creditos[0],
+            referencia=referencia,
+            amount_in_cents=5000000,
+            usuario=self.pagador,
+            **extra
+        )
+        conciliacion.programar_conciliacion(intent, f'tx-{referencia}', 'PENDING')
+        WompiIntent.objects.filter(pk=intent.pk).update(proxima_consulta=timezone.now())
+        return intent
+
+    def test_aprobado_se_aplica_una_sola_vez(self):
+        intent = self._intent('CUOTA-1-1')
+        cliente = ClienteWompiFalso('APPROVED', 5000000)
+
+        self.assertEqual(conciliacion.conciliar_intentos_pendientes(cliente), {'APPROVED': 1})
+        self.assertEqual(conciliacion.conciliar_intentos_pendientes(cliente), {})
+
+        intent.refresh_from_db()
+        self.assertIsNotNone(intent.aplicado_en)
+        self.assertIsNone(intent.proxima_consulta)
+        self.assertEqual(HistorialPago.objects.get(referencia_pago='CUOTA-1-1').monto, Decimal('50000'))
+        self.assertFalse(conciliacion.aplicar_pago_aprobado(intent.id, intent.datos_transaccion)[1])
+        self.assertEqual(cliente.consultas, 1)
+
+    def test_pendiente_espera_cada_vez_mas_y_expira(self):
+        intent = self._intent('CUOTA-1-2')
+        cliente = ClienteWompiFalso('PENDING')
+
+        conciliacion.conciliar_intentos_pendientes(cliente)
+        intent.refresh_from_db()
+        self.assertEqual(intent.consultas_estado, 1)
+        self.assertGreater(intent.proxima_consulta, timezone.now() + timedelta(seconds=15))
+        self.assertEqual(conciliacion.conciliar_intentos_pendientes(cliente), {})
+
+        WompiIntent.objects.filter(pk=intent.pk).update(
+            consultas_estado=conciliacion.MAX_CONSULTAS_ESTADO, proxima_consulta=timezone.now()
+        )
+        self.assertEqual(conciliacion.conciliar_intentos_pendientes(cliente), {'EXPIRED': 1})
+        intent.refresh_from_db()
+        self.assertIsNone(intent.proxima_consulta)
+
+    def test_lote_csv_se_aplica_sin_el_navegador(self):
+        pagos = [
+            {'credito_id': c.pk, 'cedula': str(i), 'nombre': 'Empleado', 'monto': Decimal('10000'), 'fila': i}
+            for i, c in enumerate(self.creditos + self.creditos[:1], start=2)
+        ]
+        totales = {self.creditos[0].pk: Decimal('20000'), self.creditos[1].pk: Decimal('10000')}
+        lote = crear_lote(self.empresa, self.pagador, pagos, totales, referencia='CSV-MASIVO-1')
+        self.assertEqual((lote.cantidad_pagos, lote.monto_total), (2, Decimal('30000')))
+
+        intent = self._intent('CSV-MASIVO-1', tipo_pago=conciliacion.TIPO_PAGO_CSV_MASIVO, lote=lote)
+        conciliacion.conciliar_intentos_pendientes(ClienteWompiFalso('APPROVED', 3000000))
+
+        self.assertEqual(
+            dict(HistorialPago.objects.filter(referencia_pago__startswith='CSV-MASIVO-1-').values_list('credito_id', 'monto')),
+            totales,
+        )
+        lote.refresh_from_db()
+        intent.refresh_from_db()
+        self.assertEqual(lote.estado, LotePagoMasivo.Estado.APLICADO)
+        self.assertIsNotNone(lote.fecha_cobro)
+        self.assertIsNotNone(intent.aplicado_en)
+        self.assertEqual(aplicar_lote(lote.id), [])
+
+    def test_lote_rechazado_no_aplica_pagos(self):
+        pagos = [{'credito_id': self.creditos[0].pk, 'cedula': '1', 'nombre': '', 'monto': Decimal('10000'), 'fila': 2}]
+        lote = crear_lote(self.empresa, self.pagador, pagos, {self.creditos[0].pk: Decimal('10000')}, referencia='CSV-MASIVO-2')
+        self._intent('CSV-MASIVO-2', tipo_pago=conciliacion.TIPO_PAGO_CSV_MASIVO, lote=lote)
+
+        conciliacion.conciliar_intentos_pendientes(ClienteWompiFalso('DECLINED'))
+
+        lote.refresh_from_db()
+        self.assertEqual(lote.estado, LotePagoMasivo.Estado.RECHAZADO)
+        self.assertFalse(HistorialPago.objects.filter(referencia_pago__startswith='CSV-MASIVO-2-').exists())
+
+    def test_callback_no_consulta_wompi(self):
+        intent = self._intent('CUOTA-1-3')
+        self.client.force_login(self.pagador)
+
+        with patch('gestion_creditos.tasks.conciliar_pagos_wompi_task.delay') as delay, \
+                patch('gestion_creditos.services.wompi_client.WompiClient.get_transaction') as get_transaction:
+            response = self.client.get(reverse('pagador:pago_wompi_callback'), {'id': intent.wompi_transaction_id})
+            estado = self.client.get(reverse('pagador:pago_wompi_estado'), {'id': intent.wompi_transaction_id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'pagador/pago_wompi_espera.html')
+        delay.assert_called_once_with(intent.id)
+        get_transaction.assert_not_called()
+        self.assertEqual(estado.json(), {'status': 'PENDING', 'aplicado': False, 'finalizado': False})
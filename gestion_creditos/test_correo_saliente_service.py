@@ -0,0 +1,115 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+
+from gestion_creditos import credit_services
+from gestion_creditos.models import Credito, CorreoSaliente, HistorialPago
+from gestion_creditos.services import correo_saliente_service
+
+
+class CorreoSalienteServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='cliente', email='cliente@example.com', password='123')
+        cls.credito = Credito.objects.create(
+            usuario=user,
+            linea=Credito.LineaCredito.EMPRENDIMIENTO,
+            estado=Credito.EstadoCredito.ACTIVO,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+        )
+
+    def test_encolar_misma_clave_no_duplica(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for _ in range(2):
+                correo_saliente_service.encolar_confirmacion_pago(
+                    self.credito, Decimal('50000'), Decimal('950000'), clave='pago:REF-1'
+                )
+
+        self.assertEqual(CorreoSaliente.objects.count(), 1)
+        self.assertEqual(len(callbacks), 2)
+
+    def test_mismo_pago_procesado_dos_veces_encola_un_correo(self):
+        credito = Credito.objects.create(
+            usuario=self.credito.usuario,
+            linea=Credito.LineaCredito.EMPRENDIMIENTO,
+            estado=Credito.EstadoCredito.APROBADO,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+            monto_aprobado=Decimal('1000000'),
+            plazo=12,
+        )
+        credit_services.activar_credito(credito)
+        pago = HistorialPago.objects.create(
+            credito=credito, monto=Decimal('50000'), referencia_pago='REF-PAGO-1',
+            estado=HistorialPago.EstadoPago.EXITOSO,
+        )
+
+        for _ in range(2):
+            credit_services.actualizar_saldo_tras_pago(Credito.objects.get(pk=credito.pk), pago.monto, pago=pago)
+
+        correos = CorreoSaliente.objects.filter(tipo=CorreoSaliente.TipoCorreo.CONFIRMACION_PAGO)
+        self.assertEqual(list(correos.values_list('clave', flat=True)), ['pago:REF-PAGO-1'])
+
+    def test_despacho_envia_pendientes(self):
+        correo_saliente_service.encolar_confirmacion_pago(
+            self.credito, Decimal('50000'), Decimal('950000'), clave='pago:REF-2'
+        )
+
+        resultado = correo_saliente_service.despachar_correos_pendientes()
+
+        self.assertEqual(resultado, {'enviados': 1, 'procesados': 1})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['cliente@example.com'])
+        correo = CorreoSaliente.objects.get()
+        self.assertEqual(correo.estado, CorreoSaliente.EstadoCorreo.ENVIADO)
+        self.assertEqual(correo.intentos, 1)
+
+    def test_fallo_reprograma_con_backoff(self):
+        correo_saliente_service.encolar_confirmacion_pago(
+            self.credito, Decimal('50000'), Decimal('950000'), clave='pago:REF-3'
+        )
+        antes = timezone.now()
+
+        with mock.patch.object(correo_saliente_service, '_construir_mensaje', side_effect=RuntimeError('smtp caído')):
+            resultado = correo_saliente_service.despachar_correos_pendientes()
+
+        self.assertEqual(resultado['enviados'], 0)
+        correo = CorreoSaliente.objects.get()
+        self.assertEqual(correo.estado, CorreoSaliente.EstadoCorreo.PENDIENTE)
+        self.assertGreaterEqual((correo.proximo_intento - antes).total_seconds(), 60)
+        self.assertIn('smtp caído', correo.ultimo_error)
+        # Aún no le toca turno
+        self.assertEqual(correo_saliente_service.despachar_correos_pendientes()['procesados'], 0)
+
+
+class EnvioMasivoTests(TestCase):
+    def test_lote_de_recordatorios_usa_una_conexion(self):
+        from django.core.mail import get_connection
+        from gestion_creditos import email_service, tasks
+
+        hoy = timezone.now().date()
+        ids = []
+        for n in range(3):
+            user = User.objects.create_user(username=f'rec_{n}', email=f'rec_{n}@example.com', password='123')
+            ids.append(Credito.objects.create(
+                usuario=user,
+                linea=Credito.LineaCredito.EMPRENDIMIENTO,
+                estado=Credito.EstadoCredito.ACTIVO,
+                monto_solicitado=Decimal('1000000'),
+                plazo_solicitado=12,
+                valor_cuota=Decimal('100000'),
+                fecha_proximo_pago=hoy + timedelta(days=3),
+            ).id)
+
+        with mock.patch.object(email_service, 'get_connection', wraps=get_connection) as conexiones:
+            resultado = tasks.enviar_lote_notificaciones_task('RECORDATORIO_PAGO', 3, ids, hoy.isoformat())
+
+        self.assertEqual(resultado['notificaciones_enviadas'], 3)
+        self.assertEqual(conexiones.call_count, 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f'rec_{n}@example.com' for n in range(3)])
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from gestion_creditos.models import Credito
+
+
+class CreditoTransicionEstadoTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='cliente_estado', password='123')
+        credito = Credito.objects.create(
+            usuario=user,
+            linea=Credito.LineaCredito.LIBRANZA,
+            estado=Credito.EstadoCredito.ACTIVO,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+        )
+        self.credito = Credito.objects.get(pk=credito.pk)
+
+    def test_save_valida_contra_estado_cargado_sin_consultar(self):
+        self.credito.estado = Credito.EstadoCredito.EN_MORA
+
+        with self.assertNumQueries(1):
+            self.credito.save()
+
+    def test_transicion_invalida_desde_activo(self):
+        self.credito.estado = Credito.EstadoCredito.RECHAZADO
+
+        with self.assertRaises(ValidationError):
+            self.credito.save()
+
+    def test_update_fields_sin_estado_omite_validacion(self):
+        Credito.objects.filter(pk=self.credito.pk).update(estado=Credito.EstadoCredito.PAGADO)
+        self.credito.saldo_pendiente = Decimal('0')
+
+        with self.assertNumQueries(1):
+            self.credito.save(update_fields=['saldo_pendiente'])
+
+        self.credito.refresh_from_db()
+        self.credito.estado = Credito.EstadoCredito.ACTIVO
+        with self.assertRaises(ValidationError):
+            self.credito.save()
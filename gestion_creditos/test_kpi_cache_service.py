@@ -0,0 +1,92 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from gestion_creditos import credit_services
+from gestion_creditos.models import Credito
+from gestion_creditos.services import kpi_cache_service
+from gestion_creditos.signals import estado_credito_cambiado, saldo_credito_actualizado
+
+
+class KpiCacheServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.llamadas = 0
+
+    def _calcular(self):
+        self.llamadas += 1
+        return {'valor': self.llamadas}
+
+    def test_reutiliza_valor_hasta_invalidar(self):
+        metrica = kpi_cache_service.RESUMEN_CARTERA
+
+        self.assertEqual(kpi_cache_service.obtener_kpi(metrica, self._calcular), {'valor': 1})
+        self.assertEqual(kpi_cache_service.obtener_kpi(metrica, self._calcular), {'valor': 1})
+
+        kpi_cache_service.invalidar_kpis(metrica)
+
+        self.assertEqual(kpi_cache_service.obtener_kpi(metrica, self._calcular), {'valor': 2})
+
+    def test_senal_invalida_al_confirmar_transaccion(self):
+        metrica = kpi_cache_service.CARTERA_MORA
+        kpi_cache_service.obtener_kpi(metrica, self._calcular)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            saldo_credito_actualizado.send(sender=Credito, credito_ids=[1])
+            self.assertEqual(kpi_cache_service.obtener_kpi(metrica, self._calcular), {'valor': 1})
+
+        self.assertEqual(kpi_cache_service.obtener_kpi(metrica, self._calcular), {'valor': 2})
+
+    def test_marcar_mora_avisa_el_cambio_de_estado(self):
+        user = User.objects.create_user(username='kpi_mora', password='123')
+        credito = Credito.objects.create(
+            usuario=user,
+            linea=Credito.LineaCredito.LIBRANZA,
+            estado=Credito.EstadoCredito.ACTIVO,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+            fecha_proximo_pago=timezone.now().date() - timedelta(days=1),
+        )
+        recibidos = []
+
+        def receptor(sender, credito_ids=None, **kwargs):
+            recibidos.append(credito_ids)
+
+        estado_credito_cambiado.connect(receptor)
+        self.addCleanup(estado_credito_cambiado.disconnect, receptor)
+        credit_services.marcar_creditos_en_mora()
+
+        self.assertEqual(recibidos, [[credito.id]])
+
+    def test_abono_que_salda_el_credito_avisa_saldo_y_estado(self):
+        user = User.objects.create_user(username='kpi_abono', password='123')
+        credito = Credito.objects.create(
+            usuario=user,
+            linea=Credito.LineaCredito.EMPRENDIMIENTO,
+            estado=Credito.EstadoCredito.APROBADO,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+            monto_aprobado=Decimal('1000000'),
+            plazo=12,
+        )
+        credit_services.activar_credito(credito)
+        credito = Credito.objects.get(pk=credito.pk)
+        recibidos = []
+
+        def receptor(sender, signal=None, credito_ids=None, **kwargs):
+            recibidos.append((signal, credito_ids))
+
+        for senal in (estado_credito_cambiado, saldo_credito_actualizado):
+            senal.connect(receptor)
+            self.addCleanup(senal.disconnect, receptor)
+
+        credit_services.aplicar_abono_credito(credito, credito.valor_cuota * credito.plazo, 'MAYOR', None, 'KPI-ABONO-1')
+
+        credito.refresh_from_db()
+        self.assertEqual(credito.estado, Credito.EstadoCredito.PAGADO)
+        self.assertIn((saldo_credito_actualizado, [credito.id]), recibidos)
+        self.assertIn((estado_credito_cambiado, [credito.id]), recibidos)
@@ -0,0 +1,86 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from gestion_creditos import credit_services
+from gestion_creditos.models import Credito, HistorialEstado
+
+
+class MoraCreditoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='empleado_mora', password='123')
+        credito = Credito.objects.create(
+            usuario=user,
+            linea=Credito.LineaCredito.LIBRANZA,
+            estado=Credito.EstadoCredito.APROBADO,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+            monto_aprobado=Decimal('1000000'),
+            plazo=12,
+        )
+        credit_services.activar_credito(credito)
+        Credito.objects.filter(pk=credito.pk).update(estado=Credito.EstadoCredito.ACTIVO)
+        cls.credito_id = credito.pk
+
+    def test_mora_se_recalcula_y_baja_con_el_pago(self):
+        hoy = timezone.now().date()
+        credito = Credito.objects.get(pk=self.credito_id)
+        credito.tabla_amortizacion.filter(numero_cuota__lte=2).update(fecha_vencimiento=hoy - timedelta(days=40))
+        cuota = credito.valor_cuota
+
+        credit_services.actualizar_mora_creditos()
+
+        credito.refresh_from_db()
+        self.assertEqual(credito.monto_vencido, cuota * 2)
+        self.assertEqual(credito.dias_mora, 40)
+        self.assertEqual(credit_services.calcular_total_en_mora(), cuota * 2)
+
+        credit_services.aplicar_pagos_masivos([
+            {'credito_id': credito.pk, 'monto': cuota, 'referencia': 'MORA-1'}
+        ])
+
+        credito.refresh_from_db()
+        self.assertEqual(credito.monto_vencido, cuota)
+
+    def test_recalculo_nocturno_no_reescribe_creditos_al_dia(self):
+        hoy = timezone.now().date()
+
+        for dia in (hoy, hoy + timedelta(days=1)):
+            with self.assertNumQueries(3):
+                self.assertEqual(credit_services.actualizar_mora_creditos(hoy=dia), 0)
+
+        credito = Credito.objects.get(pk=self.credito_id)
+        self.assertEqual((credito.monto_vencido, credito.dias_mora), (Decimal('0.00'), 0))
+        self.assertEqual(credito.fecha_calculo_mora, hoy + timedelta(days=1))
+
+
+class MarcarCreditosEnMoraTests(TestCase):
+    def test_marca_vencidos_en_lote_con_historial(self):
+        hoy = timezone.now().date()
+        creditos = []
+        for n, dias in enumerate((-5, -1, 3)):
+            user = User.objects.create_user(username=f'mora_{n}', password='123')
+            creditos.append(Credito.objects.create(
+                usuario=user,
+                linea=Credito.LineaCredito.LIBRANZA,
+                estado=Credito.EstadoCredito.ACTIVO,
+                monto_solicitado=Decimal('1000000'),
+                plazo_solicitado=12,
+                fecha_proximo_pago=hoy + timedelta(days=dias),
+            ))
+
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(4):
+            actualizados = credit_services.marcar_creditos_en_mora()
+
+        self.assertEqual(actualizados, 2)
+        self.assertEqual(len(callbacks), 2)  # invalidación de KPIs y avisos de mora
+        estados = dict(Credito.objects.values_list('id', 'estado'))
+        self.assertEqual(estados[creditos[0].id], Credito.EstadoCredito.EN_MORA)
+        self.assertEqual(estados[creditos[2].id], Credito.EstadoCredito.ACTIVO)
+        self.assertEqual(
+            HistorialEstado.objects.filter(estado_nuevo=Credito.EstadoCredito.EN_MORA).count(), 2
+        )
@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase
+
+from gestion_creditos import tasks
+from gestion_creditos.models import Credito, NotificacionCreditoEnviada, ReglaNotificacionCredito
+from gestion_creditos.services import notificacion_programada_service
+
+RECORDATORIO = ReglaNotificacionCredito.TipoNotificacion.RECORDATORIO_PAGO
+ALERTA = ReglaNotificacionCredito.TipoNotificacion.ALERTA_MORA
+
+
+class NotificacionProgramadaServiceTests(TestCase):
+    hoy = date(2026, 3, 10)
+
+    def _credito(self, nombre, estado, dias_hasta_pago):
+        user = User.objects.create_user(username=nombre, email=f'{nombre}@example.com', password='123')
+        return Credito.objects.create(
+            usuario=user,
+            linea=Credito.LineaCredito.EMPRENDIMIENTO,
+            estado=estado,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+            valor_cuota=Decimal('100000'),
+            fecha_proximo_pago=self.hoy + timedelta(days=dias_hasta_pago),
+        )
+
+    def test_una_consulta_agrupa_por_tipo_y_nivel(self):
+        recordatorio = self._credito('r7', Credito.EstadoCredito.ACTIVO, 7)
+        self._credito('r5', Credito.EstadoCredito.ACTIVO, 5)
+        mora_15 = self._credito('m15', Credito.EstadoCredito.EN_MORA, -15)
+        mora_90 = self._credito('m90', Credito.EstadoCredito.EN_MORA, -90)
+        self._credito('m45', Credito.EstadoCredito.EN_MORA, -45)
+
+        with self.assertNumQueries(2):  # reglas + créditos
+            pendientes = notificacion_programada_service.seleccionar_notificaciones_pendientes(self.hoy)
+
+        self.assertEqual(pendientes, {
+            (RECORDATORIO, 7): [recordatorio.id],
+            (ALERTA, 15): [mora_15.id],
+            (ALERTA, 90): [mora_90.id],
+        })
+
+    def test_reejecutar_no_repite_avisos(self):
+        credito = self._credito('r3', Credito.EstadoCredito.ACTIVO, 3)
+        fecha = self.hoy.isoformat()
+
+        tasks.enviar_lote_notificaciones_task(RECORDATORIO, 3, [credito.id], fecha)
+        resultado = tasks.enviar_lote_notificaciones_task(RECORDATORIO, 3, [credito.id], fecha)
+
+        self.assertEqual(resultado['notificaciones_enviadas'], 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(NotificacionCreditoEnviada.objects.filter(credito=credito).count(), 1)
+        self.assertEqual(notificacion_programada_service.seleccionar_notificaciones_pendientes(self.hoy), {})
+
+    def test_reglas_desactivadas_no_se_aplican(self):
+        self._credito('r7b', Credito.EstadoCredito.ACTIVO, 7)
+        ReglaNotificacionCredito.objects.filter(tipo=RECORDATORIO, dias=7).update(activa=False)
+
+        self.assertEqual(notificacion_programada_service.seleccionar_notificaciones_pendientes(self.hoy), {})
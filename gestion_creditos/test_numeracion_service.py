@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from gestion_creditos.models import Credito
+from gestion_creditos.services.numeracion_service import reservar_numeros_credito
+
+
+class NumeracionCreditoTests(TestCase):
+    def _crear_credito(self, **kwargs):
+        user = User.objects.create_user(username=f'num_{User.objects.count()}', password='123')
+        return Credito.objects.create(
+            usuario=user,
+            linea=Credito.LineaCredito.LIBRANZA,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+            **kwargs
+        )
+
+    def test_continua_numeracion_existente_del_anio(self):
+        anio = timezone.now().year
+        self._crear_credito(numero_credito=f'CR-{anio}-00041')
+
+        credito = self._crear_credito()
+
+        self.assertEqual(credito.numero_credito, f'CR-{anio}-00042')
+
+    def test_reserva_bloque_contiguo(self):
+        self.assertEqual(
+            reservar_numeros_credito(3, anio=2031),
+            ['CR-2031-00001', 'CR-2031-00002', 'CR-2031-00003'],
+        )
+        self.assertEqual(reservar_numeros_credito(1, anio=2031), ['CR-2031-00004'])
@@ -0,0 +1,80 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from gestion_creditos.models import Credito
+from gestion_creditos.services.paginacion_service import paginar_keyset
+
+
+class PaginacionKeysetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='keyset', password='123')
+        montos = ['300', None, '100', '300', None, '200', '100']
+        for monto in montos:
+            Credito.objects.create(
+                usuario=user,
+                linea=Credito.LineaCredito.EMPRENDIMIENTO,
+                monto_solicitado=Decimal('1000'),
+                plazo_solicitado=12,
+                monto_aprobado=Decimal(monto) if monto else None,
+            )
+
+    def _recorrer(self, orden, tamano):
+        vistos, cursor = [], None
+        while True:
+            pagina = paginar_keyset(Credito.objects.all(), orden, cursor, tamano=tamano)
+            vistos.extend(c.pk for c in pagina)
+            if not pagina.tiene_siguiente:
+                return vistos
+            cursor = pagina.siguiente_cursor
+
+    def test_recorrido_completo_sin_repetir_ni_saltar(self):
+        for orden in ('monto_aprobado', '-monto_aprobado', '-fecha_solicitud'):
+            esperado = self._recorrer(orden, tamano=100)
+            self.assertEqual(len(esperado), 7)
+            for tamano in (1, 2, 3):
+                self.assertEqual(self._recorrer(orden, tamano), esperado, (orden, tamano))
+
+    def test_nulos_al_final_y_cursor_invalido(self):
+        pagina = paginar_keyset(Credito.objects.all(), '-monto_aprobado', 'no-es-un-cursor', tamano=10)
+
+        montos = [c.monto_aprobado for c in pagina]
+        self.assertEqual(montos[:2], [Decimal('300'), Decimal('300')])
+        self.assertEqual(montos[-2:], [None, None])
+
+
+class ListadosAdminPorCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin_keyset', password='123', is_staff=True)
+        for dias in (5, 40, 40, 90, 12):
+            Credito.objects.create(
+                usuario=cls.admin,
+                linea=Credito.LineaCredito.EMPRENDIMIENTO,
+                estado=Credito.EstadoCredito.EN_MORA,
+                monto_solicitado=Decimal('1000'),
+                plazo_solicitado=12,
+                dias_mora=dias,
+            )
+
+    def test_cartera_recorre_paginas_sin_contar_por_pagina(self):
+        self.client.force_login(self.admin)
+        url = reverse('gestion:cartera_mora')
+
+        with patch('gestion_creditos.views.ADMIN_LISTADO_TAMANO_PAGINA', 2):
+            vistos, params = [], {}
+            while True:
+                response = self.client.get(url, params)
+                self.assertEqual(response.context['total_listado'], 5)
+                pagina = response.context['creditos']
+                vistos.extend(c.dias_mora for c in pagina)
+                if not pagina.tiene_siguiente:
+                    break
+                params = {'cursor': pagina.siguiente_cursor}
+
+        self.assertEqual(vistos, [90, 40, 40, 12, 5])
+        self.assertFalse(response.context['es_primera_pagina'])
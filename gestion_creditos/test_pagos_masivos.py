@@ -0,0 +1,165 @@
+import io
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from gestion_creditos import credit_services
+from gestion_creditos.models import Credito, CreditoLibranza, Empresa, HistorialPago
+
+
+class PagosMasivosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Pagadora')
+        cls.creditos = {}
+        for cedula in ('112233', '445566'):
+            user = User.objects.create_user(username=f'empleado_{cedula}', password='123')
+            credito = Credito.objects.create(
+                usuario=user,
+                linea=Credito.LineaCredito.LIBRANZA,
+                estado=Credito.EstadoCredito.APROBADO,
+                monto_solicitado=Decimal('1000000'),
+                plazo_solicitado=12,
+                monto_aprobado=Decimal('1000000'),
+                plazo=12,
+            )
+            CreditoLibranza.objects.create(
+                credito=credito,
+                nombres='Empleado',
+                apellidos=cedula,
+                cedula=cedula,
+                direccion='Calle 1',
+                telefono='3000000000',
+                correo_electronico=f'{cedula}@example.com',
+                empresa=cls.empresa,
+            )
+            credit_services.activar_credito(credito)
+            Credito.objects.filter(pk=credito.pk).update(estado=Credito.EstadoCredito.ACTIVO)
+            cls.creditos[cedula] = credito
+
+    def _csv(self, contenido):
+        return io.BytesIO(contenido.encode('utf-8'))
+
+    def test_aplica_lote_y_reparte_cuotas(self):
+        credito = Credito.objects.get(pk=self.creditos['112233'].pk)
+        cuota = credito.valor_cuota
+        csv_file = self._csv(f'cedula,monto_a_pagar\n112233,{int(cuota * 2) + 1}\n445566,50000\n')
+
+        pagos_exitosos, errores = credit_services.procesar_pagos_masivos_csv(csv_file, self.empresa)
+
+        self.assertEqual((pagos_exitosos, errores), (2, []))
+        credito.refresh_from_db()
+        self.assertEqual(credito.total_pagado, int(cuota * 2) + 1)
+        self.assertIsNotNone(credito.ultimo_pago)
+        self.assertLess(credito.saldo_pendiente, credito.capital_financiado)
+        self.assertEqual(credito.tabla_amortizacion.filter(pagada=True).count(), 2)
+        parcial = Credito.objects.get(pk=self.creditos['445566'].pk).tabla_amortizacion.get(numero_cuota=1)
+        self.assertFalse(parcial.pagada)
+        self.assertEqual(parcial.monto_pagado, Decimal('50000.00'))
+
+    def test_errores_en_orden_de_fila(self):
+        csv_file = self._csv('cedula,monto_a_pagar\n999999,100\n112233,monto_invalido\n')
+
+        pagos_exitosos, errores = credit_services.procesar_pagos_masivos_csv(csv_file, self.empresa)
+
+        self.assertEqual(pagos_exitosos, 0)
+        self.assertIn('No se encontró un crédito activo para la cédula 999999', errores[0])
+        self.assertIn("Monto 'monto_invalido' no es un número válido", errores[1])
+
+    def test_reprocesar_referencias_es_idempotente(self):
+        pagos = [{'credito_id': self.creditos['112233'].pk, 'monto': Decimal('10000'), 'referencia': 'CSV-1-A'}]
+
+        self.assertEqual(len(credit_services.aplicar_pagos_masivos(pagos)), 1)
+        self.assertEqual(credit_services.aplicar_pagos_masivos(pagos), [])
+        self.assertEqual(HistorialPago.objects.filter(referencia_pago='CSV-1-A').count(), 1)
+
+    def test_lote_mixto_actualiza_total_pagado_de_todos(self):
+        rapido, completar = self.creditos['112233'], self.creditos['445566']
+        # Sin tabla de amortización el pago va por actualizar_saldo_tras_pago
+        completar.tabla_amortizacion.all().delete()
+
+        credit_services.aplicar_pagos_masivos([
+            {'credito_id': rapido.pk, 'monto': Decimal('30000'), 'referencia': 'MIXTO-1'},
+            {'credito_id': completar.pk, 'monto': Decimal('40000'), 'referencia': 'MIXTO-2'},
+        ])
+
+        totales = dict(Credito.objects.filter(pk__in=[rapido.pk, completar.pk]).values_list('id', 'total_pagado'))
+        self.assertEqual(totales, {rapido.pk: Decimal('30000'), completar.pk: Decimal('40000')})
+        self.assertIsNotNone(Credito.objects.get(pk=completar.pk).ultimo_pago)
+
+    def test_pago_guarda_reparto_en_cuotas_con_un_update(self):
+        credito = Credito.objects.get(pk=self.creditos['445566'].pk)
+        monto = credito.valor_cuota * 3 + Decimal('100')
+        pago = HistorialPago.objects.create(
+            credito=credito, monto=monto, referencia_pago='REPARTO-1', estado=HistorialPago.EstadoPago.EXITOSO
+        )
+        cuotas = list(credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota'))
+
+        with self.assertNumQueries(2):
+            asignacion = credit_services._aplicar_pago_a_cuotas(credito, monto)
+
+        self.assertEqual(asignacion.cuotas_pagadas, 3)
+        self.assertEqual(asignacion.sobrante, Decimal('0.00'))
+        self.assertEqual(asignacion.capital_abonado + asignacion.intereses_pagados, monto)
+        # Los 100 sobre la cuarta cuota cubren primero su interés
+        self.assertEqual(asignacion.intereses_pagados, sum(c.interes_a_pagar for c in cuotas[:3]) + Decimal('100'))
+        self.assertEqual([d['numero_cuota'] for d in asignacion.detalle], [1, 2, 3, 4])
+        self.assertEqual(credito.tabla_amortizacion.get(numero_cuota=4).monto_pagado, Decimal('100.00'))
+
+        asignacion.registrar_en(pago)
+        pago.save(update_fields=credit_services.CAMPOS_ASIGNACION_PAGO)
+        pago.refresh_from_db()
+        self.assertEqual(pago.intereses_pagados, asignacion.intereses_pagados)
+        self.assertFalse(pago.detalle_cuotas[3]['pagada'])
+
+    def test_abono_a_capital_reconstruye_cuotas_pendientes(self):
+        credito = Credito.objects.get(pk=self.creditos['112233'].pk)
+        credito.tabla_amortizacion.filter(numero_cuota__lte=2).update(pagada=True)
+        capital_pendiente = credito.capital_pendiente
+
+        with self.assertNumQueries(3):
+            tabla = credit_services._recalcular_amortizacion_por_capital(credito, Decimal('300000'))
+
+        cuotas = list(credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota'))
+        self.assertEqual([c.numero_cuota for c in cuotas], list(range(3, 13)))
+        self.assertEqual(sum(c.capital_a_pagar for c in cuotas), capital_pendiente - Decimal('300000'))
+        self.assertEqual(cuotas[-1].saldo_capital_pendiente, Decimal('0.00'))
+        self.assertEqual(cuotas[0].valor_cuota, tabla['valor_cuota'])
+
+    def test_validacion_reporta_cedulas_repetidas_y_totales(self):
+        credito_id = self.creditos['112233'].pk
+        csv_file = self._csv('cedula,monto_a_pagar\n112233,1000\n445566,500\n112.233,2000\n')
+
+        with self.assertNumQueries(1):
+            pagos, errores, resumen = credit_services.validar_csv_pagos_masivos(
+                csv_file, self.empresa, incluir_resumen=True
+            )
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(pagos), 3)
+        self.assertEqual(pagos[0]['nombre'], 'Empleado 112233')
+        self.assertEqual(resumen['cedulas_duplicadas'], {'112233': [2, 4]})
+        self.assertEqual(resumen['totales_por_credito'][credito_id], Decimal('3000'))
+        self.assertEqual(resumen['monto_total'], Decimal('3500'))
+
+    def test_lector_csv_por_bloques_con_bom_y_sep(self):
+        contenido = '\ufeffsep=;\nCedula ; Monto_a_pagar\n' + ''.join(f'{n};{n * 10}\n' for n in range(1, 2001))
+        csv_file = io.BytesIO(contenido.encode('utf-8'))
+
+        filas = credit_services._leer_csv_pagos(csv_file)
+
+        self.assertEqual(next(filas), {'cedula': '1', 'monto_a_pagar': '10'})
+        self.assertEqual(sum(1 for _ in filas), 1999)
+
+    def test_lector_csv_con_fin_de_linea_cr(self):
+        contenido = 'cedula,monto_a_pagar\r' + ''.join(f'{n},{n * 10}\r' for n in range(1, 501))
+        csv_file = io.BytesIO(contenido.encode('utf-8'))
+
+        filas = list(credit_services._leer_csv_pagos(csv_file))
+
+        self.assertEqual(len(filas), 500)
+        self.assertEqual(filas[-1], {'cedula': '500', 'monto_a_pagar': '5000'})
+        # Un \r\n partido entre dos bloques sigue siendo un solo fin de línea
+        lineas = list(credit_services._iterar_lineas_csv(['a,1\r', '\nb,2\r', 'c,3']))
+        self.assertEqual(lineas, ['a,1\r\n', 'b,2\r', 'c,3'])
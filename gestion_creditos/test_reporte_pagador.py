@@ -0,0 +1,123 @@
+import csv
+import io
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from gestion_creditos.models import Credito, CreditoLibranza, CuotaAmortizacion, Empresa, LotePagoMasivo
+from gestion_creditos.services.wompi_client import WompiClient
+from usuarios.models import PerfilPagador
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ReportePagadorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Reporte')
+        pagador = User.objects.create_user(username='pagador', password='123')
+        PerfilPagador.objects.create(usuario=pagador, empresa=cls.empresa)
+        for cedula in ('1001', '1002'):
+            user = User.objects.create_user(username=f'emp_{cedula}', password='123')
+            credito = Credito.objects.create(
+                usuario=user,
+                linea=Credito.LineaCredito.LIBRANZA,
+                estado=Credito.EstadoCredito.ACTIVO,
+                monto_solicitado=Decimal('1000000'),
+                plazo_solicitado=12,
+            )
+            CreditoLibranza.objects.create(
+                credito=credito,
+                nombres='Empleado',
+                apellidos=cedula,
+                cedula=cedula,
+                direccion='Calle 1',
+                telefono='3000000000',
+                correo_electronico=f'{cedula}@example.com',
+                empresa=cls.empresa,
+                cedula_frontal=f'credito_libranza/cedulas/{cedula}.pdf' if cedula == '1001' else '',
+            )
+
+    def setUp(self):
+        self.client.login(username='pagador', password='123')
+
+    def test_csv_se_transmite_por_filas(self):
+        response = self.client.get(reverse('pagador:descargar_reporte'))
+
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        filas = list(csv.reader(io.StringIO(contenido)))
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[0][27], 'Cedula')
+        self.assertEqual([f[27] for f in filas[1:]], ['1001', '1002'])
+        self.assertTrue(filas[1][32].startswith('http://testserver/media/credito_libranza/cedulas/'))
+        self.assertEqual(filas[2][32], '')
+
+    def test_xlsx_reducido(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse('pagador:descargar_reporte'), {'formato': 'xlsx', 'tipo': 'reducido'})
+
+        libro = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        filas = list(libro.active.iter_rows(values_only=True))
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[0][14], 'Cedula')
+
+    def test_cuotas_pendientes_sin_consulta_por_credito(self):
+        from datetime import date
+
+        credito = Credito.objects.get(detalle_libranza__cedula='1001')
+        for numero, pagada, pagado in ((1, True, Decimal('100000')), (2, False, Decimal('30000.50')), (3, False, None)):
+            CuotaAmortizacion.objects.create(
+                credito=credito,
+                numero_cuota=numero,
+                fecha_vencimiento=date(2026, numero, 28),
+                capital_a_pagar=Decimal('80000'),
+                interes_a_pagar=Decimal('20000'),
+                valor_cuota=Decimal('100000'),
+                saldo_capital_pendiente=Decimal('0'),
+                pagada=pagada,
+                monto_pagado=pagado,
+            )
+
+        response = self.client.get(reverse('pagador:descargar_csv_cuotas'))
+
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(contenido.splitlines(), ['sep=,', 'cedula,monto_a_pagar', '1001,70000', '1002,0'])
+
+    def test_dashboard_carga_incremental(self):
+        from unittest import mock
+        from gestion_creditos import views
+
+        with mock.patch.object(views, 'PAGADOR_DASHBOARD_TAMANO_PAGINA', 1):
+            response = self.client.get(reverse('pagador:dashboard'), {'sort_by': 'detalle_libranza__cedula'})
+            siguiente = self.client.get(
+                reverse('pagador:dashboard_creditos'),
+                {'sort_by': 'detalle_libranza__cedula', 'cursor': response.context['creditos'].siguiente_cursor},
+            ).json()
+
+        self.assertEqual(response.context['total_creditos'], 2)
+        self.assertContains(response, '1001')
+        self.assertNotContains(response, '>1002<')
+        self.assertEqual(siguiente['cantidad'], 1)
+        self.assertIn('1002', siguiente['filas_html'])
+        self.assertIsNone(siguiente['siguiente_cursor'])
+
+    @mock.patch.object(WompiClient, 'get_pse_financial_institutions', return_value=[])
+    @mock.patch.object(WompiClient, 'get_acceptance_token', return_value={
+        'data': {'presigned_acceptance': {'acceptance_token': 'token'}}
+    })
+    def test_cedula_repetida_se_cobra_y_aplica_como_un_pago(self, *_):
+        archivo = SimpleUploadedFile('pagos.csv', b'cedula,monto_a_pagar\n1001,1000\n1002,500\n1001,2000\n')
+
+        response = self.client.post(reverse('pagador:pagos_masivos'), {'csv_file': archivo})
+
+        lote = LotePagoMasivo.objects.get()
+        credito = Credito.objects.get(detalle_libranza__cedula='1001')
+        self.assertEqual(response.context['monto_total'], 3500)
+        self.assertEqual(lote.monto_total, Decimal('3500'))
+        self.assertEqual(lote.detalles.get(credito=credito).monto, Decimal('3000'))
+        self.assertIn('un solo pago por $3,000', ' '.join(str(m) for m in response.context['messages']))
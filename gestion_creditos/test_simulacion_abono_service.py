@@ -0,0 +1,95 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from gestion_creditos import credit_services
+from gestion_creditos.models import Credito
+from gestion_creditos.services.simulacion_abono_service import SimulacionAbono, analizar_abono_cacheado
+
+
+class SimulacionAbonoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='emprendedor_abono', password='123')
+        credito = Credito.objects.create(
+            usuario=user,
+            linea=Credito.LineaCredito.EMPRENDIMIENTO,
+            estado=Credito.EstadoCredito.APROBADO,
+            monto_solicitado=Decimal('1000000'),
+            plazo_solicitado=12,
+            monto_aprobado=Decimal('1000000'),
+            plazo=12,
+        )
+        credit_services.activar_credito(credito)
+        Credito.objects.filter(pk=credito.pk).update(estado=Credito.EstadoCredito.ACTIVO)
+        cls.credito_id = credito.pk
+
+    def setUp(self):
+        cache.clear()
+        self.credito = Credito.objects.get(pk=self.credito_id)
+
+    def test_analisis_carga_las_cuotas_una_vez(self):
+        simulacion = SimulacionAbono(self.credito)
+
+        with self.assertNumQueries(1):
+            analisis = simulacion.analizar(self.credito.valor_cuota * 3, 'MAYOR')
+            simulacion.analizar(Decimal('200000'), 'CAPITAL')
+
+        self.assertEqual(analisis['plazo_actual'], 12)
+        self.assertEqual(analisis['nuevo_plazo'], 9)
+        self.assertTrue(analisis['requiere_reestructuracion'])
+        self.assertGreater(analisis['ahorro_intereses'], 0)
+        self.assertEqual(analisis, credit_services.analizar_abono_credito(self.credito, self.credito.valor_cuota * 3, 'MAYOR'))
+
+    def test_cache_se_reutiliza_hasta_que_cambia_el_credito(self):
+        monto = self.credito.valor_cuota
+
+        analisis = analizar_abono_cacheado(self.credito, monto, 'NORMAL')
+        with self.assertNumQueries(0):
+            self.assertEqual(analizar_abono_cacheado(self.credito, monto, 'NORMAL'), analisis)
+
+        credit_services.aplicar_abono_credito(self.credito, monto, 'NORMAL', None, 'ABONO-SIM-1', analisis=analisis)
+        self.credito.refresh_from_db()
+
+        self.assertEqual(analizar_abono_cacheado(self.credito, monto, 'NORMAL')['plazo_actual'], 11)
+
+    def test_resumen_cerrado_coincide_con_el_plan_completo(self):
+        simulacion = SimulacionAbono(self.credito)
+        cuota = self.credito.valor_cuota
+
+        for monto, tipo in ((cuota, 'NORMAL'), (cuota * 3 + 5000, 'MAYOR'), (Decimal('250000'), 'CAPITAL')):
+            resumen = simulacion.resumen(monto, tipo)
+            plan = simulacion.plan_nuevo(monto, tipo)
+            self.assertEqual(resumen['plan_nuevo']['cuotas_restantes'], plan['num_cuotas'])
+            self.assertAlmostEqual(resumen['plan_nuevo']['total_intereses'], plan['total_intereses'], places=2)
+            self.assertAlmostEqual(resumen['ahorro_intereses'], float(simulacion.ahorro_intereses(monto, tipo)), places=2)
+
+    def test_endpoint_simula_varios_montos_y_los_cachea(self):
+        self.client.force_login(self.credito.usuario)
+        url = reverse('emprendimiento:simular_abonos', args=[self.credito.pk], urlconf='aprobado_web.urls_emprender')
+        host = {'HTTP_HOST': 'emprender.aprobado.com.co'}
+        cuerpo = json.dumps({'tipo_abono': 'CUOTAS', 'montos': [str(self.credito.valor_cuota * n) for n in (1, 3)]})
+
+        respuesta = self.client.post(url, cuerpo, content_type='application/json', **host).json()
+
+        self.assertTrue(respuesta['success'])
+        self.assertEqual(respuesta['plan_actual']['cuotas_restantes'], 12)
+        self.assertEqual([s['tipo_abono'] for s in respuesta['simulaciones']], ['NORMAL', 'MAYOR'])
+        self.assertEqual([s['plan_nuevo']['cuotas_restantes'] for s in respuesta['simulaciones']], [11, 9])
+
+        # Sesión, usuario y crédito: la tabla de amortización ya no se consulta
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.post(url, cuerpo, content_type='application/json', **host).json(), respuesta)
+
+        invalido = self.client.post(url, json.dumps({'tipo_abono': 'CAPITAL', 'montos': []}), content_type='application/json', **host)
+        self.assertEqual(invalido.status_code, 400)
+
+        for monto in (str(self.credito.saldo_pendiente + 1), '1e999999'):
+            excedido = json.dumps({'tipo_abono': 'CUOTAS', 'montos': [monto]})
+            respuesta = self.client.post(url, excedido, content_type='application/json', **host)
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn('saldo pendiente', respuesta.json()['error'])
@@ -0,0 +1,103 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from gestion_creditos import credit_services
+from gestion_creditos.models import Credito, HistorialPago, WompiWebhookEvent
+from gestion_creditos.services import webhook_wompi_service as webhook
+
+
+def _payload(transaction_id, status, referencia, amount_in_cents=10000000, secreto='secreto'):
+    transaccion = {
+        'id': transaction_id,
+        'status': status,
+        'reference': referencia,
+        'amount_in_cents': amount_in_cents,
+    }
+    timestamp = 1700000000
+    checksum = hashlib.sha256(f'{transaction_id}{status}{amount_in_cents}{timestamp}{secreto}'.encode()).hexdigest()
+    return {
+        'event': 'transaction.updated',
+        'data': {'transaction': transaccion},
+        'timestamp': timestamp,
+        'signature': {
+            'properties': ['transaction.id', 'transaction.status', 'transaction.amount_in_cents'],
+            'checksum': checksum,
+        },
+    }
+
+
+@override_settings(WOMPI_EVENTS_SECRET='secreto')
+class WebhookWompiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creditos = []
+        for n in range(2):
+            user = User.objects.create_user(username=f'webhook_{n}', password='123')
+            credito = Credito.objects.create(
+                usuario=user,
+                linea=Credito.LineaCredito.EMPRENDIMIENTO,
+                estado=Credito.EstadoCredito.APROBADO,
+                monto_solicitado=Decimal('1000000'),
+                plazo_solicitado=12,
+                monto_aprobado=Decimal('1000000'),
+                plazo=12,
+            )
+            credit_services.activar_credito(credito)
+            Credito.objects.filter(pk=credito.pk).update(estado=Credito.EstadoCredito.ACTIVO)
+            cls.creditos.append(credito)
+
+    def test_webhook_guarda_el_evento_y_responde_sin_aplicar(self):
+        credito = self.creditos[0]
+        payload = _payload('tx-1', 'APPROVED', f'CUOTA-{credito.id}-1')
+
+        for _ in range(2):
+            respuesta = self.client.post(reverse('wompi_webhook'), json.dumps(payload), content_type='application/json')
+            self.assertEqual(respuesta.status_code, 200)
+
+        evento = WompiWebhookEvent.objects.get()
+        self.assertEqual((evento.credito_id, evento.estado), (credito.id, WompiWebhookEvent.Estado.PENDIENTE))
+        self.assertFalse(HistorialPago.objects.exists())
+
+        payload['signature']['checksum'] = 'x'
+        respuesta = self.client.post(reverse('wompi_webhook'), json.dumps(payload), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 401)
+
+    def test_eventos_de_un_credito_se_procesan_en_orden(self):
+        primero, segundo = self.creditos
+        webhook.registrar_evento(_payload('tx-a', 'PENDING', f'CUOTA-{primero.id}-1'))
+        webhook.registrar_evento(_payload('tx-a', 'APPROVED', f'CUOTA-{primero.id}-1'))
+        webhook.registrar_evento(_payload('tx-b', 'APPROVED', f'CUOTA-{segundo.id}-1'))
+
+        ids = webhook._reservar_lote(10)
+
+        eventos = WompiWebhookEvent.objects.in_bulk(ids)
+        self.assertEqual(sorted((e.transaction_id, e.status) for e in eventos.values()), [('tx-a', 'PENDING'), ('tx-b', 'APPROVED')])
+        self.assertEqual(webhook._reservar_lote(10), [])
+
+    def test_pago_aprobado_se_aplica_una_sola_vez(self):
+        credito = Credito.objects.get(pk=self.creditos[0].pk)
+        saldo_inicial = credito.saldo_pendiente
+        webhook.registrar_evento(_payload('tx-c', 'PENDING', f'CUOTA-{credito.id}-2'))
+        webhook.registrar_evento(_payload('tx-c', 'APPROVED', f'CUOTA-{credito.id}-2'))
+
+        self.assertEqual(webhook.procesar_eventos_pendientes(), {'procesados': 2, 'fallidos': 0})
+        credito.refresh_from_db()
+        saldo_tras_pago = credito.saldo_pendiente
+        self.assertLess(saldo_tras_pago, saldo_inicial)
+
+        # Reentregado tras una caída del worker: vuelve a estar listo y se procesa otra vez
+        WompiWebhookEvent.objects.filter(status='APPROVED').update(
+            estado=WompiWebhookEvent.Estado.PENDIENTE, proximo_intento=timezone.now()
+        )
+        self.assertEqual(webhook.procesar_eventos_pendientes(), {'procesados': 1, 'fallidos': 0})
+
+        pago = HistorialPago.objects.get(referencia_pago=f'CUOTA-{credito.id}-2')
+        self.assertEqual(pago.monto, Decimal('100000.00'))
+        credito.refresh_from_db()
+        self.assertEqual(credito.saldo_pendiente, saldo_tras_pago)
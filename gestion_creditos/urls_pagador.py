@@ -23,6 +23,7 @@ urlpatterns = [
     # DASHBOARD
     # ========================================
     path('', views.pagador_dashboard_view, name='dashboard'),
+    path('creditos/', views.pagador_dashboard_creditos_view, name='dashboard_creditos'),
     path('credito/<int:credito_id>/', views.pagador_detalle_credito_view, name='credito_detalle'),
     path('credito/<int:credito_id>/decision/', views.pagador_decidir_solicitud_view, name='decidir_solicitud'),
 
@@ -39,6 +40,7 @@ urlpatterns = [
     path('pago/wompi/<int:credito_id>/', views.iniciar_pago_wompi_view, name='pagar_wompi'),
     path('pago/wompi/procesar/', views.procesar_pago_wompi_view, name='procesar_pago_wompi'),
     path('pago/wompi/callback/', views.pago_wompi_callback_view, name='pago_wompi_callback'),
+    path('pago/wompi/estado/', views.pago_wompi_estado_view, name='pago_wompi_estado'),
     path('pago/wompi/resumen/<str:transaction_id>/', views.pagador_pago_resumen_wompi_view, name='pago_wompi_resumen'),
     path('pago/wompi/comprobante/<str:transaction_id>/', views.pagador_pago_comprobante_wompi_view, name='pago_wompi_comprobante'),
 
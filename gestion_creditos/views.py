@@ -1,4 +1,4 @@
-from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import uuid
 import json
@@ -9,7 +9,7 @@ from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST, require_http_methods
 from django.conf import settings
-from .models import Credito, CreditoLibranza, CreditoEmprendimiento, Empresa, HistorialPago, HistorialEstado, CuentaAhorro, MovimientoAhorro, Pagare, ZapSignWebhookLog, WompiIntent, MarketplaceItem, MarketplaceItemHistorialEstado
+from .models import Credito, CreditoLibranza, CreditoEmprendimiento, CuotaAmortizacion, Empresa, HistorialPago, HistorialEstado, CuentaAhorro, MovimientoAhorro, Pagare, ZapSignWebhookLog, WompiIntent, LotePagoMasivo, MarketplaceItem, MarketplaceItemHistorialEstado
 from .forms import CreditoLibranzaForm, CreditoEmprendimientoForm, AbonoManualAdminForm, ConsignacionOfflineForm, MarketplaceItemForm
 from . import credit_services
 from datetime import datetime, timedelta
@@ -26,7 +26,6 @@ from django.core.cache import cache
 from django.db.models import Q, Count, Sum, Max, Case, When, DecimalField, F, Subquery, Value, CharField, Avg, OuterRef
 from django.db.models.functions import Coalesce, TruncMonth, Concat, Trim
 from django.utils import timezone
-from django.core.paginator import Paginator
 from usuarios.models import PerfilPagador
 from django.contrib.admin.views.decorators import staff_member_required
 from .decorators import pagador_required, marketing_required
@@ -41,6 +40,18 @@ from .services.marketplace_service import registrar_historial_publicacion, cambi
 from .services.tasa_service import obtener_tasa_credito
 from .services.certificado_bancario_service import procesar_certificado_bancario
 from .services.libranza_rules import obtener_creditos_libranza_bloqueantes
+from .services.paginacion_service import contar_aproximado, decodificar_cursor, paginar_keyset
+from .services.busqueda_service import buscar_creditos
+from .services.simulacion_abono_service import MAX_MONTOS_SIMULACION, analizar_abono_cacheado, simular_abonos
+from .services.lote_pago_masivo_service import crear_lote as crear_lote_pago_masivo
+from .services import webhook_wompi_service
+from .services.conciliacion_wompi_service import (
+    TIPO_PAGO_CAPITAL,
+    TIPO_PAGO_CSV_MASIVO,
+    aplicar_pago_aprobado,
+    estado_para_navegador,
+    programar_conciliacion,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -584,6 +595,27 @@ def admin_dashboard_view(request):
     context = credit_services.get_admin_dashboard_context(request.user)
     return render(request, 'gestion_creditos/admin_dashboard.html', context)
 
+ADMIN_LISTADO_TAMANO_PAGINA = 20
+
+
+def _paginar_listado_admin(request, queryset, orden):
+    """
+    Página por cursor (`?cursor=`) de un listado del admin, con el total
+    aproximado y los parámetros de filtro para armar los enlaces.
+    """
+    cursor = request.GET.get('cursor')
+    pagina = paginar_keyset(queryset, orden, cursor, tamano=ADMIN_LISTADO_TAMANO_PAGINA)
+
+    parametros = request.GET.copy()
+    parametros.pop('cursor', None)
+    parametros.pop('page', None)
+    return pagina, {
+        'total_listado': contar_aproximado(queryset),
+        'es_primera_pagina': decodificar_cursor(cursor) is None,
+        'parametros_listado': parametros.urlencode(),
+    }
+
+
 @staff_member_required
 def admin_solicitudes_view(request):
     """Vista para gestionar solicitudes pendientes"""
@@ -628,13 +660,12 @@ def admin_solicitudes_view(request):
             default=Value(''),
             output_field=CharField()
         )
-    ).order_by('-fecha_solicitud')
+    )
     
-    paginator = Paginator(solicitudes, 20)
-    page_number = request.GET.get('page')
-    solicitudes_page = paginator.get_page(page_number)
+    solicitudes_page, paginacion = _paginar_listado_admin(request, solicitudes, '-fecha_solicitud')
     
     context = {
+        **paginacion,
         'solicitudes': solicitudes_page,
         'estado_filter': estado_filter,
         'linea_filter': request.GET.get('linea', ''),
@@ -652,34 +683,24 @@ def admin_creditos_activos_view(request):
     
     creditos_base = Credito.objects.filter(estado='ACTIVO')
 
-    # Calculate stats for active credits
-    stats_activos = creditos_base.aggregate(
-        total_creditos=Count('id'),
-        valor_total=Sum('saldo_pendiente'),
-        valor_promedio=Avg('monto_aprobado')
-    )
-
-    desembolsos_hoy = Credito.objects.filter(
-        estado=Credito.EstadoCredito.ACTIVO,
-        fecha_desembolso__date=timezone.now().date()
-    ).count()
+    # Estadísticas de créditos activos (cacheadas)
+    stats_activos = credit_services.obtener_stats_creditos_activos()
 
     creditos_filtrados = credit_services.filtrar_creditos(request, creditos_base)
     
     creditos = creditos_filtrados.select_related(
         'usuario', 'detalle_libranza', 'detalle_emprendimiento'
-    ).order_by('-fecha_solicitud')
+    )
     
-    paginator = Paginator(creditos, 20)
-    page_number = request.GET.get('page')
-    creditos_page = paginator.get_page(page_number)
+    creditos_page, paginacion = _paginar_listado_admin(request, creditos, '-fecha_solicitud')
     
     context = {
+        **paginacion,
         'creditos': creditos_page,
         'total_creditos_activos': stats_activos.get('total_creditos') or 0,
         'valor_total_cartera_activa': stats_activos.get('valor_total') or 0,
         'valor_promedio_credito_activo': stats_activos.get('valor_promedio') or 0,
-        'desembolsos_hoy': desembolsos_hoy,
+        'desembolsos_hoy': stats_activos.get('desembolsos_hoy') or 0,
         'linea_filter': request.GET.get('linea', ''),
         'search': request.GET.get('search', ''),
         'lineas_choices': Credito.LineaCredito.choices,
@@ -700,33 +721,15 @@ def admin_cartera_view(request):
     #? Aplicar filtros de búsqueda y línea de crédito
     creditos_filtrados = credit_services.filtrar_creditos(request, creditos_en_mora)
     
-    #? Anotaciones y ordenamiento
-    # Se calcula la diferencia entre hoy y la fecha de vencimiento para poder ordenar por ella.
-    today = timezone.now().date()
-    creditos_con_dias_mora = creditos_filtrados.annotate(
-        dias_en_mora_db=ExpressionWrapper(
-            Value(today) - F('fecha_proximo_pago'),
-            output_field=DurationField()
-        )
-    )
-
-    creditos = creditos_con_dias_mora.select_related(
+    creditos = creditos_filtrados.select_related(
         'usuario', 'detalle_libranza', 'detalle_emprendimiento'
-    ).order_by('-dias_en_mora_db') # Ordenar por el campo anotado
+    )
 
-    #? Paginación
-    paginator = Paginator(creditos, 20)
-    page_number = request.GET.get('page')
-    creditos_page = paginator.get_page(page_number)
+    #? Paginación por cursor sobre la mora desnormalizada (Credito.dias_mora)
+    creditos_page, paginacion = _paginar_listado_admin(request, creditos, '-dias_mora')
 
     #? Estadísticas de la cartera en mora
-    stats_cartera_mora = creditos_en_mora.aggregate(
-        total_creditos=Count('id'),
-        saldo_pendiente_total=Sum('saldo_pendiente'),
-        monto_original_en_mora=Sum('total_a_pagar')
-    )
-    monto_total_en_mora = credit_services.calcular_total_en_mora(creditos_en_mora)
-    stats_cartera_mora['monto_total_en_mora'] = monto_total_en_mora
+    stats_cartera_mora = dict(credit_services.obtener_stats_cartera_mora())
 
     monto_original = stats_cartera_mora.get('monto_original_en_mora') or 0
     monto_pendiente = stats_cartera_mora.get('saldo_pendiente_total') or 0
@@ -737,6 +740,7 @@ def admin_cartera_view(request):
     tasa_recuperacion = (monto_pagado / monto_original) * 100 if monto_original > 0 else 0
 
     context = {
+        **paginacion,
         'creditos': creditos_page,
         'stats': stats_cartera_mora,
         'tasa_recuperacion': round(tasa_recuperacion, 2),
@@ -974,7 +978,7 @@ def agregar_pago_manual_view(request, credito_id):
             raise ValueError("El monto debe ser positivo.")
 
         with transaction.atomic():
-            HistorialPago.objects.create(
+            pago = HistorialPago.objects.create(
                 credito=credito,
                 monto=monto_decimal,
                 referencia_pago=f"MANUAL-{credito.id}-{timezone.now().strftime('%Y%m%d%H%M%S%f')}",
@@ -985,7 +989,7 @@ def agregar_pago_manual_view(request, credito_id):
 
             if detalle:
                 #? Actualizar saldo y estado usando el helper
-                credit_services.actualizar_saldo_tras_pago(credito, monto_decimal)
+                credit_services.actualizar_saldo_tras_pago(credito, monto_decimal, pago=pago)
             
             messages.success(request, f"Abono de ${monto_decimal:,.2f} registrado exitosamente.")
 
@@ -1207,27 +1211,33 @@ def _obtener_decision_pagador(credito):
     ).order_by('-fecha').first()
 
 
-@login_required
-@pagador_required
-def pagador_dashboard_view(request):
-    """
-    Dashboard para el usuario pagador de una empresa.
-    Muestra todos los créditos de libranza de los empleados de su empresa, con filtros y ordenamiento.
-    """
-    empresa = request.empresa
+# Créditos por página del dashboard del pagador (el resto se carga con "Cargar más")
+PAGADOR_DASHBOARD_TAMANO_PAGINA = 50
 
-    #? --- Filtros y Búsqueda ---
+
+def _pagador_dashboard_filtros(request):
     search_query = request.GET.get('search', '')
     estado_filter = request.GET.get('estado', '')
     sort_by = request.GET.get('sort_by', '-monto_aprobado') # Ordenar por monto de crédito descendente por defecto
 
-    #? Subconsulta para calcular el total pagado por crédito
-    total_pagado_subquery = HistorialPago.objects.filter(
-        credito_id=F('pk'),
-        estado=HistorialPago.EstadoPago.EXITOSO
-    ).values('credito_id').annotate(total=Sum('monto')).values('total')
+    valid_sort_fields = [
+        'detalle_libranza__nombres', '-detalle_libranza__nombres',
+        'detalle_libranza__cedula', '-detalle_libranza__cedula',
+        'fecha_solicitud', '-fecha_solicitud',
+        'monto_aprobado', '-monto_aprobado',
+        'saldo_pendiente', '-saldo_pendiente',
+        'estado', '-estado'
+    ]
+    if sort_by not in valid_sort_fields:
+        sort_by = '-monto_aprobado'
+    return search_query, estado_filter, sort_by
+
 
-    #? Filtrar créditos base
+def _pagador_dashboard_creditos(empresa, search_query, estado_filter):
+    """
+    Créditos visibles en el dashboard del pagador. El total pagado y la
+    decisión del pagador ya están en el crédito, sin subconsultas por fila.
+    """
     creditos_empresa = Credito.objects.filter(
         linea=Credito.LineaCredito.LIBRANZA,
         detalle_libranza__empresa=empresa
@@ -1235,41 +1245,33 @@ def pagador_dashboard_view(request):
         estado__in=[Credito.EstadoCredito.RECHAZADO, Credito.EstadoCredito.SOLICITUD]
     ).select_related('detalle_libranza', 'usuario')
 
-    decision_pagador_qs = HistorialEstado.objects.filter(
-        credito_id=OuterRef('pk'),
-        usuario_modificacion__perfil_pagador__isnull=False,
-        estado_nuevo__in=[Credito.EstadoCredito.APROBADO_PAGADOR, Credito.EstadoCredito.RECHAZADO]
-    ).order_by('-fecha')
-
-    creditos_empresa = creditos_empresa.annotate(
-        total_pagado=Coalesce(Subquery(total_pagado_subquery, output_field=DecimalField()), Value(Decimal(0)))
-    ).annotate(
-        pagador_decision_estado=Subquery(decision_pagador_qs.values('estado_nuevo')[:1]),
-        pagador_decision_motivo=Subquery(decision_pagador_qs.values('motivo')[:1]),
-    )
-
     #? Aplicar filtros de búsqueda
     if search_query:
-        creditos_empresa = creditos_empresa.filter(
-            Q(detalle_libranza__nombres__icontains=search_query) |
-            Q(detalle_libranza__apellidos__icontains=search_query) |
-            Q(detalle_libranza__cedula__icontains=search_query)
-        )
+        creditos_empresa = buscar_creditos(creditos_empresa, search_query)
 
     if estado_filter:
         creditos_empresa = creditos_empresa.filter(estado=estado_filter)
 
-    #? Aplicar ordenamiento
-    valid_sort_fields = [
-        'detalle_libranza__nombres', '-detalle_libranza__nombres',
-        'detalle_libranza__cedula', '-detalle_libranza__cedula',
-        'fecha_solicitud', '-fecha_solicitud',
-        'monto_aprobado', '-monto_aprobado',
-        'saldo_pendiente', '-saldo_pendiente',
-        'estado', '-estado'
-    ]
-    if sort_by in valid_sort_fields:
-        creditos_empresa = creditos_empresa.order_by(sort_by)
+    return creditos_empresa
+
+
+@login_required
+@pagador_required
+def pagador_dashboard_view(request):
+    """
+    Dashboard para el usuario pagador de una empresa.
+    Muestra los créditos de libranza de los empleados de su empresa, con filtros
+    y ordenamiento, paginados por cursor (ver `pagador_dashboard_creditos_view`).
+    """
+    empresa = request.empresa
+
+    #? --- Filtros y Búsqueda ---
+    search_query, estado_filter, sort_by = _pagador_dashboard_filtros(request)
+    creditos_empresa = _pagador_dashboard_creditos(empresa, search_query, estado_filter)
+
+    pagina = paginar_keyset(
+        creditos_empresa, sort_by, request.GET.get('cursor'), tamano=PAGADOR_DASHBOARD_TAMANO_PAGINA
+    )
 
     #? Obtener y limpiar errores de la sesión
     errores_pago_masivo = request.session.pop('errores_pago_masivo', None)
@@ -1281,7 +1283,8 @@ def pagador_dashboard_view(request):
 
     context = {
         'empresa': empresa,
-        'creditos': creditos_empresa,
+        'creditos': pagina,
+        'total_creditos': contar_aproximado(creditos_empresa),
         'errores_pago_masivo': errores_pago_masivo,
         'solicitudes_pendientes_count': solicitudes_pendientes.count(),
         'search_query': search_query,
@@ -1292,6 +1295,30 @@ def pagador_dashboard_view(request):
     
     return render(request, 'pagador/pagador_dashboard.html', context)
 
+
+@login_required
+@pagador_required
+def pagador_dashboard_creditos_view(request):
+    """
+    Siguiente página de créditos del dashboard del pagador en JSON (filas y
+    modales ya renderizados) para la carga incremental.
+    """
+    from django.template.loader import render_to_string
+
+    search_query, estado_filter, sort_by = _pagador_dashboard_filtros(request)
+    creditos_empresa = _pagador_dashboard_creditos(request.empresa, search_query, estado_filter)
+    pagina = paginar_keyset(
+        creditos_empresa, sort_by, request.GET.get('cursor'), tamano=PAGADOR_DASHBOARD_TAMANO_PAGINA
+    )
+
+    context = {'creditos': pagina}
+    return JsonResponse({
+        'filas_html': render_to_string('pagador/_dashboard_filas.html', context, request=request),
+        'modales_html': render_to_string('pagador/_dashboard_modales.html', context, request=request),
+        'cantidad': len(pagina),
+        'siguiente_cursor': pagina.siguiente_cursor,
+    })
+
 @login_required
 @pagador_required
 def pagador_detalle_credito_view(request, credito_id):
@@ -1365,11 +1392,10 @@ def pagador_decidir_solicitud_view(request, credito_id):
                 .get(id=credito.id)
             )
 
-            decision_existente = _obtener_decision_pagador(credito)
-            if decision_existente:
+            if credito.pagador_decision_estado:
                 estado_actual = (
                     "aprobada"
-                    if decision_existente.estado_nuevo == Credito.EstadoCredito.APROBADO_PAGADOR
+                    if credito.pagador_decision_estado == Credito.EstadoCredito.APROBADO_PAGADOR
                     else "rechazada"
                 )
                 messages.info(request, f"La decision del pagador ya fue registrada como {estado_actual}.")
@@ -1387,6 +1413,9 @@ def pagador_decidir_solicitud_view(request, credito_id):
                 credito.save(update_fields=['monto_aprobado', 'plazo'])
 
                 motivo_final = motivo or "Aprobado por pagador y enviado directamente a firma."
+                credit_services.registrar_decision_pagador(
+                    credito, Credito.EstadoCredito.APROBADO_PAGADOR, motivo_final
+                )
                 credit_services.gestionar_cambio_estado_credito(
                     credito=credito,
                     nuevo_estado=Credito.EstadoCredito.APROBADO_PAGADOR,
@@ -1403,6 +1432,9 @@ def pagador_decidir_solicitud_view(request, credito_id):
                 )
             else:
                 motivo_final = motivo or "Rechazado por pagador."
+                credit_services.registrar_decision_pagador(
+                    credito, Credito.EstadoCredito.RECHAZADO, motivo_final
+                )
                 credit_services.gestionar_cambio_estado_credito(
                     credito=credito,
                     nuevo_estado=Credito.EstadoCredito.RECHAZADO,
@@ -1433,7 +1465,9 @@ def pagador_procesar_pagos_view(request):
         return redirect('pagador:dashboard')
 
     # Validar CSV sin aplicar pagos
-    pagos_validos, errores = credit_services.validar_csv_pagos_masivos(csv_file, empresa)
+    pagos_validos, errores, resumen = credit_services.validar_csv_pagos_masivos(
+        csv_file, empresa, incluir_resumen=True
+    )
 
     if errores:
         request.session['errores_pago_masivo'] = errores
@@ -1444,19 +1478,17 @@ def pagador_procesar_pagos_view(request):
         messages.warning(request, "No se encontraron pagos válidos en el archivo.")
         return redirect('pagador:dashboard')
 
-    # Calcular monto total
-    monto_total = sum(p['monto'] for p in pagos_validos)
-
-    # Guardar en sesión para procesarlos después del pago exitoso
-    request.session['pagos_csv_pendientes'] = [
-        {
-            'credito_id': p['credito_id'],
-            'cedula': p['cedula'],
-            'nombre': p['nombre'],
-            'monto': str(p['monto'])  # Convertir Decimal a string para JSON
-        }
-        for p in pagos_validos
-    ]
+    # El lote guarda un solo detalle por crédito con la suma de sus filas
+    credito_por_cedula = {pago['cedula']: pago['credito_id'] for pago in pagos_validos}
+    for cedula, filas in resumen['cedulas_duplicadas'].items():
+        total_cedula = resumen['totales_por_credito'][credito_por_cedula[cedula]]
+        messages.warning(
+            request,
+            f"La cédula {cedula} aparece en las filas {', '.join(str(f) for f in filas)}; "
+            f"se registrará un solo pago por ${total_cedula:,.0f} con la suma de sus montos."
+        )
+
+    monto_total = resumen['monto_total']
 
     # Obtener tokens de WOMPI
     client = WompiClient()
@@ -1469,12 +1501,23 @@ def pagador_procesar_pagos_view(request):
         messages.error(request, "Error al conectar con la pasarela de pagos. Por favor intenta más tarde.")
         return redirect('pagador:dashboard')
 
+    # El lote queda en base de datos; la sesión solo guarda su id
+    lote = crear_lote_pago_masivo(
+        empresa,
+        request.user,
+        pagos_validos,
+        resumen['totales_por_credito'],
+        referencia=f"CSV-MASIVO-{empresa.id}-{timezone.now().strftime('%Y%m%d%H%M%S%f')}",
+    )
+    request.session['lote_pago_masivo_id'] = lote.id
+
     context = {
+        'lote': lote,
         'pagos_validos': pagos_validos,
-        'cantidad_pagos': len(pagos_validos),
+        'cantidad_pagos': lote.cantidad_pagos,
         'monto_total': int(monto_total),
         'monto_total_centavos': int(monto_total * 100),
-        'referencia_pago': f"CSV-MASIVO-{timezone.now().strftime('%Y%m%d%H%M%S')}",
+        'referencia_pago': lote.referencia,
         'acceptance_token': acceptance_token,
         'bancos_pse': bancos_pse,
         'customer_email': empresa.correo_contacto if hasattr(empresa, 'correo_contacto') else request.user.email,
@@ -1493,11 +1536,7 @@ def _build_pagador_creditos_queryset(empresa, search_query='', estado_filter='',
     ).select_related('detalle_libranza', 'usuario', 'pagare')
 
     if search_query:
-        creditos = creditos.filter(
-            Q(detalle_libranza__nombres__icontains=search_query) |
-            Q(detalle_libranza__apellidos__icontains=search_query) |
-            Q(detalle_libranza__cedula__icontains=search_query)
-        )
+        creditos = buscar_creditos(creditos, search_query)
 
     if estado_filter:
         creditos = creditos.filter(estado=estado_filter)
@@ -1512,22 +1551,88 @@ def _build_pagador_creditos_queryset(empresa, search_query='', estado_filter='',
     if sort_by in valid_sort_fields:
         creditos = creditos.order_by(sort_by)
 
-    return creditos.annotate(
-        total_pagado=Coalesce(
-            Sum(
-                'historial_pagos__monto',
-                filter=Q(historial_pagos__estado=HistorialPago.EstadoPago.EXITOSO)
-            ),
-            Value(Decimal(0))
-        ),
-        ultimo_pago=Max(
-            'historial_pagos__fecha_pago',
-            filter=Q(historial_pagos__estado=HistorialPago.EstadoPago.EXITOSO)
-        )
+    return creditos
+
+
+# Filas que se traen por consulta al generar el reporte del pagador
+PAGADOR_REPORTE_CHUNK_SIZE = 500
+# Bytes del XLSX que se mantienen en memoria antes de pasarlo a disco
+PAGADOR_REPORTE_XLSX_MEMORIA = 5 * 1024 * 1024
+
+
+class _EchoBuffer:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def _resolver_url_archivo(request):
+    """
+    Devuelve una función que convierte un FileField en URL absoluta, calculando
+    el origen del request una sola vez en lugar de `build_absolute_uri` por campo.
+    """
+    origen = request.build_absolute_uri('/').rstrip('/')
+
+    def _file_url(file_field):
+        if not file_field:
+            return ''
+        try:
+            url = file_field.url
+        except (ValueError, AttributeError):
+            return file_field.name
+        return f'{origen}{url}' if url.startswith('/') else url
+
+    return _file_url
+
+
+def _respuesta_csv_streaming(filename, headers, rows, prefijo='\ufeff'):
+    """CSV que se envía fila por fila a medida que `rows` las produce."""
+    import csv
+
+    writer = csv.writer(_EchoBuffer())
+
+    def _csv_lines():
+        yield prefijo
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(_csv_lines(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def _respuesta_xlsx(filename, sheet_title, headers, rows):
+    """
+    XLSX en modo write-only: openpyxl escribe las filas a disco a medida que
+    llegan y el archivo final pasa a disco si supera PAGADOR_REPORTE_XLSX_MEMORIA.
+    """
+    import tempfile
+    from openpyxl import Workbook
+
+    archivo = tempfile.SpooledTemporaryFile(max_size=PAGADOR_REPORTE_XLSX_MEMORIA)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(archivo)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
     )
 
 
 def _pagador_report_rows(request, creditos, empresa, report_type):
+    """
+    Encabezados y filas del reporte del pagador. Las filas se generan a medida
+    que se recorren los créditos (por bloques de `PAGADOR_REPORTE_CHUNK_SIZE`),
+    sin armar el reporte completo en memoria.
+    """
     def _fmt_dt(value):
         if not value:
             return ''
@@ -1539,13 +1644,7 @@ def _pagador_report_rows(request, creditos, empresa, report_type):
     def _fmt_decimal(value):
         return f'{value}' if value is not None else ''
 
-    def _file_url(file_field):
-        if not file_field:
-            return ''
-        try:
-            return request.build_absolute_uri(file_field.url)
-        except (ValueError, AttributeError):
-            return file_field.name
+    _file_url = _resolver_url_archivo(request)
 
     headers_completo = [
         'Empresa', 'Numero credito', 'Estado', 'Linea', 'Fecha solicitud', 'Fecha actualizacion',
@@ -1565,8 +1664,11 @@ def _pagador_report_rows(request, creditos, empresa, report_type):
         'Telefono', 'Pagare estado', 'Pagare fecha firma',
     ]
 
-    rows = []
-    for credito in creditos:
+    def _rows():
+        for credito in creditos.iterator(chunk_size=PAGADOR_REPORTE_CHUNK_SIZE):
+            yield _row(credito)
+
+    def _row(credito):
         detalle = credito.detalle_libranza
         usuario = credito.usuario
         try:
@@ -1639,9 +1741,9 @@ def _pagador_report_rows(request, creditos, empresa, report_type):
             pagare.get_estado_display() if pagare else '',
             _fmt_dt(pagare.fecha_firma) if pagare else '',
         ]
-        rows.append(row_reducido if report_type == 'reducido' else row_completo)
+        return row_reducido if report_type == 'reducido' else row_completo
 
-    return (headers_reducido if report_type == 'reducido' else headers_completo), rows
+    return (headers_reducido if report_type == 'reducido' else headers_completo), _rows()
 
 
 @login_required
@@ -1650,60 +1752,52 @@ def descargar_csv_cuotas_pendientes_view(request):
     """
     Genera y descarga cuotas pendientes en CSV o XLSX.
     """
-    import csv
+    from decimal import ROUND_CEILING
 
     empresa = request.empresa
     formato = (request.GET.get('formato') or 'csv').strip().lower()
     if formato not in {'csv', 'xlsx'}:
         formato = 'csv'
 
+    # Saldo de la próxima cuota sin pagar de cada crédito, resuelto en la misma consulta
+    saldo_siguiente_cuota = CuotaAmortizacion.objects.filter(
+        credito=OuterRef('pk'),
+        pagada=False
+    ).order_by('numero_cuota').annotate(
+        saldo=ExpressionWrapper(
+            F('valor_cuota') - Coalesce(F('monto_pagado'), Value(Decimal('0.00'))),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+    ).values('saldo')[:1]
+
     creditos = Credito.objects.filter(
         linea=Credito.LineaCredito.LIBRANZA,
         detalle_libranza__empresa=empresa,
         estado__in=[Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]
-    ).select_related('detalle_libranza').order_by('detalle_libranza__cedula')
-
-    from decimal import Decimal, ROUND_CEILING
-    rows = []
-    for credito in creditos:
-        cedula = str(credito.detalle_libranza.cedula)
-
-        cuota = credito.tabla_amortizacion.filter(pagada=False).order_by('numero_cuota').first()
-        if cuota:
-            valor = cuota.valor_cuota - (cuota.monto_pagado or Decimal('0.00'))
-        else:
-            valor = credito.valor_cuota or Decimal('0.00')
+    ).annotate(
+        saldo_cuota=Subquery(saldo_siguiente_cuota)
+    ).order_by('detalle_libranza__cedula').values_list(
+        'detalle_libranza__cedula', 'saldo_cuota', 'valor_cuota'
+    )
 
-        if valor < 0:
-            valor = Decimal('0.00')
+    def _rows():
+        for cedula, saldo_cuota, valor_cuota in creditos.iterator(chunk_size=PAGADOR_REPORTE_CHUNK_SIZE):
+            if saldo_cuota is not None:
+                valor = saldo_cuota
+            else:
+                valor = valor_cuota or Decimal('0.00')
 
-        monto = int(valor.to_integral_value(rounding=ROUND_CEILING))
+            if valor < 0:
+                valor = Decimal('0.00')
 
-        rows.append([cedula, monto])
+            yield [str(cedula), int(valor.to_integral_value(rounding=ROUND_CEILING))]
 
     filename = f'cuotas_pendientes_{empresa.nombre}_{timezone.now().strftime("%Y%m%d")}'
+    headers = ['cedula', 'monto_a_pagar']
     if formato == 'xlsx':
-        from openpyxl import Workbook
+        return _respuesta_xlsx(filename, 'Cuotas pendientes', headers, _rows())
 
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
-        workbook = Workbook(write_only=True)
-        sheet = workbook.create_sheet(title='Cuotas pendientes')
-        sheet.append(['cedula', 'monto_a_pagar'])
-        for row in rows:
-            sheet.append(row)
-        workbook.save(response)
-        return response
-
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-    response.write('\ufeffsep=,\n')
-    writer = csv.writer(response)
-    writer.writerow(['cedula', 'monto_a_pagar'])
-    writer.writerows(rows)
-    return response
+    return _respuesta_csv_streaming(filename, headers, _rows(), prefijo='\ufeffsep=,\n')
 
 
 @login_required
@@ -1712,8 +1806,6 @@ def descargar_reporte_pagador_view(request):
     """
     Genera y descarga un reporte completo de los creditos de libranza de la empresa.
     """
-    import csv
-
     empresa = request.empresa
     search_query = request.GET.get('search', '').strip()
     estado_filter = request.GET.get('estado', '').strip()
@@ -1732,27 +1824,9 @@ def descargar_reporte_pagador_view(request):
     filename = f'reporte_pagador_{report_type}_{empresa.nombre}_{timezone.now().strftime("%Y%m%d")}'
 
     if formato == 'xlsx':
-        from openpyxl import Workbook
+        return _respuesta_xlsx(filename, 'Reporte pagador', headers, rows)
 
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
-        workbook = Workbook(write_only=True)
-        sheet = workbook.create_sheet(title='Reporte pagador')
-        sheet.append(headers)
-        for row in rows:
-            sheet.append(row)
-        workbook.save(response)
-        return response
-
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-    response.write('\ufeff')
-    writer = csv.writer(response)
-    writer.writerow(headers)
-    writer.writerows(rows)
-    return response
+    return _respuesta_csv_streaming(filename, headers, rows)
 
 
 @login_required
@@ -1802,7 +1876,7 @@ def procesar_pago_callback_view(request):
                 monto_decimal = Decimal(monto_limpio)
                 
                 #! Crear el registro del pago
-                HistorialPago.objects.create(
+                pago = HistorialPago.objects.create(
                     credito=credito,
                     monto=monto_decimal,
                     referencia_pago=referencia,
@@ -1810,7 +1884,7 @@ def procesar_pago_callback_view(request):
                 )
 
                 #! Actualizar saldo y estado usando el helper
-                credit_services.actualizar_saldo_tras_pago(credito, monto_decimal)
+                credit_services.actualizar_saldo_tras_pago(credito, monto_decimal, pago=pago)
                 
                 messages.success(request, f"Pago de ${monto_decimal:,.2f} para el crédito #{credito.id} procesado exitosamente.")
 
@@ -1828,23 +1902,11 @@ def procesar_pago_callback_view(request):
 #? VISTAS DE WOMPI - PASARELA DE PAGOS
 #? ============================================================================
 
-def _map_wompi_status_to_intent(status):
-    if not status:
-        return WompiIntent.Estado.PENDING
-    normalized = str(status).upper()
-    if normalized in {
-        WompiIntent.Estado.CREATED,
-        WompiIntent.Estado.PENDING,
-        WompiIntent.Estado.APPROVED,
-        WompiIntent.Estado.DECLINED,
-        WompiIntent.Estado.ERROR,
-        WompiIntent.Estado.EXPIRED,
-    }:
-        return normalized
-    if normalized in {'VOIDED', 'EXPIRED'}:
-        return WompiIntent.Estado.EXPIRED
-    return WompiIntent.Estado.PENDING
-
+# Sondeos del estado (cada 4 s) antes de dejar la página de espera
+WOMPI_ESPERA_MAX_SONDEOS = 45
+WOMPI_MENSAJE_PAGO_EN_CONFIRMACION = (
+    'Seguimos confirmando tu pago con Wompi. Se aplicara automaticamente cuando sea aprobado.'
+)
 
 def _parse_wompi_datetime(value):
     if not value:
@@ -1885,10 +1947,7 @@ def _get_metodo_pago_wompi(transaction_data):
 
 
 def _enviar_resumen_pago_pagador(request, credito, transaction_data):
-    try:
-        from gestion_creditos.email_service import enviar_confirmacion_pago
-    except Exception:
-        return
+    from gestion_creditos.services.correo_saliente_service import encolar_confirmacion_pago
 
     pagador_email = request.user.email
     if not pagador_email:
@@ -1896,9 +1955,6 @@ def _enviar_resumen_pago_pagador(request, credito, transaction_data):
 
     transaction_id = transaction_data.get('id')
     reference = transaction_data.get('reference')
-    cache_key = f"wompi:pagador:email:{reference or transaction_id}:{pagador_email}"
-    if not cache.add(cache_key, True, timeout=86400):
-        return
 
     monto_pagado = Decimal(transaction_data.get('amount_in_cents', 0)) / 100
     metodo_pago, banco = _get_metodo_pago_wompi(transaction_data)
@@ -1909,10 +1965,12 @@ def _enviar_resumen_pago_pagador(request, credito, transaction_data):
         reverse('pagador:pago_wompi_resumen', kwargs={'transaction_id': transaction_id})
     ) if transaction_id else request.build_absolute_uri(reverse('pagador:dashboard'))
 
-    enviar_confirmacion_pago(
+    # La bandeja de salida deduplica por (destinatario, clave)
+    encolar_confirmacion_pago(
         credito,
         monto_pagado,
         credito.saldo_pendiente or Decimal('0.00'),
+        clave=f"wompi-pagador:{reference or transaction_id}",
         destinatario=pagador_email,
         nombre_destinatario=request.user.get_full_name() or request.user.username,
         referencia=reference,
@@ -2217,6 +2275,7 @@ def procesar_pago_wompi_emprendimiento_view(request):
             amount_in_cents=amount_in_cents,
             payment_method=payment_method_type,
             status=WompiIntent.Estado.CREATED,
+            tipo_pago=tipo_pago,
             usuario=request.user,
             ip_address=client_ip,
             user_agent=user_agent,
@@ -2281,11 +2340,7 @@ def procesar_pago_wompi_emprendimiento_view(request):
         transaction_data = transaction.get('data', {})
         transaction_id = transaction_data.get('id')
         transaction_status = transaction_data.get('status')
-        if intent:
-            intent.status = _map_wompi_status_to_intent(transaction_status)
-            if transaction_id:
-                intent.wompi_transaction_id = transaction_id
-            intent.save(update_fields=['status', 'wompi_transaction_id', 'updated_at'])
+        programar_conciliacion(intent, transaction_id, transaction_status)
 
         request.session['wompi_transaction_id_empr'] = transaction_data.get('id')
         request.session['wompi_credito_id_empr'] = credito_id
@@ -2308,27 +2363,10 @@ def procesar_pago_wompi_emprendimiento_view(request):
 
         status = transaction_status
         if status == 'APPROVED':
-            if tipo_pago == 'CAPITAL':
-                if not HistorialPago.objects.filter(referencia_pago=reference).exists():
-                    credit_services.aplicar_abono_credito(
-                        credito=credito,
-                        monto_abono=monto_decimal,
-                        tipo_abono='CAPITAL',
-                        usuario=request.user,
-                        referencia_pago=reference
-                    )
+            aplicar_pago_aprobado(intent.id, transaction_data)
+            if tipo_pago == TIPO_PAGO_CAPITAL:
                 messages.success(request, f'Abono a capital de ${monto_decimal:,.2f} aplicado exitosamente.')
             else:
-                pago, created = HistorialPago.objects.get_or_create(
-                    referencia_pago=reference,
-                    defaults={
-                        'credito': credito,
-                        'monto': monto_decimal,
-                        'estado': HistorialPago.EstadoPago.EXITOSO,
-                    }
-                )
-                if created:
-                    credit_services.actualizar_saldo_tras_pago(credito, monto_decimal)
                 messages.success(request, f'Pago de ${monto_decimal:,.2f} procesado exitosamente.')
             return redirect('emprendimiento:mi_credito_detalle', credito_id=credito.id)
         if status == 'DECLINED':
@@ -2357,112 +2395,88 @@ def procesar_pago_wompi_emprendimiento_view(request):
         return redirect('emprendimiento:mi_credito')
 
 
+def _intent_wompi_del_usuario(request, transaction_id):
+    if not transaction_id:
+        return None
+    return WompiIntent.objects.filter(
+        wompi_transaction_id=transaction_id,
+        usuario=request.user,
+    ).order_by('-created_at').first()
+
+
+def _pagina_espera_wompi(request, intent, template, namespace):
+    """
+    Página que espera la conciliación del pago. Pide una consulta inmediata
+    (una por ventana de 10 s aunque el usuario recargue) y luego solo sondea
+    el estado guardado.
+    """
+    from .tasks import conciliar_pagos_wompi_task
+
+    if cache.add(f'wompi:conciliar:{intent.id}', True, timeout=10):
+        try:
+            conciliar_pagos_wompi_task.delay(intent.id)
+        except Exception as e:
+            # La tarea periódica de conciliación lo tomará en su siguiente ciclo
+            logger.error(f"No se pudo programar la conciliación del intento {intent.id}: {e}")
+
+    resultado_url = reverse(f'{namespace}:pago_wompi_callback')
+    return render(request, template, {
+        'estado_url': f"{reverse(f'{namespace}:pago_wompi_estado')}?id={intent.wompi_transaction_id}",
+        'resultado_url': f"{resultado_url}?id={intent.wompi_transaction_id}&fin=1",
+        'attempts_left': WOMPI_ESPERA_MAX_SONDEOS,
+    })
+
+
 @login_required
 @require_http_methods(["GET"])
-def pago_wompi_emprendimiento_callback_view(request):
+def pago_wompi_estado_view(request):
     """
-    Callback de WOMPI para clientes de emprendimiento.
+    Estado de un pago Wompi para la página de espera. Solo lee el intento;
+    la consulta a Wompi y la aplicación del pago las hace el worker.
     """
-    from .services.wompi_client import WompiClient, WompiAPIException
+    intent = _intent_wompi_del_usuario(request, request.GET.get('id'))
+    if not intent:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse(estado_para_navegador(intent))
+
 
+@login_required
+@require_http_methods(["GET"])
+def pago_wompi_emprendimiento_callback_view(request):
+    """
+    Callback de WOMPI para clientes de emprendimiento. El pago lo concilia
+    `conciliar_pagos_wompi_task`; aquí solo se muestra su estado.
+    """
     transaction_id = request.GET.get('id') or request.session.get('wompi_transaction_id_empr')
+    intent = _intent_wompi_del_usuario(request, transaction_id)
 
-    if not transaction_id:
+    if not intent:
         messages.error(request, 'No se encontro informacion de la transaccion.')
         return redirect('emprendimiento:mi_credito')
 
-    client = WompiClient()
-
-    try:
-        transaction = client.get_transaction(transaction_id)
-        transaction_data = transaction.get('data', {})
-        status = transaction_data.get('status')
-
-        if transaction_id:
-            WompiIntent.objects.filter(wompi_transaction_id=transaction_id).update(
-                status=_map_wompi_status_to_intent(status)
-            )
-
-        try:
-            attempt = int(request.GET.get('attempt', 0))
-        except (TypeError, ValueError):
-            attempt = 0
-        max_attempts = 12
-
-        if status not in ['APPROVED', 'DECLINED']:
-            if attempt < max_attempts:
-                refresh_url = f"{reverse('emprendimiento:pago_wompi_callback')}?wait=1&attempt={attempt + 1}&id={transaction_id}"
-                return render(request, 'usuariocreditos/pago_wompi_espera.html', {
-                    'refresh_url': refresh_url,
-                    'attempts_left': max_attempts - attempt,
-                })
-            messages.warning(request, f'El pago esta en estado: {status}')
-            request.session.pop('wompi_transaction_id_empr', None)
-            request.session.pop('wompi_credito_id_empr', None)
-            request.session.pop('wompi_reference_empr', None)
-            request.session.pop('wompi_tipo_pago_empr', None)
-            return redirect('emprendimiento:mi_credito')
+    estado = estado_para_navegador(intent)
+    if not estado['finalizado'] and not request.GET.get('fin'):
+        return _pagina_espera_wompi(request, intent, 'usuariocreditos/pago_wompi_espera.html', 'emprendimiento')
 
-        credito_id = request.session.get('wompi_credito_id_empr')
-        reference = request.session.get('wompi_reference_empr') or transaction_data.get('reference')
-        tipo_pago = (request.session.get('wompi_tipo_pago_empr') or 'CUOTA').upper()
+    request.session.pop('wompi_transaction_id_empr', None)
+    request.session.pop('wompi_credito_id_empr', None)
+    request.session.pop('wompi_reference_empr', None)
+    request.session.pop('wompi_tipo_pago_empr', None)
 
-        if not credito_id and reference and '-' in reference:
-            parts = reference.split('-')
-            if len(parts) >= 2:
-                credito_id = parts[1]
-
-        if not credito_id:
-            messages.error(request, 'Sesion expirada. Por favor intenta de nuevo.')
-            return redirect('emprendimiento:mi_credito')
-
-        credito = get_object_or_404(
-            Credito,
-            id=credito_id,
-            linea=Credito.LineaCredito.EMPRENDIMIENTO,
-            usuario=request.user
-        )
-
-        if status == 'APPROVED':
-            monto_decimal = Decimal(transaction_data.get('amount_in_cents', 0)) / 100
-            if tipo_pago == 'CAPITAL':
-                if reference and not HistorialPago.objects.filter(referencia_pago=reference).exists():
-                    credit_services.aplicar_abono_credito(
-                        credito=credito,
-                        monto_abono=monto_decimal,
-                        tipo_abono='CAPITAL',
-                        usuario=request.user,
-                        referencia_pago=reference
-                    )
-                messages.success(request, f'Abono a capital de ${monto_decimal:,.2f} aplicado exitosamente.')
-            else:
-                pago, created = HistorialPago.objects.get_or_create(
-                    referencia_pago=reference,
-                    defaults={
-                        'credito': credito,
-                        'monto': monto_decimal,
-                        'estado': HistorialPago.EstadoPago.EXITOSO,
-                    }
-                )
-                if created:
-                    credit_services.actualizar_saldo_tras_pago(credito, monto_decimal)
-                messages.success(request, f'Pago de ${monto_decimal:,.2f} procesado exitosamente.')
-        elif status == 'DECLINED':
-            messages.error(request, 'El pago fue rechazado.')
+    monto_decimal = Decimal(intent.amount_in_cents) / 100
+    if estado['aplicado']:
+        if intent.tipo_pago == TIPO_PAGO_CAPITAL:
+            messages.success(request, f'Abono a capital de ${monto_decimal:,.2f} aplicado exitosamente.')
         else:
-            messages.warning(request, f'El pago esta en estado: {status}')
-
-        request.session.pop('wompi_transaction_id_empr', None)
-        request.session.pop('wompi_credito_id_empr', None)
-        request.session.pop('wompi_reference_empr', None)
-        request.session.pop('wompi_tipo_pago_empr', None)
-
-        return redirect('emprendimiento:mi_credito_detalle', credito_id=credito.id)
+            messages.success(request, f'Pago de ${monto_decimal:,.2f} procesado exitosamente.')
+    elif intent.status == WompiIntent.Estado.DECLINED:
+        messages.error(request, 'El pago fue rechazado.')
+    elif estado['finalizado']:
+        messages.warning(request, f'El pago esta en estado: {intent.status}')
+    else:
+        messages.warning(request, WOMPI_MENSAJE_PAGO_EN_CONFIRMACION)
 
-    except WompiAPIException as e:
-        logger.error(f'Error al consultar transaccion: {str(e)}')
-        messages.error(request, 'Error al verificar el estado del pago.')
-        return redirect('emprendimiento:mi_credito')
+    return redirect('emprendimiento:mi_credito_detalle', credito_id=intent.credito_id)
 
 
 @login_required
@@ -2493,6 +2507,22 @@ def procesar_pago_wompi_view(request):
         acceptance_token = payload.get('acceptance_token')
         tipo_pago = (payload.get('tipo_pago') or '').upper()
 
+        lote = None
+        if tipo_pago == TIPO_PAGO_CSV_MASIVO:
+            lote = LotePagoMasivo.objects.filter(
+                id=payload.get('lote_id') or request.session.get('lote_pago_masivo_id'),
+                empresa=request.empresa,
+                estado=LotePagoMasivo.Estado.VALIDADO,
+            ).first()
+            if not lote or str(amount_in_cents_raw) != str(int(lote.monto_total * 100)):
+                if wants_json:
+                    return JsonResponse({'error': 'Invalid payment batch'}, status=400)
+                messages.error(request, 'El lote de pagos no es valido o ya fue procesado.')
+                return redirect('pagador:dashboard')
+            # El intento se asocia al primer crédito del lote; el lote lleva el resto
+            reference = lote.referencia
+            credito_id = credito_id or lote.detalles.values_list('credito_id', flat=True).first()
+
         if not amount_in_cents_raw or not reference or not credito_id:
             if wants_json:
                 return JsonResponse({'error': 'Missing payment data'}, status=400)
@@ -2640,6 +2670,8 @@ def procesar_pago_wompi_view(request):
             amount_in_cents=amount_in_cents,
             payment_method=payment_method_type,
             status=WompiIntent.Estado.CREATED,
+            tipo_pago=tipo_pago,
+            lote=lote,
             usuario=request.user,
             ip_address=client_ip,
             user_agent=user_agent,
@@ -2706,11 +2738,7 @@ def procesar_pago_wompi_view(request):
         transaction_data = transaction.get('data', {})
         transaction_id = transaction_data.get('id')
         transaction_status = transaction_data.get('status')
-        if intent:
-            intent.status = _map_wompi_status_to_intent(transaction_status)
-            if transaction_id:
-                intent.wompi_transaction_id = transaction_id
-            intent.save(update_fields=['status', 'wompi_transaction_id', 'updated_at'])
+        programar_conciliacion(intent, transaction_id, transaction_status)
 
         request.session['wompi_transaction_id'] = transaction_data.get('id')
         request.session['credito_id'] = credito_id
@@ -2736,17 +2764,8 @@ def procesar_pago_wompi_view(request):
 
         status = transaction_status
         if status == 'APPROVED':
-            pago, created = HistorialPago.objects.get_or_create(
-                referencia_pago=reference,
-                defaults={
-                    'credito': credito,
-                    'monto': monto_decimal,
-                    'estado': HistorialPago.EstadoPago.EXITOSO,
-                }
-            )
-            if created:
-                credit_services.actualizar_saldo_tras_pago(credito, monto_decimal)
-            if tipo_pago != 'MASIVO':
+            aplicar_pago_aprobado(intent.id, transaction_data)
+            if tipo_pago not in ('MASIVO', TIPO_PAGO_CSV_MASIVO):
                 credito.refresh_from_db()
                 _enviar_resumen_pago_pagador(request, credito, transaction_data)
             if wants_json:
@@ -2788,141 +2807,61 @@ def procesar_pago_wompi_view(request):
         return redirect('pagador:dashboard')
 
 
+@login_required
 @require_http_methods(["GET"])
 def pago_wompi_callback_view(request):
     """
-    Callback despues de que el usuario completa el pago en WOMPI (PSE, Nequi, Bancolombia)
+    Callback despues de que el usuario completa el pago en WOMPI (PSE, Nequi, Bancolombia).
+    El pago (incluido el lote de un CSV masivo) lo concilia `conciliar_pagos_wompi_task`;
+    aquí solo se muestra su estado.
     """
-    from .services.wompi_client import WompiClient, WompiAPIException
-
     transaction_id = request.GET.get('id') or request.session.get('wompi_transaction_id')
+    intent = _intent_wompi_del_usuario(request, transaction_id)
 
-    if not transaction_id:
+    if not intent:
         messages.error(request, 'No se encontro informacion de la transaccion.')
         return redirect('pagador:dashboard')
 
-    client = WompiClient()
-
-    try:
-        wompi_transaction = client.get_transaction(transaction_id)
-        transaction_data = wompi_transaction.get('data', {})
-        status = transaction_data.get('status')
-
-        if transaction_id:
-            WompiIntent.objects.filter(wompi_transaction_id=transaction_id).update(
-                status=_map_wompi_status_to_intent(status)
-            )
-
-        try:
-            attempt = int(request.GET.get('attempt', 0))
-        except (TypeError, ValueError):
-            attempt = 0
-        max_attempts = 12
-
-        if status not in ['APPROVED', 'DECLINED']:
-            if attempt < max_attempts:
-                refresh_url = f"{reverse('pagador:pago_wompi_callback')}?wait=1&attempt={attempt + 1}&id={transaction_id}"
-                return render(request, 'pagador/pago_wompi_espera.html', {
-                    'refresh_url': refresh_url,
-                    'attempts_left': max_attempts - attempt,
-                })
-            messages.warning(request, f'El pago esta en estado: {status}')
-            request.session.pop('pagos_csv_pendientes', None)
-            request.session.pop('wompi_transaction_id', None)
-            request.session.pop('reference', None)
-            request.session.pop('credito_id', None)
-            return redirect('pagador:dashboard')
-
-        pagos_csv_pendientes = request.session.get('pagos_csv_pendientes')
-
-        if pagos_csv_pendientes:
-            reference = request.session.get('reference', f"CSV-MASIVO-{timezone.now().strftime('%Y%m%d%H%M%S')}")
-
-            if status == 'APPROVED':
-                monto_total = Decimal(transaction_data.get('amount_in_cents', 0)) / 100
-                pagos_exitosos = 0
-
-                with transaction.atomic():
-                    for pago_info in pagos_csv_pendientes:
-                        credito = Credito.objects.filter(id=pago_info['credito_id']).first()
-                        if credito:
-                            monto_pago = Decimal(pago_info['monto'])
-
-                            pago, created = HistorialPago.objects.get_or_create(
-                                referencia_pago=f"{reference}-{credito.id}",
-                                defaults={
-                                    'credito': credito,
-                                    'monto': monto_pago,
-                                    'estado': HistorialPago.EstadoPago.EXITOSO,
-                                }
-                            )
-
-                            if created:
-                                credit_services.actualizar_saldo_tras_pago(credito, monto_pago)
-                                pagos_exitosos += 1
-
-                messages.success(
-                    request,
-                    f'Pago masivo procesado exitosamente. Se aplicaron {pagos_exitosos} pagos por un total de ${monto_total:,.2f}'
-                )
-            elif status == 'DECLINED':
-                messages.error(request, 'El pago fue rechazado. No se aplicaron los pagos del CSV.')
-            else:
-                messages.warning(request, f'El pago esta en estado: {status}')
-
-            request.session.pop('pagos_csv_pendientes', None)
-            request.session.pop('wompi_transaction_id', None)
-            request.session.pop('reference', None)
+    estado = estado_para_navegador(intent)
+    if not estado['finalizado'] and not request.GET.get('fin'):
+        return _pagina_espera_wompi(request, intent, 'pagador/pago_wompi_espera.html', 'pagador')
 
-            return redirect('pagador:dashboard')
-
-        credito_id = request.session.get('credito_id')
-        reference = request.session.get('reference') or transaction_data.get('reference')
-
-        if not credito_id and reference and '-' in reference:
-            parts = reference.split('-')
-            if len(parts) >= 2:
-                credito_id = parts[1]
-
-        if not credito_id:
-            messages.error(request, 'Sesion expirada. Por favor intenta de nuevo.')
-            return redirect('pagador:dashboard')
-
-        credito = get_object_or_404(Credito, id=credito_id)
+    request.session.pop('lote_pago_masivo_id', None)
+    request.session.pop('wompi_transaction_id', None)
+    request.session.pop('reference', None)
+    request.session.pop('credito_id', None)
 
-        if status == 'APPROVED':
-            monto_decimal = Decimal(transaction_data.get('amount_in_cents', 0)) / 100
-            pago, created = HistorialPago.objects.get_or_create(
-                referencia_pago=reference,
-                defaults={
-                    'credito': credito,
-                    'monto': monto_decimal,
-                    'estado': HistorialPago.EstadoPago.EXITOSO,
-                }
+    if intent.tipo_pago == TIPO_PAGO_CSV_MASIVO:
+        if estado['aplicado']:
+            monto_total = Decimal(intent.amount_in_cents) / 100
+            messages.success(
+                request,
+                f'Pago masivo procesado exitosamente. Se aplicaron {intent.lote.cantidad_pagos} pagos '
+                f'por un total de ${monto_total:,.2f}'
             )
-            if created:
-                credit_services.actualizar_saldo_tras_pago(credito, monto_decimal)
-            credito.refresh_from_db()
-            _enviar_resumen_pago_pagador(request, credito, transaction_data)
-            messages.success(request, f'Pago de ${monto_decimal:,.2f} procesado exitosamente.')
-        elif status == 'DECLINED':
-            messages.error(request, 'El pago fue rechazado.')
+        elif intent.status == WompiIntent.Estado.DECLINED:
+            messages.error(request, 'El pago fue rechazado. No se aplicaron los pagos del CSV.')
+        elif estado['finalizado']:
+            messages.warning(request, f'El pago esta en estado: {intent.status}')
         else:
-            messages.warning(request, f'El pago esta en estado: {status}')
-
-        request.session.pop('wompi_transaction_id', None)
-        request.session.pop('credito_id', None)
-        request.session.pop('reference', None)
-
-        if status == 'APPROVED':
-            return redirect('pagador:pago_wompi_resumen', transaction_id=transaction_id)
-        return redirect('pagador:credito_detalle', credito_id=credito.id)
-
-    except WompiAPIException as e:
-        logger.error(f'Error al consultar transaccion: {str(e)}')
-        messages.error(request, 'Error al verificar el estado del pago.')
+            messages.warning(request, WOMPI_MENSAJE_PAGO_EN_CONFIRMACION)
         return redirect('pagador:dashboard')
 
+    if estado['aplicado']:
+        credito = Credito.objects.get(id=intent.credito_id)
+        _enviar_resumen_pago_pagador(request, credito, intent.datos_transaccion or {})
+        monto_decimal = Decimal(intent.amount_in_cents) / 100
+        messages.success(request, f'Pago de ${monto_decimal:,.2f} procesado exitosamente.')
+        return redirect('pagador:pago_wompi_resumen', transaction_id=intent.wompi_transaction_id)
+
+    if intent.status == WompiIntent.Estado.DECLINED:
+        messages.error(request, 'El pago fue rechazado.')
+    elif estado['finalizado']:
+        messages.warning(request, f'El pago esta en estado: {intent.status}')
+    else:
+        messages.warning(request, WOMPI_MENSAJE_PAGO_EN_CONFIRMACION)
+    return redirect('pagador:credito_detalle', credito_id=intent.credito_id)
+
 
 @login_required
 @pagador_required
@@ -3143,115 +3082,22 @@ def wompi_webhook_view(request):
     Eventos que maneja:
     - transaction.updated: Cuando una transacción cambia de estado
 
+    Solo verifica la firma, guarda el evento en la bandeja de entrada
+    (`WompiWebhookEvent`) y responde 200 de inmediato; el pago se aplica en
+    Celery (`webhook_wompi_service`). Los reenvíos del mismo evento se ignoran.
+
     IMPORTANTE: Este endpoint debe estar accesible públicamente sin autenticación
     para que WOMPI pueda enviar las notificaciones.
     """
-    from .services.wompi_client import WompiClient
-    import hashlib
-    import hmac
-
     try:
-        # Leer el cuerpo de la petición
-        import json
         payload = json.loads(request.body.decode('utf-8'))
 
         # Validar la firma del webhook (integridad del mensaje)
-        # Según documentación de Wompi:
-        # checksum = SHA256(properties concatenadas en orden + timestamp + events_secret)
-        signature_data = payload.get('signature', {})
-        received_checksum = signature_data.get('checksum', '')
-        properties = signature_data.get('properties', [])
-        timestamp = payload.get('timestamp', '')
-
-        # Construir la cadena concatenando los valores de las propiedades
-        transaction_data = payload.get('data', {}).get('transaction', {})
-        concat_values = ''
-        for prop in properties:
-            # prop tiene formato "transaction.id", "transaction.status", etc.
-            field_name = prop.replace('transaction.', '')
-            value = transaction_data.get(field_name, '')
-            concat_values += str(value)
-
-        # Agregar timestamp y events_secret
-        events_secret = getattr(settings, 'WOMPI_EVENTS_SECRET', '')
-        string_to_hash = f"{concat_values}{timestamp}{events_secret}"
-
-        # Calcular el checksum esperado
-        expected_checksum = hashlib.sha256(string_to_hash.encode('utf-8')).hexdigest()
-
-        if not hmac.compare_digest(received_checksum, expected_checksum):
-            logger.warning(f"Firma inválida en webhook de WOMPI. Esperada: {expected_checksum}, Recibida: {received_checksum}")
-            logger.debug(f"String to hash: {concat_values}{timestamp}[SECRET]")
+        if not webhook_wompi_service.firma_valida(payload):
             return JsonResponse({'error': 'Invalid signature'}, status=401)
 
-        # Procesar el evento
-        event_type = payload.get('event')
-        data = payload.get('data', {})
-
-        logger.info(f"Webhook WOMPI recibido: {event_type}")
-
-        if event_type == 'transaction.updated':
-            transaction_data = data.get('transaction', {})
-            transaction_id = transaction_data.get('id')
-            status = transaction_data.get('status')
-            reference = transaction_data.get('reference')
-            amount_in_cents = transaction_data.get('amount_in_cents')
-
-            logger.info(f"Transacción {transaction_id} actualizada a estado: {status}, Referencia: {reference}")
-            mapped_status = _map_wompi_status_to_intent(status)
-            intent_updated = 0
-            if transaction_id:
-                intent_updated = WompiIntent.objects.filter(wompi_transaction_id=transaction_id).update(
-                    status=mapped_status
-                )
-            if not intent_updated and reference:
-                intent = WompiIntent.objects.filter(referencia=reference).order_by('-created_at').first()
-                if intent:
-                    intent.status = mapped_status
-                    intent.save(update_fields=['status', 'updated_at'])
-
-            # Buscar el crédito por la referencia
-            # La referencia tiene formato: CUOTA-{credito_id}-{timestamp}
-            if reference and reference.startswith('CUOTA-'):
-                try:
-                    credito_id = reference.split('-')[1]
-
-                    if status == 'APPROVED':
-                        # Registrar el pago
-                        monto_decimal = Decimal(amount_in_cents) / 100
-
-                        try:
-                            with transaction.atomic():
-                                credito = Credito.objects.select_for_update().get(id=credito_id)
-                                pago, created = HistorialPago.objects.get_or_create(
-                                    referencia_pago=reference,
-                                    defaults={
-                                        'credito': credito,
-                                        'monto': monto_decimal,
-                                        'estado': HistorialPago.EstadoPago.EXITOSO
-                                    }
-                                )
-
-                                if not created:
-                                    logger.info(f"Pago con referencia {reference} ya existe, omitiendo.")
-                                else:
-                                    credit_services.actualizar_saldo_tras_pago(credito, monto_decimal)
-                                    logger.info(f"Pago de ${monto_decimal} registrado exitosamente para crédito {credito_id}")
-                        except IntegrityError as e:
-                            # Puede ocurrir por concurrencia - verificar si el pago ya se procesó
-                            logger.warning(f"IntegrityError al procesar pago {reference}: {e}. Verificando si ya existe...")
-                            if HistorialPago.objects.filter(referencia_pago=reference).exists():
-                                logger.info(f"Pago {reference} ya fue procesado por otra instancia.")
-                            else:
-                                raise
-
-                    elif status == 'DECLINED' or status == 'ERROR':
-                        logger.warning(f"Pago rechazado para crédito {credito_id}: {status}")
-                        # Opcionalmente registrar el intento fallido
-
-                except (IndexError, Credito.DoesNotExist) as e:
-                    logger.error(f"Error al procesar referencia {reference}: {str(e)}")
-
+        logger.info(f"Webhook WOMPI recibido: {payload.get('event')}")
+        webhook_wompi_service.registrar_evento(payload)
         return JsonResponse({'status': 'ok'}, status=200)
 
     except json.JSONDecodeError as e:
@@ -3793,8 +3639,8 @@ def analizar_abono_credito_view(request, credito_id):
                 'error': 'Tipo de abono inválido.'
             }, status=400)
 
-        # Analizar el abono
-        analisis = credit_services.analizar_abono_credito(credito, monto_abono, tipo_abono_servicio)
+        # Analizar el abono (queda en caché para la confirmación)
+        analisis = analizar_abono_cacheado(credito, monto_abono, tipo_abono_servicio)
 
         plan_actual = analisis['plan_actual']
         plan_nuevo = analisis['plan_nuevo']
@@ -3851,6 +3697,68 @@ def analizar_abono_credito_view(request, credito_id):
         }, status=500)
 
 
+@login_required
+@require_POST
+def simular_abonos_credito_view(request, credito_id):
+    """
+    API endpoint del simulador de abonos: resume el plan resultante de varios
+    montos candidatos en una sola llamada, sin recalcular planes completos.
+
+    JSON body:
+        - tipo_abono: 'CUOTAS' o 'CAPITAL'
+        - montos: lista de montos a simular (máximo MAX_MONTOS_SIMULACION)
+
+    Returns:
+        JSON con plan_actual y una simulación por monto, en el mismo orden
+    """
+    try:
+        data = json.loads(request.body.decode('utf-8') or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'JSON inválido.'}, status=400)
+
+    credito = get_object_or_404(Credito, id=credito_id, usuario=request.user)
+    if credito.estado not in [Credito.EstadoCredito.ACTIVO, Credito.EstadoCredito.EN_MORA]:
+        return JsonResponse({
+            'success': False,
+            'error': 'El crédito debe estar activo para realizar abonos.'
+        }, status=400)
+
+    tipo_abono = data.get('tipo_abono')
+    if tipo_abono not in ('CUOTAS', 'CAPITAL'):
+        return JsonResponse({'success': False, 'error': 'Tipo de abono inválido.'}, status=400)
+
+    montos_recibidos = data.get('montos')
+    if not isinstance(montos_recibidos, list) or not 0 < len(montos_recibidos) <= MAX_MONTOS_SIMULACION:
+        return JsonResponse({
+            'success': False,
+            'error': f'Envíe entre 1 y {MAX_MONTOS_SIMULACION} montos a simular.'
+        }, status=400)
+
+    try:
+        montos = [Decimal(str(monto)) for monto in montos_recibidos]
+    except (decimal.InvalidOperation, ValueError):
+        return JsonResponse({'success': False, 'error': 'Los montos deben ser numéricos.'}, status=400)
+
+    if any(not monto.is_finite() or monto <= 0 for monto in montos):
+        return JsonResponse({'success': False, 'error': 'Los montos deben ser mayores a cero.'}, status=400)
+
+    if tipo_abono == 'CAPITAL' and any(monto > (credito.capital_pendiente or 0) for monto in montos):
+        return JsonResponse({
+            'success': False,
+            'error': f'El monto no puede ser mayor al capital pendiente (${credito.capital_pendiente:,.0f}).'
+        }, status=400)
+
+    # También acota el tamaño de las claves de caché que arma simular_abonos
+    if tipo_abono == 'CUOTAS' and any(monto > (credito.saldo_pendiente or 0) for monto in montos):
+        return JsonResponse({
+            'success': False,
+            'error': f'El monto no puede ser mayor al saldo pendiente (${credito.saldo_pendiente or 0:,.0f}).'
+        }, status=400)
+
+    resultado = simular_abonos(credito, montos, tipo_abono)
+    return JsonResponse({'success': True, **resultado})
+
+
 @login_required
 @require_POST
 def confirmar_abono_credito_view(request, credito_id):
@@ -3931,13 +3839,14 @@ def confirmar_abono_credito_view(request, credito_id):
         import uuid
         referencia = f"ABONO-{credito.numero_credito}-{uuid.uuid4().hex[:8].upper()}"
 
-        # Aplicar el abono
+        # Aplicar el abono con el análisis que vio el usuario (si el crédito no cambió)
         pago, reestructuracion = credit_services.aplicar_abono_credito(
             credito=credito,
             monto_abono=monto_abono,
             tipo_abono=tipo_abono_servicio,
             usuario=request.user,
-            referencia_pago=referencia
+            referencia_pago=referencia,
+            analisis=analizar_abono_cacheado(credito, monto_abono, tipo_abono_servicio)
         )
 
         # Crear notificación
@@ -268,6 +268,59 @@ function initModalAbonos(config) {
         montoNormalInput.addEventListener('input', actualizarResumenNormal);
     }
 
+    // Simulación en vivo del abono a capital: espera a que el usuario deje de
+    // escribir, pide el monto junto con sus vecinos del paso del campo y
+    // guarda las respuestas para no repetir consultas
+    const ESPERA_SIMULACION_MS = 300;
+    const MONTO_MINIMO_CAPITAL = 50000;
+    const simulacionesCapital = new Map();
+    let temporizadorSimulacion = null;
+
+    function simularAbonoCapital() {
+        const monto = parseFloat(montoCapitalInput.value);
+        if (!monto || monto < MONTO_MINIMO_CAPITAL || monto > capitalPendiente) return;
+
+        if (simulacionesCapital.has(monto)) {
+            mostrarResultadosAnalisis(simulacionesCapital.get(monto));
+            return;
+        }
+
+        const paso = parseFloat(montoCapitalInput.step) || 10000;
+        const montos = [monto, monto - paso, monto + paso].filter(m =>
+            m >= MONTO_MINIMO_CAPITAL && m <= capitalPendiente && !simulacionesCapital.has(m)
+        );
+
+        fetch(`/emprendimiento/mi-credito/${creditoId}/simular-abonos/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken
+            },
+            body: JSON.stringify({ tipo_abono: 'CAPITAL', montos: montos })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) return;
+            data.simulaciones.forEach(simulacion => {
+                simulacionesCapital.set(simulacion.monto_abono, { ...simulacion, plan_actual: data.plan_actual });
+            });
+            if (parseFloat(montoCapitalInput.value) === monto && simulacionesCapital.has(monto)) {
+                mostrarResultadosAnalisis(simulacionesCapital.get(monto));
+            }
+        })
+        .catch(error => console.error('Error:', error));
+    }
+
+    if (montoCapitalInput) {
+        montoCapitalInput.addEventListener('input', function() {
+            // El análisis confirmado corresponde a otro monto
+            datosAnalisis = null;
+            btnConfirmar.classList.add('d-none');
+            clearTimeout(temporizadorSimulacion);
+            temporizadorSimulacion = setTimeout(simularAbonoCapital, ESPERA_SIMULACION_MS);
+        });
+    }
+
     // Analizar abono
     if (btnAnalizar) {
         btnAnalizar.addEventListener('click', function() {
@@ -47,6 +47,7 @@ urlpatterns = [
     #? ========================================
     path('mi-credito/<int:credito_id>/calcular-pago-total/', gestion_views.calcular_pago_total_view, name='calcular_pago_total'),
     path('mi-credito/<int:credito_id>/analizar-abono/', gestion_views.analizar_abono_credito_view, name='analizar_abono'),
+    path('mi-credito/<int:credito_id>/simular-abonos/', gestion_views.simular_abonos_credito_view, name='simular_abonos'),
     path('mi-credito/<int:credito_id>/confirmar-abono/', gestion_views.confirmar_abono_credito_view, name='confirmar_abono'),
     path('mi-credito/<int:credito_id>/historial-abonos/', gestion_views.historial_reestructuraciones_view, name='historial_abonos'),
 
@@ -56,4 +57,5 @@ urlpatterns = [
     path('mi-credito/<int:credito_id>/pago/wompi/', gestion_views.iniciar_pago_wompi_emprendimiento_view, name='pagar_wompi'),
     path('mi-credito/pago/wompi/procesar/', gestion_views.procesar_pago_wompi_emprendimiento_view, name='procesar_pago_wompi'),
     path('mi-credito/pago/wompi/callback/', gestion_views.pago_wompi_emprendimiento_callback_view, name='pago_wompi_callback'),
+    path('mi-credito/pago/wompi/estado/', gestion_views.pago_wompi_estado_view, name='pago_wompi_estado'),
 ]